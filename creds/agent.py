@@ -0,0 +1,333 @@
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import threading
+import socketserver
+from creds import cred, store, util, vault, crypto
+
+
+SOCKET_FILE_NAME = os.path.expanduser("~/.aws/.aws-creds-agent.sock")
+REFRESH_INTERVAL = 30
+RELOAD_INTERVAL = 1
+
+
+class CredentialAgent():
+    """
+        Keeps every saved profile in memory and hands out credentials for them
+        (in the credential_process format) without going back to the store or
+        STS. Sessions of roles that have been asked for are renewed in the
+        background before they expire.
+
+        Lookups only read from dictionaries that are replaced as a whole when
+        something changes, so any number of client threads can call get() at
+        once; changes are serialised by self.lock, which is only held while
+        a dictionary is swapped. Assuming a role (a call to STS) holds only
+        the lock of that profile and role, so it never holds up the others.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session_locks = {}
+        self.credentials = {}
+        self.sessions = {}
+        self.store_modified = None
+        self.checked = 0
+        self.stopped = threading.Event()
+        self.load()
+
+    def load(self):
+        credentials = {}
+
+        for credential in cred.Credential.iterate_all():
+            credentials[credential.id] = credential
+            credentials[credential.name] = credential
+
+        self.credentials = credentials
+        self.store_modified = get_modified(store.STORE_FILE_NAME)
+        # Read now, so looking up a Secret Key never has to go to the store.
+        vault.get_settings()
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+
+        if now - self.checked > RELOAD_INTERVAL:
+            self.checked = now
+
+            if get_modified(store.STORE_FILE_NAME) != self.store_modified:
+                with self.lock:
+                    # e.g. the profiles have been encrypted since.
+                    vault.reset()
+                    self.load()
+
+    def get(self, profile, role_arn=None):
+        self.reload_if_changed()
+        credential = self.credentials.get(profile) or self.credentials.get(profile.upper())
+
+        if credential is None:
+            raise cred.CredentialNotFoundError(profile)
+
+        if role_arn:
+            role_arn = credential.resolve_role(role_arn)
+            key = (credential.id, role_arn)
+            session = self.sessions.get(key)
+
+            if session is None or util.expires_soon(session):
+                with self.get_session_lock(key):
+                    session = self.sessions.get(key)
+
+                    # Another client may have assumed it while this one waited.
+                    if session is None or util.expires_soon(session):
+                        session = util.get_role_session(credential, role_arn)
+                        self.set_session(key, session)
+
+            return get_credential_process_output(credential, session)
+        else:
+            return get_credential_process_output(credential, credential.get_mfa_session())
+
+    def refresh(self):
+        """Renews every role session that is close to expiring."""
+        for (profile_id, role_arn), session in list(self.sessions.items()):
+            credential = self.credentials.get(profile_id)
+
+            if credential and util.expires_soon(session):
+                try:
+                    with self.get_session_lock((profile_id, role_arn)):
+                        if util.expires_soon(self.sessions.get((profile_id, role_arn), session)):
+                            self.set_session((profile_id, role_arn),
+                                             util.get_role_session(credential, role_arn, refresh=True))
+                except util.RoleAssumptionError as err:
+                    print(err.message + " " + err.reason, file=sys.stderr)
+                except vault.VaultLockedError as err:
+                    print(err.message, file=sys.stderr)
+
+    def get_session_lock(self, key):
+        """Returns the lock held while the role session key (a profile id and role ARN) is assumed."""
+        with self.lock:
+            return self.session_locks.setdefault(key, threading.Lock())
+
+    def set_session(self, key, session):
+        with self.lock:
+            sessions = dict(self.sessions)
+            sessions[key] = session
+            self.sessions = sessions
+
+    def refresh_forever(self):
+        while not self.stopped.wait(REFRESH_INTERVAL):
+            self.refresh()
+
+    def serve(self, socket_file_name=SOCKET_FILE_NAME):
+        """Serves requests on socket_file_name until stop() is called."""
+        if os.path.exists(socket_file_name):
+            os.remove(socket_file_name)
+
+        agent = self
+        # There is no one to ask for a passphrase, see 'aws-creds unlock'.
+        vault.prompt = False
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                # One JSON request per line, and any number of them per connection.
+                for line in self.rfile:
+                    self.wfile.write((json.dumps(agent.handle(line)) + "\n").encode())
+                    self.wfile.flush()
+
+        # The socket hands out secrets, so only the owner can connect to it.
+        previous_umask = os.umask(0o077)
+
+        try:
+            self.server = AgentServer(socket_file_name, Handler)
+        finally:
+            os.umask(previous_umask)
+
+        threading.Thread(target=self.refresh_forever, daemon=True).start()
+
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+
+            if os.path.exists(socket_file_name):
+                os.remove(socket_file_name)
+
+    def handle(self, line):
+        try:
+            request = json.loads(line)
+
+            if request.get("lock"):
+                self.forget_secrets()
+                return {}
+
+            return self.get(request["profile"], request.get("role"))
+        except cred.CredentialNotFoundError as err:
+            return {"Error": "There is no saved profile called '" + err.credential_id + "'."}
+        except cred.RoleNotSavedInCurrentCredentialError as err:
+            return {"Error": get_role_not_saved_message(request["profile"], err.role_arn)}
+        except util.RoleAssumptionError as err:
+            return {"Error": err.message + " " + err.reason}
+        except (vault.VaultLockedError, crypto.DecryptionError) as err:
+            return {"Error": err.message}
+        except (ValueError, KeyError):
+            return {"Error": "Invalid request."}
+        except Exception as err:
+            # e.g. STS can't be reached, report it rather than dropping the client.
+            return {"Error": str(err)}
+
+    def forget_secrets(self):
+        """Drops every decrypted Secret Key and role session, for when the profiles are locked."""
+        with self.lock:
+            vault.reset()
+            self.sessions = {}
+            self.load()
+
+    def stop(self):
+        self.stopped.set()
+        self.server.shutdown()
+
+
+class AgentServer(socketserver.UnixStreamServer):
+    """
+        Serves every connection on a thread of its own, like
+        ThreadingUnixStreamServer, but keeps the threads once their
+        connection is done and reuses them. Every 'aws-creds
+        credential-process' is a new connection, and starting a thread for
+        each was most of the time an answer took.
+    """
+    def __init__(self, socket_file_name, handler):
+        super().__init__(socket_file_name, handler)
+        self.connections = queue.SimpleQueue()
+        self.idle_lock = threading.Lock()
+        self.idle_workers = 0
+
+    def process_request(self, request, client_address):
+        with self.idle_lock:
+            if self.idle_workers:
+                self.idle_workers -= 1
+            else:
+                # Every worker is busy (e.g. with a client that keeps its connection open).
+                threading.Thread(target=self.work, daemon=True).start()
+
+        self.connections.put((request, client_address))
+
+    def work(self):
+        while True:
+            request, client_address = self.connections.get()
+
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+            with self.idle_lock:
+                self.idle_workers += 1
+
+
+def get_modified(file_name):
+    try:
+        stat = os.stat(file_name)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def get_role_not_saved_message(profile, reference):
+    return "There is no role '" + reference + "' saved in '" + profile + "', add it with 'aws-creds role add'."
+
+
+def get_credential_process_output(credential, session=None):
+    """
+        Returns the credentials in the format expected from a credential_process
+        (see https://docs.aws.amazon.com/cli/latest/topic/config-vars.html).
+    """
+    if session:
+        return {
+            "Version": 1,
+            "AccessKeyId": session["AccessKeyId"],
+            "SecretAccessKey": session["SecretAccessKey"],
+            "SessionToken": session["SessionToken"],
+            "Expiration": session["Expiration"]
+        }
+    else:
+        return {
+            "Version": 1,
+            "AccessKeyId": credential.access_key,
+            "SecretAccessKey": credential.secret_key
+        }
+
+
+def request(profile, role_arn=None, socket_file_name=SOCKET_FILE_NAME):
+    """
+        Asks a running agent for the credentials of profile. Raises
+        AgentNotRunningError if there is no agent to ask.
+    """
+    return send({"profile": profile, "role": role_arn}, socket_file_name)
+
+
+def send(message, socket_file_name=SOCKET_FILE_NAME):
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_file_name)
+    except OSError:
+        raise AgentNotRunningError()
+
+    try:
+        client.sendall((json.dumps(message) + "\n").encode())
+        response = b""
+
+        while not response.endswith(b"\n"):
+            data = client.recv(65536)
+
+            if not data:
+                raise AgentNotRunningError()
+
+            response += data
+
+        return json.loads(response)
+    finally:
+        client.close()
+
+
+def credential_process(profile, role_arn=None):
+    """
+        Prints the credentials of profile for a credential_process, from the
+        agent if it is running or straight from the store if it isn't. Returns
+        the exit code.
+    """
+    try:
+        output = request(profile, role_arn)
+    except AgentNotRunningError:
+        try:
+            output = get_without_agent(profile, role_arn)
+        except cred.CredentialNotFoundError as err:
+            output = {"Error": "There is no saved profile called '" + err.credential_id + "'."}
+        except cred.RoleNotSavedInCurrentCredentialError as err:
+            output = {"Error": get_role_not_saved_message(profile, err.role_arn)}
+        except util.RoleAssumptionError as err:
+            output = {"Error": err.message + " " + err.reason}
+        except (vault.VaultLockedError, vault.IncorrectPassphraseError, crypto.DecryptionError) as err:
+            output = {"Error": err.message}
+
+    if "Error" in output:
+        print(output["Error"], file=sys.stderr)
+        return 1
+    else:
+        print(json.dumps(output))
+        return 0
+
+
+def get_without_agent(profile, role_arn=None):
+    credential = cred.Credential.get_by_name_or_id(profile)
+
+    if role_arn:
+        role_arn = credential.resolve_role(role_arn)
+        return get_credential_process_output(credential, util.get_role_session(credential, role_arn))
+    else:
+        return get_credential_process_output(credential, credential.get_mfa_session())
+
+
+class AgentNotRunningError(Exception):
+    def __init__(self):
+        self.message = "The aws-creds agent isn't running, start it with 'aws-creds agent'."
@@ -0,0 +1,219 @@
+import csv
+import json
+import datetime
+from creds import cred, defaults
+
+
+FORMATS = ["ndjson", "csv", "ini"]
+CSV_FIELDS = ["name", "description", "access_key", "secret_key", "region", "output", "roles", "tags", "mfa_serial"]
+INI_ACCESS_KEY = "aws_access_key_id"
+INI_SECRET_KEY = "aws_secret_access_key"
+REQUIRED_FIELDS = ["name", "access_key", "secret_key"]
+
+
+def guess_format(file_name, default):
+    if file_name.endswith(".ndjson") or file_name.endswith(".jsonl"):
+        return "ndjson"
+    elif file_name.endswith(".csv"):
+        return "csv"
+    elif file_name.endswith(".ini"):
+        return "ini"
+    else:
+        return default
+
+
+def read(fh, format):
+    """
+        Yields a new Credential for every profile in fh, one at a time, so
+        files of any size can be imported in bounded memory. Raises a
+        ProfileImportError naming the line of the first profile that can't
+        be read, or is missing its name, Access Key or Secret Key.
+    """
+    readers = {
+        "ndjson": read_ndjson,
+        "csv": read_csv,
+        "ini": read_ini
+    }
+
+    default_configuration = defaults.DefaultConfiguration()
+    create_date = str(datetime.datetime.utcnow().replace(tzinfo=None))
+
+    for line_number, record in readers[format](fh):
+        validate(line_number, record)
+
+        yield cred.Credential(
+            record["name"],
+            record.get("description") or "",
+            record["access_key"],
+            record["secret_key"],
+            record.get("region") or default_configuration.region,
+            record.get("output") or default_configuration.output,
+            roles=record.get("roles") or [],
+            create_date=create_date,
+            tags=record.get("tags") or {},
+            mfa_serial=record.get("mfa_serial")
+        )
+
+
+def validate(line_number, record):
+    for field in REQUIRED_FIELDS:
+        value = record.get(field)
+
+        if not isinstance(value, str) or not value.strip():
+            raise ProfileImportError(line_number, "the profile has no " + field + ".")
+
+    if record.get("tags") and not isinstance(record["tags"], dict):
+        raise ProfileImportError(line_number, "the profile's tags aren't an object.")
+
+    for role in record.get("roles") or []:
+        arn = role.get("Arn") if isinstance(role, dict) else role
+
+        if not isinstance(arn, str) or not arn:
+            raise ProfileImportError(line_number, "the profile has a role without an ARN.")
+
+
+def write(fh, credentials, format):
+    writers = {
+        "ndjson": write_ndjson,
+        "csv": write_csv,
+        "ini": write_ini
+    }
+
+    return writers[format](fh, credentials)
+
+
+def read_ndjson(fh):
+    """
+        Reads one profile per line, either in the layout used by export (and
+        the profile store) or as a flat object with the same keys as the CSV
+        columns.
+    """
+    for line_number, line in enumerate(fh, 1):
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ProfileImportError(line_number, "it isn't valid JSON.")
+
+        if not isinstance(record, dict):
+            raise ProfileImportError(line_number, "it isn't a JSON object.")
+
+        if isinstance(record.get("Credentials"), dict):
+            options = record.get("Options") or {}
+            yield line_number, {
+                "name": record.get("Name"),
+                "description": record.get("Description"),
+                "access_key": record["Credentials"].get("AccessKey"),
+                "secret_key": record["Credentials"].get("SecretKey"),
+                "region": options.get("Region"),
+                "output": options.get("OutputType"),
+                "roles": record.get("Roles"),
+                "tags": record.get("Tags"),
+                "mfa_serial": options.get("MfaSerial")
+            }
+        else:
+            yield line_number, record
+
+
+def read_csv(fh):
+    """
+        Reads one profile per row. The roles column is either the JSON
+        written by export (so aliases and tags are kept) or ARNs separated
+        by spaces.
+    """
+    reader = csv.DictReader(fh)
+
+    for record in reader:
+        roles = (record.get("roles") or "").strip()
+
+        if roles.startswith("["):
+            try:
+                record["roles"] = json.loads(roles)
+            except ValueError:
+                raise ProfileImportError(reader.line_num, "the roles column isn't valid JSON.")
+        else:
+            record["roles"] = roles.split()
+
+        record["tags"] = cred.Credential.parse_filters((record.get("tags") or "").split())[0]
+        yield reader.line_num, record
+
+
+def read_ini(fh):
+    """
+        Reads an AWS credentials file (e.g. ~/.aws/credentials), where every
+        section with an Access Key and Secret Key becomes a profile.
+    """
+    section = None
+    section_line_number = None
+    values = {}
+
+    for line_number, line in enumerate(fh, 1):
+        line = line.strip()
+
+        if line.startswith("[") and line.endswith("]"):
+            if section and INI_ACCESS_KEY in values and INI_SECRET_KEY in values:
+                yield section_line_number, ini_record(section, values)
+
+            section = line[1:-1].strip()
+            section_line_number = line_number
+            values = {}
+        elif "=" in line and not line.startswith("#") and not line.startswith(";"):
+            key, value = line.split("=", 1)
+            values[key.strip().lower()] = value.strip()
+
+    if section and INI_ACCESS_KEY in values and INI_SECRET_KEY in values:
+        yield section_line_number, ini_record(section, values)
+
+
+def ini_record(section, values):
+    if section.startswith("profile "):
+        section = section[len("profile "):].strip()
+
+    return {
+        "name": section,
+        "description": "Imported from AWS credentials file.",
+        "access_key": values[INI_ACCESS_KEY],
+        "secret_key": values[INI_SECRET_KEY],
+        "region": values.get("region"),
+        "output": values.get("output")
+    }
+
+
+def write_ndjson(fh, credentials):
+    for credential in credentials:
+        fh.write(json.dumps(credential.to_dictionary()) + "\n")
+
+
+def write_csv(fh, credentials):
+    writer = csv.DictWriter(fh, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+
+    for credential in credentials:
+        writer.writerow({
+            "name": credential.name,
+            "description": credential.description,
+            "access_key": credential.access_key,
+            "secret_key": credential.secret_key,
+            "region": credential.region,
+            "output": credential.output,
+            # As JSON, so the roles' aliases and tags are kept as well.
+            "roles": json.dumps(credential.roles.to_list()) if len(credential.roles) else "",
+            "tags": " ".join(k + "=" + v for k, v in credential.tags.items()),
+            "mfa_serial": credential.mfa_serial or ""
+        })
+
+
+def write_ini(fh, credentials):
+    for credential in credentials:
+        fh.write("[" + credential.name + "]\n")
+        fh.write(INI_ACCESS_KEY + "=" + credential.access_key + "\n")
+        fh.write(INI_SECRET_KEY + "=" + credential.secret_key + "\n")
+        fh.write("\n")
+
+
+class ProfileImportError(Exception):
+    def __init__(self, line_number, message):
+        self.line_number = line_number
+        self.message = "Line " + str(line_number) + ": " + message
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import datetime
+from creds import files, crypto, vault
+
+
+# Sessions are renewed (or no longer handed out) this many seconds before they expire.
+SESSION_REFRESH_WINDOW = 300
+# Returned by ProfileCache.get() for entries that aren't cached, as None can be cached.
+MISSING = object()
+
+
+class ProfileCache():
+    """
+        Caches the results of AWS lookups for a profile (account details, key
+        metadata) in its cache directory. Entries only apply to the Access
+        Key they were fetched with, and expire after a time to live.
+    """
+    FILE_NAME = "cache.json"
+
+    def __init__(self, credential):
+        self.file_name = credential.get_cache_directory() + "/" + ProfileCache.FILE_NAME
+        self.access_key = credential.access_key
+        self.entries = {}
+
+        if os.path.exists(self.file_name):
+            try:
+                with open(self.file_name, "r") as fh:
+                    cache = json.loads(fh.read())
+
+                if cache["AccessKey"] == self.access_key:
+                    self.entries = cache["Entries"]
+            except (ValueError, KeyError):
+                self.entries = {}
+
+    def get(self, key, expired=False, default=None):
+        """
+            Returns the value cached as key, or default if there isn't one or
+            it has expired (unless expired is set).
+        """
+        entry = self.entries.get(key)
+
+        if entry and (expired or entry["Expires"] > time.time()):
+            return entry["Value"]
+        else:
+            return default
+
+    def set(self, key, value, ttl):
+        self.entries[key] = {
+            "Value": value,
+            "Expires": time.time() + ttl
+        }
+
+        cache = {
+            "AccessKey": self.access_key,
+            "Entries": self.entries
+        }
+
+        files.write(self.file_name, json.dumps(cache, indent=4))
+
+    def clear(self):
+        self.entries = {}
+
+        files.remove(self.file_name)
+
+
+class RoleSessionCache():
+    """
+        Holds the temporary credentials returned by STS for the roles assumed
+        with a profile, encrypted (see get_session_key()), in its cache
+        directory. Sessions only apply to the Access Key that created them.
+    """
+    FILE_NAME = "role_sessions.enc"
+
+    def __init__(self, credential):
+        self.file_name = credential.get_cache_directory() + "/" + self.FILE_NAME
+        self.access_key = credential.access_key
+        # Only read (and decrypted) once a session is asked for.
+        self.sessions = None
+
+    def load(self):
+        self.sessions = {}
+
+        if os.path.exists(self.file_name):
+            try:
+                with open(self.file_name, "r") as fh:
+                    cache = json.loads(crypto.decrypt(fh.read(), get_session_key()))
+
+                if cache["AccessKey"] == self.access_key:
+                    self.sessions = cache["Sessions"]
+            except (crypto.DecryptionError, ValueError, KeyError):
+                self.sessions = {}
+
+    def get(self, role_arn):
+        if self.sessions is None:
+            self.load()
+
+        return self.sessions.get(role_arn)
+
+    def set(self, role_arn, session):
+        if self.sessions is None:
+            self.load()
+
+        self.sessions[role_arn] = session
+
+        cache = {
+            "AccessKey": self.access_key,
+            "Sessions": self.sessions
+        }
+
+        files.write(self.file_name, crypto.encrypt(json.dumps(cache).encode(), get_session_key()))
+
+    def clear(self):
+        self.sessions = {}
+
+        files.remove(self.file_name)
+
+
+class MfaSessionCache(RoleSessionCache):
+    """
+        Holds the session token fetched with a profile's MFA device (see
+        util.get_mfa_session()), encrypted like the role sessions, under the
+        device's serial number.
+    """
+    FILE_NAME = "mfa_session.enc"
+
+    def get_valid(self, serial_number):
+        """Returns the session for serial_number, unless it is about to expire."""
+        session = self.get(serial_number)
+
+        if session and not expires_soon(session):
+            return session
+        else:
+            return None
+
+
+def get_session_key():
+    """
+        Returns the key the cached sessions are encrypted with: one derived
+        from the vault's key while the saved profiles are encrypted (so the
+        sessions need unlocking just like the Secret Keys), otherwise the
+        key file next to the cache (see crypto.get_key()), which only
+        obfuscates them.
+    """
+    return vault.get_cache_key() if vault.is_enabled() else crypto.get_key()
+
+
+def expires_soon(session):
+    expiration = datetime.datetime.fromisoformat(session["Expiration"])
+    remaining = expiration - datetime.datetime.now(datetime.timezone.utc)
+    return remaining.total_seconds() < SESSION_REFRESH_WINDOW
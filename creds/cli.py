@@ -1,8 +1,12 @@
 import click
 import sys
-import boto3
+import os
+import shlex
 import datetime
-from creds import cred, util, defaults
+from creds import cred, util, defaults, bulk, picker, vault, roles, history, prompt
+
+
+FILTER_HELP = "Only use profiles with this tag (KEY=VALUE) or whose name or id matches this pattern (e.g. 'PROD-*'), can be repeated."
 
 
 @click.command()
@@ -22,17 +26,22 @@ from creds import cred, util, defaults
 @click.option("--region", 
               help="Default AWS Region (see https://docs.aws.amazon.com/general/latest/gr/rande.html#ec2_region).",
               prompt="Default Region",
-              default=defaults.DefaultConfiguration().region,
+              default=lambda: defaults.DefaultConfiguration().region,
               show_default=True)
 @click.option("--output", 
               help="Default Output Format (valid options: text, json, table)",
               prompt="Output Type",
-              default=defaults.DefaultConfiguration().output,
+              default=lambda: defaults.DefaultConfiguration().output,
               show_default=True)
-def add(profile_name, description, access_key, secret_key, region, output):
+@click.option("--tag", "tags", multiple=True, callback=lambda c, p, v: parse_tags(v),
+              help="A KEY=VALUE tag for the profile (e.g. env=prod), can be repeated.")
+@click.option("--mfa-serial", default=None,
+              help="The serial number (ARN) of the MFA device to start sessions with (see 'aws-creds mfa').")
+def add(profile_name, description, access_key, secret_key, region, output, tags, mfa_serial):
     """Adds a new credential profile."""
     if profile_name and access_key and secret_key:
-        my_credential = cred.Credential(profile_name, description, access_key, secret_key, region, output)
+        my_credential = cred.Credential(profile_name, description, access_key, secret_key, region, output, tags=tags,
+                                        mfa_serial=mfa_serial)
         my_credential.save()
         click.echo("New profile created successfully.")
     else:
@@ -40,21 +49,46 @@ def add(profile_name, description, access_key, secret_key, region, output):
 
 
 @click.command()
-def ls():
-    """Lists all of the saved profiles."""
+@click.argument("expressions", nargs=-1)
+@click.option("--group-by", default=None, help="List the profiles under each value of this tag.")
+def ls(expressions, group_by):
+    """
+    Lists all of the saved profiles, or only those matching every one of
+    EXPRESSIONS: KEY=VALUE for a tag (e.g. 'aws-creds ls env=prod
+    team=payments') or a pattern for the name or id (e.g. 'PROD-*').
+    """
 
     click.echo(" ")
     click.echo("Installed AWS Profiles")
     click.echo(" ")
 
-    my_credentials = cred.Credential.get_all()
-    echo_credentials(my_credentials)
+    my_credentials = cred.Credential.select_summaries(expressions)
+
+    if group_by:
+        groups = {}
+
+        for my_credential in my_credentials:
+            groups.setdefault(my_credential.tags.get(group_by), []).append(my_credential)
+
+        for value in sorted(groups, key=lambda v: (v is None, v)):
+            click.echo(group_by + "=" + value if value is not None else "No " + group_by + " tag")
+            click.echo(" ")
+            echo_credentials(groups[value])
+    else:
+        echo_credentials(my_credentials)
+
     click.echo("There are " + str(len(my_credentials)) + " active profiles.")
     click.echo(" ")
 
 
 @click.command()
-def login():
+@click.argument("profile", required=False)
+@click.option("--no-age-check", is_flag=True, help="Don't check the age of the Access Key (skips calling AWS).")
+@click.option("--refresh", is_flag=True, help="Ignore cached Access Key details and fetch them from AWS.")
+@click.option("--query", "-q", default="", help="Start the profile search with this text.")
+@click.option("--filter", "expressions", multiple=True, help=FILTER_HELP)
+@click.option("--mfa-code", default=None, help="The code from the profile's MFA device, if it has one and needs a new session.")
+def login(profile, no_age_check, refresh, query, expressions, mfa_code):
     """
     Sets the user's AWS credentials to the selected profile. It does
     this by doing the following:
@@ -69,21 +103,41 @@ def login():
     5. Adds a history item to '~/.aws/login_history.log'.
     6. Checks the age of the Access Keys and advises the user if they need
        to be rotated.
+
+    If PROFILE (the name or id of a saved profile) is given, it is logged
+    into directly. Otherwise pick one by typing part of its name or
+    description (or pass the search with --query when not in a terminal),
+    with the profiles used most recently listed first.
+
+    Profiles with an MFA device are logged into with an MFA session (see
+    'aws-creds mfa'), asking for a code when there isn't one already.
     
     """
     click.echo(" ")
     
     try:
         util.check_environment()
-        my_credentials = cred.Credential.get_all()
-        echo_credentials(my_credentials)
-        selection = click.prompt("Which profile would you like to login to", type=int, prompt_suffix="? ") - 1
-        click.echo(" ")
-        my_credential = my_credentials[selection]
+
+        if profile:
+            my_credential = cred.Credential.get_by_name_or_id(profile)
+        else:
+            my_credential = picker.pick(cred.Credential.select_summaries(expressions), "Which profile would you like to login to",
+                                        query, get_recent_profile_ids()).load()
+            click.echo(" ")
+
+        start_mfa_session(my_credential, mfa_code)
         my_credential.login()
+        history.record("login", my_credential)
         click.echo("Successfully logged into '" + my_credential.name + "'.")
-        check_credential_age()
+
+        if not no_age_check:
+            check_credential_age(refresh)
+
+        click.echo(" ")
+    except cred.CredentialNotFoundError as err:
+        click.echo("Sorry, there is no saved profile called '" + err.credential_id + "'.")
         click.echo(" ")
+        sys.exit(1)
     except util.EnvironmentVariableIsSetError as err:
         click.echo("Sorry, there are environment variables set.")
         click.echo(" ")
@@ -94,6 +148,7 @@ def login():
         click.echo(" ")
         click.echo("Please delete the environment variables and try again.")
         click.echo(" ")
+        sys.exit(1)
     except click.Abort:
         click.echo(" ")
         click.echo(" ")
@@ -101,6 +156,233 @@ def login():
         click.echo(" ")
 
 
+@click.command()
+@click.argument("profile")
+@click.option("--mfa-code", default=None, help="The code from the profile's MFA device, if it has one and needs a new session.")
+def switch(profile, mfa_code):
+    """
+    Logs into PROFILE (the name or id of a saved profile), or with '-'
+    switches back to the profile (and role) in use before the current one:
+
+    \b
+        aws-creds switch PROD-PAYMENTS
+        aws-creds switch -
+
+    Running 'aws-creds switch -' again switches back, like 'cd -'. Where
+    each switch went is read from '~/.aws/login_history.log' (see 'aws-creds
+    history').
+    """
+    click.echo(" ")
+
+    try:
+        util.check_environment()
+        role_arn = None
+
+        if profile == "-":
+            try:
+                current = cred.Credential.get_current()
+            except cred.CredentialNotFoundError:
+                current = None
+
+            previous = history.get_previous(current.id if current else None,
+                                            current.get_current_role() if current else None)
+
+            if previous is None:
+                click.echo("Sorry, there is no previous profile to switch to.")
+                click.echo(" ")
+                sys.exit(1)
+
+            my_credential = cred.Credential.from_json(previous["ProfileId"])
+            role_arn = previous.get("Role")
+        else:
+            my_credential = cred.Credential.get_by_name_or_id(profile)
+
+        if role_arn and role_arn not in my_credential.roles:
+            raise cred.RoleNotSavedInCurrentCredentialError(role_arn)
+
+        start_mfa_session(my_credential, mfa_code)
+
+        if role_arn:
+            session = util.get_role_session(my_credential, role_arn)
+            my_credential.assume_role(role_arn, session)
+            my_credential.record_role_use(role_arn)
+            history.record("assume", my_credential, role_arn)
+            click.echo("Switched to '" + my_credential.name + "' with the role '" +
+                       my_credential.roles.get(role_arn).get_reference() + "'.")
+        else:
+            my_credential.login()
+            history.record("login", my_credential)
+            click.echo("Switched to '" + my_credential.name + "'.")
+
+        click.echo(" ")
+    except cred.CredentialNotFoundError as err:
+        click.echo("Sorry, there is no saved profile called '" + err.credential_id + "'.")
+        click.echo(" ")
+        sys.exit(1)
+    except cred.RoleNotSavedInCurrentCredentialError as err:
+        click.echo("Sorry, '" + err.role_arn + "' is no longer saved in '" + my_credential.name + "'.")
+        click.echo(" ")
+        sys.exit(1)
+    except util.RoleAssumptionError as err:
+        click.echo(err.message)
+        click.echo(err.reason)
+        click.echo(" ")
+        sys.exit(1)
+    except util.EnvironmentVariableIsSetError as err:
+        click.echo("Sorry, there are environment variables set.")
+        click.echo(" ")
+
+        for v in err.variable_names:
+            click.echo(" - " + v)
+
+        click.echo(" ")
+        click.echo("Please delete the environment variables and try again.")
+        click.echo(" ")
+        sys.exit(1)
+
+
+@click.command(context_settings={"ignore_unknown_options": True})
+@click.argument("profile")
+@click.argument("command", nargs=-1, type=click.UNPROCESSED)
+@click.option("--shell", type=click.Choice(["sh", "fish"]), default="sh", show_default=True,
+              help="Shell to print the exports for (sh also covers bash and zsh).")
+def env(profile, command, shell):
+    """
+    Gives a single shell (or command) the credentials of PROFILE (its name
+    or id) through environment variables, leaving ~/.aws/credentials and
+    ~/.aws/config untouched. Either load them into the current shell:
+
+    \b
+        eval "$(aws-creds env PROFILE)"
+
+    or run a command with them:
+
+    \b
+        aws-creds env PROFILE -- aws s3 ls
+
+    'aws-creds status' reports the profile in use in that shell.
+    """
+    try:
+        my_credential = cred.Credential.get_by_name_or_id(profile)
+    except cred.CredentialNotFoundError as err:
+        click.echo("Sorry, there is no saved profile called '" + err.credential_id + "'.", err=True)
+        sys.exit(1)
+
+    variables = my_credential.get_environment_variables()
+
+    if command:
+        environment = dict(os.environ)
+        environment.pop("AWS_SESSION_TOKEN", None)
+        environment.update(variables)
+        os.execvpe(command[0], list(command), environment)
+    elif shell == "fish":
+        click.echo("set -e AWS_SESSION_TOKEN;")
+
+        for name, value in variables.items():
+            click.echo("set -gx " + name + " " + shlex.quote(value) + ";")
+    else:
+        click.echo("unset AWS_SESSION_TOKEN;")
+
+        for name, value in variables.items():
+            click.echo("export " + name + "=" + shlex.quote(value) + ";")
+
+
+@click.command(context_settings={"ignore_unknown_options": True})
+@click.argument("command", nargs=-1, required=True, type=click.UNPROCESSED)
+@click.option("--filter", "expressions", multiple=True, help=FILTER_HELP)
+@click.option("--workers", default=16, show_default=True, type=click.IntRange(1),
+              help="How many profiles to run the command for at once.")
+def each(command, expressions, workers):
+    """
+    Runs COMMAND once for every saved profile (or the ones matching
+    --filter), several at a time, each with that profile's credentials in its
+    environment so nothing in ~/.aws changes. Every line of output is tagged
+    with the name of the profile it came from:
+
+    \b
+        aws-creds each --filter env=prod -- aws sts get-caller-identity
+    """
+    from creds import fanout
+
+    credentials = fanout.select(expressions)
+
+    if not credentials:
+        click.echo("Sorry, no saved profiles match.", err=True)
+        sys.exit(1)
+
+    _, failures = fanout.run_command(credentials, list(command), workers)
+
+    click.echo(" ")
+    click.echo("Ran for " + str(len(credentials)) + " profiles, " + str(len(failures)) + " failed.")
+
+    for name in sorted(failures):
+        click.echo("    " + name + ": " + get_error_message(failures[name]))
+
+    click.echo(" ")
+
+    if failures:
+        sys.exit(1)
+
+
+@click.command()
+def sync():
+    """
+    Writes every saved profile into its own named profile in the AWS
+    Credential and Config files, so any of them can be used straight away
+    with 'AWS_PROFILE=<NAME>' (or '--profile <NAME>'). Only the sections
+    that changed are rewritten, and profiles not written by aws-creds are
+    left untouched. Run 'aws-creds default set --sync-profiles' to sync
+    every time a profile is saved or removed.
+    """
+    click.echo(" ")
+    conflicts = cred.Credential.sync_profiles()
+
+    for name in conflicts:
+        click.echo("Skipped '" + name + "', a profile with that name that isn't managed by aws-creds already exists.")
+
+    click.echo("Named profiles synced successfully.")
+    click.echo(" ")
+
+
+@click.command()
+def agent():
+    """
+    Runs the aws-creds agent in the foreground. The agent keeps every saved
+    profile in memory, renews the sessions of assumed roles before they
+    expire and serves credentials to 'aws-creds credential-process' over a
+    socket only you can use. Run it in the background or from your login
+    session, e.g. 'aws-creds agent &'.
+    """
+    from creds import agent as credential_agent
+
+    my_agent = credential_agent.CredentialAgent()
+    click.echo(" ")
+    click.echo("aws-creds agent listening on " + credential_agent.SOCKET_FILE_NAME + ", press Ctrl+C to stop.")
+    click.echo(" ")
+
+    try:
+        my_agent.serve()
+    except KeyboardInterrupt:
+        pass
+
+
+@click.command(name="credential-process")
+@click.argument("profile")
+@click.option("--role", default=None, help="The role to assume with PROFILE: its ARN, alias or ACCOUNT:NAME.")
+def credential_process(profile, role):
+    """
+    Prints the credentials of PROFILE (its name or id) in the format of an
+    AWS 'credential_process', from the agent if it is running and the saved
+    profile otherwise. Use it from ~/.aws/config:
+
+    \b
+        [profile NAME]
+        credential_process = aws-creds credential-process NAME
+    """
+    from creds import agent as credential_agent
+    sys.exit(credential_agent.credential_process(profile, role))
+
+
 @click.command()
 def logout():
     """
@@ -108,8 +390,9 @@ def logout():
     the following:
 
     \b
-    1. Deletes the AWS Credential file under '~/.aws/credentials'.
-    3. Deletes the AWS Config file under '~/.aws/config'.
+    1. Removes the [default] profile from '~/.aws/credentials' (deleting
+       the file if nothing else is left in it).
+    3. Does the same for the AWS Config file under '~/.aws/config'.
     4. Deletes '~/.aws/profile.cred'.
     5. Adds a history item to '~/.aws/login_history.log'.
 
@@ -119,24 +402,98 @@ def logout():
     
     """
     click.echo(" ")
+
+    try:
+        my_credential = cred.Credential.get_current()
+    except cred.CredentialNotFoundError:
+        my_credential = None
+
     cred.Credential.logout()
+    history.record("logout", my_credential)
     click.echo("Logged out successfully.")
     click.echo(" ")
 
 
+@click.command(name="prompt")
+@click.option("--shell", type=click.Choice(prompt.SHELLS),
+              default=lambda: get_default_shell(),
+              show_default="your $SHELL", help="Shell to print the prompt snippet for.")
+def prompt_snippet(shell):
+    """
+    Prints a snippet that shows the profile logged into in your shell
+    prompt: its name, account id and assumed role, coloured by the age of
+    its Access Key. Add it to your shell's startup file:
+
+    \b
+        bash (~/.bashrc):  eval "$(aws-creds prompt --shell bash)"
+        zsh (~/.zshrc):    eval "$(aws-creds prompt --shell zsh)"
+        fish (config.fish): aws-creds prompt --shell fish | source
+
+    The prompt reads '~/.aws/.aws-creds-prompt', which aws-creds rewrites
+    on every login, switch, role assumed or unassumed, rotation and logout,
+    with the shell's own builtins. Nothing is run to draw the prompt, so it
+    costs microseconds. The account id and key age are filled in once they
+    have been looked up, e.g. by the age check after 'aws-creds login' or
+    by 'aws-creds status'.
+    """
+    click.echo(prompt.get_snippet(shell), nl=False)
+
+
+@click.command(name="history")
+@click.option("--count", "-n", default=20, show_default=True, type=click.IntRange(1), help="How many entries to print.")
+@click.option("--profile", default=None, help="Only print the entries of this profile (its name or id).")
+def show_history(count, profile):
+    """
+    Prints the last entries of '~/.aws/login_history.log', oldest first:
+    every login, switch, role assumed or unassumed, Access Key rotated and
+    logout. The log is read backwards from its end, so this is quick however
+    many entries it holds. It is rotated once it reaches 1 MB, keeping the
+    last 4 rotated logs as '~/.aws/login_history.log.1' and so on.
+    """
+    click.echo(" ")
+    profile_id = None
+
+    if profile:
+        try:
+            profile_id = cred.Credential.get_by_name_or_id(profile).id
+        except cred.CredentialNotFoundError as err:
+            click.echo("Sorry, there is no saved profile called '" + err.credential_id + "'.")
+            click.echo(" ")
+            sys.exit(1)
+
+    entries = history.tail(count, profile_id)
+
+    if not entries:
+        click.echo("There is no login history yet.")
+
+    for entry in entries:
+        line = entry["Time"].replace("T", " ").rstrip("Z") + " UTC  " + "%-9s" % entry["Event"] + " " + \
+            (entry.get("Name") or "-")
+
+        if entry.get("Role"):
+            line += " (" + entry["Role"] + ")"
+
+        if entry.get("AccessKey"):
+            line += ", new Access Key '" + entry["AccessKey"] + "'"
+
+        click.echo(line)
+
+    click.echo(" ")
+
+
 @click.command()
-def rm():
+@click.option("--query", "-q", default="", help="Start the profile search with this text.")
+def rm(query):
     """Deletes the selected profile."""
     try:
         click.echo(" ")
-        my_credentials = cred.Credential.get_all()
-        echo_credentials(my_credentials)
-        selection = click.prompt("Which profile would you like to delete", type=int, prompt_suffix="? ") - 1
+        my_credential = picker.pick(cred.Credential.select_summaries(), "Which profile would you like to delete", query,
+                                    get_recent_profile_ids()).load()
         click.echo(" ")
-        confirmation = click.prompt("'" + my_credentials[selection].name + "' has been selected for deletion. Are you sure (y/n)", type=str, prompt_suffix="? ").lower()
+        confirmation = click.prompt("'" + my_credential.name + "' has been selected for deletion. Are you sure (y/n)", type=str, prompt_suffix="? ").lower()
 
         if confirmation == "y" or confirmation == "yes":
-            my_credentials[selection].remove()
+            my_credential.remove()
             click.echo("Profile deleted successfully.")
         else:
             click.echo("Deletion not confirmed, not continuing.")
@@ -150,7 +507,8 @@ def rm():
 
 
 @click.command()
-def status():
+@click.option("--refresh", is_flag=True, help="Ignore cached account details and fetch them from AWS.")
+def status(refresh):
     """
     
     Prints out information about the credential that is currently
@@ -162,21 +520,33 @@ def status():
      - Account Aliases.
      - Username of the IAM User assigned to the Access Key.
      - Access Key.
+
+    Inside a shell set up with 'aws-creds env', it reports that shell's
+    profile rather than the one logged into.
+
+    The account details are cached per profile (see 'cache_ttl' under
+    'aws-creds default'), pass --refresh to fetch them again.
     
     """
 
     my_credential = cred.Credential.get_current()
 
     if my_credential:
-        details = util.get_account_details()
         current_role = my_credential.get_current_role()
 
-        # Here so ui doesn't lag when printing details
+        if current_role:
+            util.refresh_role_session(my_credential)
+
+        # Fetched up front so ui doesn't lag when printing details
+        details = util.get_status_details(include_access_key_age=not current_role, refresh=refresh)
+
         if not current_role:
-            access_key_age = str(util.get_access_key_age()) + " day(s)."
+            access_key_age = str(details["access_key_age"]) + " day(s)."
         
         click.echo(" ")
         click.echo("Current Profile: " + my_credential.name)
+        if cred.Credential.get_environment_current():
+            click.echo("Session:         environment (this shell only)")
         click.echo("Account Number:  " + details["account"])
         click.echo("Account Aliases: " + details["aliases"])
         if current_role:
@@ -193,14 +563,14 @@ def status():
 
 
 @click.command()    
-def update():
+@click.option("--query", "-q", default="", help="Start the profile search with this text.")
+def update(query):
     """Updates the selected profile with the new values."""
     click.echo(" ")
-    my_credentials = cred.Credential.get_all()
-    echo_credentials(my_credentials)
     try:
-        selection = click.prompt("Which profile would you like to update", type=int, prompt_suffix="? ") - 1
-        my_credential = my_credentials[selection]
+        my_credential = picker.pick(cred.Credential.select_summaries(), "Which profile would you like to update", query,
+                                    get_recent_profile_ids()).load()
+        click.echo(" ")
 
         click.echo("If you have no new value, just press enter.")
         click.echo(" ")
@@ -211,6 +581,7 @@ def update():
         my_credential.secret_key = click.prompt("New Secret Key [*****]", default=my_credential.secret_key, show_default=False, type=str, hide_input=True)
         my_credential.region = click.prompt("New Region", default=my_credential.region, show_default=True, type=str)
         my_credential.output = click.prompt("New Output Type", default=my_credential.output, show_default=True, type=str)
+        my_credential.mfa_serial = click.prompt("New MFA Device ARN", default=my_credential.mfa_serial or "", show_default=True, type=str) or None
 
         click.echo(" ")
         my_credential.save()
@@ -224,19 +595,29 @@ def update():
 
 
 @click.command()
-def rotate():
+@click.option("--all", "all_profiles", is_flag=True, help="Rotate the Access Key of every saved profile.")
+@click.option("--older-than", default=None, type=click.IntRange(0),
+              help="Only rotate Access Keys at least this many days old (implies --all).")
+@click.option("--filter", "expressions", multiple=True, help=FILTER_HELP + " Implies --all.")
+@click.option("--workers", default=8, show_default=True, type=click.IntRange(1),
+              help="How many profiles to rotate at once.")
+def rotate(all_profiles, older_than, expressions, workers):
     """
         Automatically rotates your access keys. It is recommended
         you do not unless you only use your access key on a single workstation.
+        With --all or --older-than every saved profile is rotated.
     """
     click.echo(" ")
 
-    if util.logged_in():
+    if all_profiles or older_than is not None or expressions:
+        rotate_all(older_than, expressions, workers)
+    elif util.logged_in():
         try:
             current_credential = cred.Credential.get_current()
             click.echo("Current Access Key is '" + current_credential.access_key + "'.")
             click.echo("Rotating keys.")
             credential = util.rotate_access_keys()
+            history.record("rotate", credential, AccessKey=credential.access_key)
             click.echo("Rotation successful.")
             click.echo("New Access Key is '" + credential.access_key + "'.")
         except util.NotLoggedInError as err:
@@ -253,6 +634,81 @@ def rotate():
     click.echo(" ")
 
 
+def rotate_all(older_than, expressions, workers):
+    from creds import fleet
+
+    credentials = cred.Credential.select(expressions)
+    click.echo("Rotating the Access Keys of " + str(len(credentials)) + " profiles.")
+    click.echo(" ")
+    rotated, skipped, failures = fleet.Fleet(workers).rotate(credentials, older_than)
+    names = {c.id: c.name for c in credentials}
+
+    for my_credential in credentials:
+        if my_credential.id in rotated:
+            history.record("rotate", my_credential, AccessKey=rotated[my_credential.id])
+
+    for credential_id in sorted(rotated, key=names.get):
+        click.echo('\033[92m' + names[credential_id] + ": rotated, new Access Key is '" + rotated[credential_id] + "'." +
+                   '\033[0m')
+
+    for credential_id in sorted(failures, key=names.get):
+        click.echo('\033[91m' + names[credential_id] + ": " + get_error_message(failures[credential_id]) + '\033[0m')
+
+    summary = str(len(rotated)) + " rotated, "
+
+    if older_than is not None:
+        summary += str(len(skipped)) + " skipped (newer than " + str(older_than) + " days), "
+
+    click.echo(" ")
+    click.echo(summary + str(len(failures)) + " failed.")
+
+    if failures:
+        click.echo(" ")
+        sys.exit(1)
+
+
+@click.command()
+@click.option("--filter", "expressions", multiple=True, help=FILTER_HELP)
+@click.option("--workers", default=16, show_default=True, type=click.IntRange(1),
+              help="How many profiles to check at once.")
+def audit(expressions, workers):
+    """
+        Checks the age of the Access Key of every saved profile, all at once,
+        and reports the ones that should be rotated.
+    """
+    from creds import fleet
+
+    click.echo(" ")
+    credentials = cred.Credential.select(expressions)
+    results, failures = fleet.Fleet(workers).audit(credentials)
+    old = 0
+
+    for name in sorted(results):
+        result = results[name]
+        line = name + ": " + result["access_key"] + " (" + result["user"] + ", " + result["status"] + ") is " + \
+            str(result["age"]) + " days old."
+
+        if result["age"] < 50:
+            click.echo('\033[92m' + line + '\033[0m')
+        elif result["age"] < 60:
+            click.echo('\033[93m' + line + '\033[0m')
+        else:
+            old += 1
+            click.echo('\033[91m' + line + '\033[0m')
+
+    for name in sorted(failures):
+        click.echo('\033[91m' + name + ": " + get_error_message(failures[name]) + '\033[0m')
+
+    click.echo(" ")
+    click.echo("Checked " + str(len(credentials)) + " profiles, " + str(old) + " older than 60 days, " +
+               str(len(failures)) + " failed.")
+
+    if old:
+        click.echo("Rotate them with 'aws-creds rotate --older-than 60'.")
+
+    click.echo(" ")
+
+
 @click.command(name="get")
 def get_defaults():
     """
@@ -263,6 +719,9 @@ def get_defaults():
     default_config = defaults.DefaultConfiguration()
     click.echo("Default Output: " + default_config.output)
     click.echo("Default Region: " + default_config.region)
+    click.echo("Cache TTL:      " + str(default_config.cache_ttl) + " second(s)")
+    click.echo("Sync Profiles:  " + ("on" if default_config.sync_profiles else "off"))
+    click.echo("Unlock Timeout: " + str(default_config.unlock_timeout) + " second(s)")
 
     click.echo(" ")
 
@@ -270,9 +729,16 @@ def get_defaults():
 @click.command(name="set")
 @click.option("--output", default=None, help="The default output type (json, text, or table).")
 @click.option("--region", default=None, help="The default AWS region you want to use.")
-def set_defaults(output, region):
+@click.option("--cache-ttl", default=None, type=int, help="How long (in seconds) account details are cached for.")
+@click.option("--sync-profiles/--no-sync-profiles", default=None,
+              help="Keep a named profile for every saved profile in the AWS files (see 'aws-creds sync').")
+@click.option("--unlock-timeout", default=None, type=click.IntRange(0),
+              help="How long (in seconds) encrypted profiles stay unlocked for (see 'aws-creds unlock').")
+def set_defaults(output, region, cache_ttl, sync_profiles, unlock_timeout):
     """
-    Allows you to set the default region and output type for the awscli.
+    Allows you to set the default region and output type for the awscli, how
+    long account details fetched from AWS are cached for, whether named
+    profiles are kept in sync and how long encrypted profiles stay unlocked.
     """
     click.echo(" ")
 
@@ -289,6 +755,15 @@ def set_defaults(output, region):
         else:
             default_config.region = click.prompt("New Default Region", default=default_config.region, show_default=True, type=str)
 
+        if cache_ttl is not None:
+            default_config.cache_ttl = cache_ttl
+
+        if sync_profiles is not None:
+            default_config.sync_profiles = sync_profiles
+
+        if unlock_timeout is not None:
+            default_config.unlock_timeout = unlock_timeout
+
         default_config.save()
         click.echo("New defaults saved successfully.")
 
@@ -301,50 +776,145 @@ def set_defaults(output, region):
 
 
 @click.command(name="add")
-def add_role():
+@click.argument("role_arn", required=False)
+@click.option("--alias", default=None, help="A short name to assume the role by (e.g. 'aws-creds role assume prod-admin').")
+@click.option("--tag", "tags", multiple=True, callback=lambda c, p, v: parse_tags(v),
+              help="Tag the role with KEY=VALUE, can be repeated.")
+def add_role(role_arn, alias, tags):
     """
         Adds a role (from another account) that can be assumed using the current
-        iam credentials.
+        iam credentials. Adding a role that is already saved updates its alias
+        and tags.
     """
     my_credential = cred.Credential.get_current()
 
     if my_credential:
         click.echo(" ")
-        role_arn = click.prompt("Assumed Role Arn?", type=str)
+
+        if not role_arn:
+            role_arn = click.prompt("Assumed Role Arn?", type=str)
+            click.echo(" ")
+
+        try:
+            if not roles.is_role_arn(role_arn):
+                raise roles.InvalidRoleArnError(role_arn)
+
+            my_credential.roles.add(roles.Role(role_arn, alias, tags))
+            my_credential.save()
+            click.echo("Role saved successfully.")
+            click.echo(" ")
+        except (roles.InvalidRoleArnError, roles.RoleAliasInUseError) as err:
+            click.echo(err.message)
+            click.echo(" ")
+            sys.exit(1)
+    else:
         click.echo(" ")
-        my_credential.roles.append(role_arn)
-        my_credential.save()
+        click.echo("Not logged in.")
+        click.echo(" ")
+
+
+@click.command(name="import")
+@click.argument("file_name", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--format", "file_format", type=click.Choice(roles.FORMATS), default=None,
+              help="Format of the file (default: guessed from the file extension, otherwise text).")
+def import_roles(file_name, file_format):
+    """
+        Adds every role in FILE_NAME to the current profile: one ARN per line
+        (optionally followed by an alias), CSV with the columns arn, alias and
+        tags (KEY=VALUE separated by spaces), or newline delimited JSON with
+        the same keys. Roles that are already saved are updated.
+    """
+    my_credential = cred.Credential.get_current()
+    click.echo(" ")
+
+    if my_credential:
+        file_format = file_format or roles.guess_format(file_name, "text")
+
+        try:
+            with click.open_file(file_name, "r") as fh:
+                echo_role_import(my_credential, roles.read(fh, file_format))
+        except roles.InvalidRoleArnError as err:
+            click.echo(err.message)
+            click.echo(" ")
+            sys.exit(1)
     else:
+        click.echo("Not logged in.")
         click.echo(" ")
+
+
+@click.command(name="discover")
+@click.option("--source", type=click.Choice(["organizations", "iam"]), default="organizations", show_default=True,
+              help="List a role in every account of the organisation, or the roles of the current account.")
+@click.option("--role-name", default="OrganizationAccountAccessRole", show_default=True,
+              help="organizations: the name of the role to add in every account.")
+@click.option("--path-prefix", default="/", show_default=True, help="iam: only add roles under this path.")
+def discover_roles(source, role_name, path_prefix):
+    """
+        Adds the roles the current profile's keys can find to it: ROLE_NAME in
+        every active account of its AWS Organization (aliased by the
+        account's name), or every role in its own account.
+    """
+    my_credential = cred.Credential.get_current()
+    click.echo(" ")
+
+    if my_credential:
+        try:
+            echo_role_import(my_credential, util.discover_roles(my_credential, source, role_name, path_prefix))
+        except util.RoleDiscoveryError as err:
+            click.echo(err.message)
+            click.echo(err.reason)
+            click.echo(" ")
+            sys.exit(1)
+    else:
         click.echo("Not logged in.")
         click.echo(" ")
 
 
 @click.command(name="assume")
-def assume_role():
+@click.argument("role", required=False)
+@click.option("--refresh", is_flag=True, help="Ignore cached account details and fetch them from AWS.")
+def assume_role(role, refresh):
     """
         Assumes a role (from another account) using current iam credentials.
+        ROLE is the role's alias, ACCOUNT:NAME or ARN, otherwise it is chosen
+        from a list. The temporary credentials from STS are cached (encrypted)
+        and written to the [default] profile, so other tools don't have to
+        assume the role themselves. Run 'aws-creds role refresh' to renew them.
     """
     my_credential = cred.Credential.get_current()
 
     if my_credential:
+        # Looked up first, so an unknown role leaves the current one assumed.
+        selected_role = find_role(my_credential, role) if role else None
+
         if my_credential.get_current_role():
             my_credential.unassume_role()            
             click.echo(" ")
             click.echo("Logged out of current role.")
             click.echo(" ")
-        
-        details = util.get_account_details()
-        click.echo(" ")
-        click.echo("Current Profile: " + my_credential.name)
-        click.echo("Account Number:  " + details["account"])
-        click.echo("Account Aliases: " + details["aliases"])
-        click.echo("Username:        " + details["username"])
-        click.echo(" ")
-        echo_roles(my_credential)
-        role_arn_key = click.prompt("Which role would you like to assume", type=int, prompt_suffix="? ") - 1
-        my_credential.assume_role(my_credential.roles[role_arn_key])
-        click.echo("Role assumed successfully.")
+
+        if selected_role is None:
+            details = util.get_account_details(refresh)
+            click.echo(" ")
+            click.echo("Current Profile: " + my_credential.name)
+            click.echo("Account Number:  " + details["account"])
+            click.echo("Account Aliases: " + details["aliases"])
+            click.echo("Username:        " + details["username"])
+            click.echo(" ")
+            selected_role = choose_role(my_credential, "Which role would you like to assume")
+
+        try:
+            session = util.get_role_session(my_credential, selected_role.arn, refresh)
+            my_credential.assume_role(selected_role.arn, session)
+            my_credential.record_role_use(selected_role.arn)
+            history.record("assume", my_credential, selected_role.arn)
+            click.echo(" ")
+            click.echo("Role '" + selected_role.get_reference() + "' assumed successfully (session expires " +
+                       session["Expiration"] + ").")
+        except util.RoleAssumptionError as err:
+            click.echo(err.message)
+            click.echo(err.reason)
+
         click.echo(" ")
     else:
         click.echo(" ")
@@ -352,6 +922,28 @@ def assume_role():
         click.echo(" ")
 
 
+@click.command(name="refresh")
+@click.option("--force", is_flag=True, help="Renew the session even if it isn't about to expire.")
+def refresh_role(force):
+    """
+        Renews the temporary credentials of the assumed role if they are
+        about to expire. Quiet and cheap when they aren't, so it can be run
+        from cron or a shell hook.
+    """
+    my_credential = cred.Credential.get_current()
+
+    if my_credential and my_credential.get_current_role():
+        try:
+            session = util.refresh_role_session(my_credential, force)
+            click.echo("Role session expires " + session["Expiration"] + ".")
+        except util.RoleAssumptionError as err:
+            click.echo(err.message)
+            click.echo(err.reason)
+            sys.exit(1)
+    else:
+        click.echo("No role assumed.")
+
+
 @click.command(name="unassume")
 def unassume_role():
     """
@@ -361,6 +953,7 @@ def unassume_role():
 
     if my_credential:
         my_credential.unassume_role()
+        history.record("unassume", my_credential)
         click.echo(" ")
         click.echo("Role unassumed.")
         click.echo(" ")
@@ -370,18 +963,28 @@ def unassume_role():
         click.echo(" ")
 
 @click.command(name="ls")
-def list_roles():
+@click.argument("expressions", nargs=-1)
+def list_roles(expressions):
     """
-        Lists roles available to assume.
+        Lists roles available to assume, or only those matching every one of
+        EXPRESSIONS: KEY=VALUE for a tag or a pattern for the alias, account
+        id, name or ARN (e.g. '123456789012:*' or '*admin*').
     """
     my_credential = cred.Credential.get_current()
 
     if my_credential:
+        tags, patterns = cred.Credential.parse_filters(expressions)
+        import fnmatch
+        matching = [r for r in my_credential.roles
+                    if all(r.tags.get(k) == v for k, v in tags.items()) and
+                    all(any(fnmatch.fnmatch(value, p) for value in (r.alias or "", r.account_id + ":" + r.name, r.arn))
+                        for p in patterns)]
+
         click.echo(" ")
         click.echo("Available Roles")
         click.echo(" ")
-        echo_roles(my_credential)
-        click.echo("There are " + str(len(my_credential.roles)) + " roles.")
+        echo_roles(matching)
+        click.echo("There are " + str(len(matching)) + " roles.")
         click.echo(" ")
     else:
         click.echo(" ")
@@ -390,25 +993,33 @@ def list_roles():
 
 
 @click.command(name="rm")
-def remove_role():
+@click.argument("role", required=False)
+def remove_role(role):
     """
-        Removes an assumed role from the credential profile permanently.
+        Removes an assumed role from the credential profile permanently. ROLE
+        is the role's alias, ACCOUNT:NAME or ARN, otherwise it is chosen from
+        a list.
     """
     my_credential = cred.Credential.get_current()
 
     if my_credential:
+        selected_role = find_role(my_credential, role) if role else None
+
         if my_credential.get_current_role():
             my_credential.unassume_role()            
+            history.record("unassume", my_credential)
             click.echo(" ")
             click.echo("Logged out of current role.")
 
         click.echo(" ")
-        echo_roles(my_credential)
-        role_arn_key = click.prompt("Which role would you like to assume", type=int, prompt_suffix="? ") - 1
-        removed_role = my_credential.roles.pop(role_arn_key)
+
+        if selected_role is None:
+            selected_role = choose_role(my_credential, "Which role would you like to remove")
+
+        removed_role = my_credential.roles.remove(selected_role.arn)
         my_credential.save()
         click.echo(" ")
-        click.echo("Removed '" + removed_role + "'.")
+        click.echo("Removed '" + removed_role.arn + "'.")
         click.echo("Role removed successfully.")
         click.echo(" ")
     else:
@@ -417,11 +1028,369 @@ def remove_role():
         click.echo(" ")
 
 
-def echo_roles(my_credentials):
-    for i in range(0, len(my_credentials.roles)):
-        role_arn = my_credentials.roles[i]
+def find_role(my_credential, reference):
+    selected_role = my_credential.roles.find(reference)
+
+    if selected_role is None:
+        click.echo(" ")
+        click.echo("Sorry, '" + my_credential.name + "' has no saved role called '" + reference + "'.")
+        click.echo(" ")
+        sys.exit(1)
+
+    return selected_role
+
+
+def choose_role(my_credential, prompt_text):
+    saved_roles = list(my_credential.roles)
+
+    if not saved_roles:
+        click.echo("There are no saved roles, add one with 'aws-creds role add'.")
+        click.echo(" ")
+        sys.exit(1)
+
+    echo_roles(saved_roles)
+    role_number = click.prompt(prompt_text, type=click.IntRange(1, len(saved_roles)), prompt_suffix="? ")
+    return saved_roles[role_number - 1]
+
+
+def echo_role_import(my_credential, new_roles):
+    added = 0
+    updated = 0
+    unaliased = 0
+
+    for role in new_roles:
+        try:
+            is_new = my_credential.roles.add(role)
+        except roles.RoleAliasInUseError:
+            # Keep the role, but the alias belongs to another one.
+            role.alias = None
+            is_new = my_credential.roles.add(role)
+            unaliased += 1
+
+        added += 1 if is_new else 0
+        updated += 0 if is_new else 1
+
+    my_credential.save()
+    click.echo("Added " + str(added) + " role(s), updated " + str(updated) + ".")
+
+    if unaliased:
+        click.echo(str(unaliased) + " alias(es) were already in use and have been left off.")
+
+    click.echo(" ")
+
+
+@click.command()
+@click.argument("profile")
+@click.argument("tags", nargs=-1, callback=lambda c, p, v: parse_tags(v))
+@click.option("--remove", "removed", multiple=True, help="The key of a tag to remove, can be repeated.")
+def tag(profile, tags, removed):
+    """
+    Sets TAGS (KEY=VALUE, e.g. 'aws-creds tag PROD-PAYMENTS env=prod
+    team=payments') on PROFILE (its name or id), or lists its tags if none
+    are given.
+    """
+    click.echo(" ")
+
+    try:
+        my_credential = cred.Credential.get_by_name_or_id(profile)
+    except cred.CredentialNotFoundError as err:
+        click.echo("Sorry, there is no saved profile called '" + err.credential_id + "'.")
+        click.echo(" ")
+        sys.exit(1)
+
+    if tags or removed:
+        for key in removed:
+            my_credential.tags.pop(key, None)
+
+        my_credential.tags.update(tags)
+        my_credential.save()
+        click.echo("Tags saved successfully.")
+    else:
+        for key, value in sorted(my_credential.tags.items()):
+            click.echo(key + "=" + value)
+
+        if not my_credential.tags:
+            click.echo("'" + my_credential.name + "' has no tags.")
+
+    click.echo(" ")
+
+
+@click.command()
+def tags():
+    """Lists every tag in use and how many profiles have each value."""
+    click.echo(" ")
+
+    for key, values in cred.Credential.get_tags().items():
+        click.echo(key)
+
+        for value, count in values.items():
+            click.echo("    " + value + " (" + str(count) + ")")
+
+    click.echo(" ")
+
+
+@click.command()
+@click.option("--keyring", "use_keyring", is_flag=True,
+              help="Keep the key in the OS keyring (needs the 'keyring' package) instead of using a passphrase.")
+def encrypt(use_keyring):
+    """
+    Encrypts the Secret Key of every saved profile. They are encrypted with
+    a random key, which is itself encrypted with your passphrase (or kept in
+    the OS keyring). Only the Secret Key of the profile being used is ever
+    decrypted, so 'ls' and the picker never need the passphrase.
+
+    \b
+    Once the passphrase has been entered, the profiles stay unlocked for a
+    while (see 'unlock_timeout' under 'aws-creds default'), so commands run
+    straight after each other don't ask for it again. If the profiles are
+    already encrypted, this changes the passphrase.
+    """
+    click.echo(" ")
+
+    try:
+        if use_keyring:
+            vault.enable()
+        else:
+            vault.enable(click.prompt("New passphrase", hide_input=True, confirmation_prompt=True, type=str))
+    except click.Abort:
+        click.echo(" ")
+        click.echo(" ")
+        click.echo("Exiting, no passphrase entered.")
+        click.echo(" ")
+        sys.exit(1)
+    except vault.KeyringNotInstalledError as err:
+        click.echo(err.message)
+        click.echo(" ")
+        sys.exit(1)
+
+    forget_agent_secrets()
+    click.echo("Your saved profiles are now encrypted.")
+
+    if not use_keyring and not vault.can_cache_key():
+        click.echo("$XDG_RUNTIME_DIR isn't set, so every command that needs a Secret Key will ask for the passphrase.")
+
+    click.echo(" ")
+
+
+@click.command()
+def decrypt():
+    """Stops encrypting the Secret Keys of the saved profiles."""
+    click.echo(" ")
+
+    try:
+        vault.disable()
+    except vault.EncryptionNotEnabledError as err:
+        click.echo(err.message)
+        click.echo(" ")
+        sys.exit(1)
+
+    forget_agent_secrets()
+    click.echo("Your saved profiles are no longer encrypted.")
+    click.echo(" ")
+
+
+@click.command()
+@click.option("--timeout", default=None, type=click.IntRange(0),
+              help="How long (in seconds) to stay unlocked for (default: 'unlock_timeout' under 'aws-creds default').")
+def unlock(timeout):
+    """
+    Asks for the passphrase of your encrypted profiles and keeps them
+    unlocked for a while, so commands (and the agent) can use them without
+    asking again. The key is kept in $XDG_RUNTIME_DIR (memory that is
+    cleared when you log out), only readable by you. Where that isn't set
+    the key can't be kept, use the OS keyring instead ('aws-creds encrypt
+    --keyring').
+    """
+    click.echo(" ")
+
+    try:
+        settings = vault.get_enabled_settings()
+
+        if settings["Protector"] != "keyring" and not vault.can_cache_key():
+            click.echo("Sorry, $XDG_RUNTIME_DIR isn't set, so there is nowhere safe to keep the key.")
+            click.echo("Use the OS keyring instead with 'aws-creds encrypt --keyring'.")
+            click.echo(" ")
+            sys.exit(1)
+        passphrase = None if settings["Protector"] == "keyring" else click.prompt("Passphrase", hide_input=True, type=str)
+        vault.unlock(passphrase, timeout)
+    except click.Abort:
+        click.echo(" ")
+        click.echo(" ")
+        click.echo("Exiting, no passphrase entered.")
+        click.echo(" ")
+        sys.exit(1)
+    except (vault.EncryptionNotEnabledError, vault.KeyringNotInstalledError) as err:
+        click.echo(err.message)
+        click.echo(" ")
+        sys.exit(1)
+
+    click.echo("Your saved profiles are unlocked.")
+    click.echo(" ")
+
+
+@click.command()
+def lock():
+    """Locks your encrypted profiles again, in this shell and in the agent."""
+    click.echo(" ")
+    vault.lock()
+    forget_agent_secrets()
+    click.echo("Your saved profiles are locked.")
+    click.echo(" ")
+
+
+def forget_agent_secrets():
+    from creds import agent
+
+    try:
+        agent.send({"lock": True})
+    except agent.AgentNotRunningError:
+        pass
+
+
+@click.command(name="import")
+@click.argument("file_name", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--format", "file_format", type=click.Choice(bulk.FORMATS), default=None,
+              help="Format of the file (default: guessed from the file extension, otherwise ini).")
+def import_profiles(file_name, file_format):
+    """
+    Imports profiles from FILE_NAME, which can be newline delimited JSON, CSV
+    (with the columns name, description, access_key, secret_key, region,
+    output, roles, tags and mfa_serial) or an AWS credentials file such as ~/.aws/credentials.
+    Profiles with an Access Key that is already saved are skipped. Nothing
+    is imported if any profile can't be read.
+    """
+    click.echo(" ")
+    file_format = file_format or bulk.guess_format(file_name, "ini")
+
+    try:
+        with click.open_file(file_name, "r") as fh:
+            saved, skipped = cred.Credential.save_all(bulk.read(fh, file_format))
+    except bulk.ProfileImportError as err:
+        click.echo("Sorry, nothing was imported. " + err.message)
+        click.echo(" ")
+        sys.exit(1)
+
+    click.echo("Imported " + str(saved) + " profile(s), skipped " + str(skipped) + " already saved.")
+    click.echo(" ")
+
+
+@click.command(name="export")
+@click.argument("file_name", default="-", type=click.Path(dir_okay=False, allow_dash=True))
+@click.option("--format", "file_format", type=click.Choice(bulk.FORMATS), default=None,
+              help="Format of the file (default: guessed from the file extension, otherwise ndjson).")
+@click.option("--filter", "expressions", multiple=True, help=FILTER_HELP)
+def export_profiles(file_name, file_format, expressions):
+    """
+    Exports every saved profile (or those matching --filter), including its
+    Secret Key, to FILE_NAME, or to stdout if no file is given.
+    """
+    file_format = file_format or bulk.guess_format(file_name, "ndjson")
+
+    if file_name == "-":
+        fh = click.open_file(file_name, "w")
+    else:
+        # The export holds secret keys, so it is created only readable by the
+        # owner (and an existing file is made so) before any are written.
+        fh = os.fdopen(os.open(file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w")
+        os.chmod(file_name, 0o600)
+
+    with fh:
+        if expressions:
+            bulk.write(fh, cred.Credential.select(expressions), file_format)
+        else:
+            bulk.write(fh, cred.Credential.iterate_all(), file_format)
+
+
+@click.command()
+@click.argument("code", required=False)
+@click.option("--serial", default=None, help="Save this serial number (ARN) as the profile's MFA device first.")
+@click.option("--duration", default=util.MFA_SESSION_DURATION, show_default=True, type=click.IntRange(900, 129600),
+              help="How long the session lasts, in seconds.")
+def mfa(code, serial, duration):
+    """
+    Starts a session for the current profile with its MFA device and CODE
+    (asked for if not given), and logs into it. The temporary credentials
+    (with 'aws_session_token') are written to the [default] profile and
+    cached (encrypted) until they expire, so the code is only needed once
+    per session: 'login', 'role assume', 'env' and 'credential-process' use
+    the cached session.
+    """
+    my_credential = cred.Credential.get_current()
+    click.echo(" ")
+
+    if not my_credential:
+        click.echo("Not logged in.")
+        click.echo(" ")
+        sys.exit(1)
+
+    if serial:
+        my_credential.mfa_serial = serial
+        my_credential.save()
+
+    if not my_credential.mfa_serial:
+        click.echo("Sorry, '" + my_credential.name + "' has no MFA device, add one with 'aws-creds mfa --serial <ARN>'.")
+        click.echo(" ")
+        sys.exit(1)
+
+    code = code or click.prompt("MFA code for " + my_credential.mfa_serial, type=str)
+
+    try:
+        session = util.get_mfa_session(my_credential, code, refresh=True, duration=duration)
+    except util.MfaSessionError as err:
+        click.echo(err.message)
+        click.echo(err.reason)
+        click.echo(" ")
+        sys.exit(1)
+
+    my_credential.login()
+    history.record("login", my_credential)
+    click.echo("MFA session started for '" + my_credential.name + "' (expires " + session["Expiration"] + ").")
+    click.echo(" ")
+
+
+def start_mfa_session(my_credential, code=None):
+    """
+        Makes sure my_credential has an MFA session to log in with if it has
+        an MFA device, asking for a code (in a terminal) when it needs a new
+        one. Otherwise it is logged into with its own keys.
+    """
+    if not my_credential.mfa_serial or my_credential.get_mfa_session():
+        return
+
+    if code is None and sys.stdin.isatty():
+        code = click.prompt("MFA code for " + my_credential.mfa_serial, type=str)
+
+    if code is None:
+        click.echo("'" + my_credential.name + "' has an MFA device, run 'aws-creds mfa' to start a session with it.")
+        return
+
+    try:
+        util.get_mfa_session(my_credential, code)
+    except util.MfaSessionError as err:
+        click.echo(err.message)
+        click.echo(err.reason)
+        click.echo(" ")
+        sys.exit(1)
+
+
+def get_recent_profile_ids():
+    # Enough to fill the picker, see picker.SearchIndex.
+    return history.get_recent_profile_ids(picker.VISIBLE_MATCHES)
+
+
+def echo_roles(saved_roles):
+    for i in range(0, len(saved_roles)):
+        role = saved_roles[i]
         option_number = str(i + 1).zfill(3)
-        click.echo("[" + option_number + "] " + role_arn)
+        click.echo("[" + option_number + "] " + role.get_reference())
+        click.echo("      " + role.arn)
+
+        if role.tags:
+            click.echo("      " + " ".join(k + "=" + v for k, v in sorted(role.tags.items())))
+
+        if role.last_used:
+            click.echo("      Last used " + role.last_used.split(".")[0] + " UTC")
+
         click.echo(" ")
 
 
@@ -431,12 +1400,16 @@ def echo_credentials(my_credentials):
         option_number = str(i + 1).zfill(3)
         click.echo("[" + option_number + "] " + my_credential.name)
         click.echo("      " + my_credential.description)
+
+        if my_credential.tags:
+            click.echo("      " + " ".join(k + "=" + v for k, v in sorted(my_credential.tags.items())))
+
         click.echo(" ")
 
 
-def check_credential_age():
+def check_credential_age(refresh=False):
     try:
-        days_old = util.get_access_key_age()
+        days_old = util.get_access_key_age(refresh)
 
         if days_old == 1:
             time_string = "1 day"
@@ -454,4 +1427,22 @@ def check_credential_age():
         # util.log_error(str(err), "ui.login()")
         print(err)
         click.echo("Error connecting to your account.")
-        click.echo("Please clear any AWS environment variables and try again.")
\ No newline at end of file
+        click.echo("Please clear any AWS environment variables and try again.")
+
+
+def get_default_shell():
+    shell = os.path.basename(os.environ.get("SHELL", ""))
+    return shell if shell in prompt.SHELLS else "bash"
+
+
+def get_error_message(err):
+    return getattr(err, "message", None) or str(err)
+
+
+def parse_tags(expressions):
+    tags, others = cred.Credential.parse_filters(expressions)
+
+    if others:
+        raise click.BadParameter("'" + others[0] + "' isn't a KEY=VALUE tag.")
+
+    return tags
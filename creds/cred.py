@@ -1,32 +1,54 @@
-import uuid
 import os
 import json
 import datetime
+from creds import store, cache, files, ini, profiles, defaults, vault, timing
+# Imported under another name, as roles is also what a Credential's are called.
+from creds import roles as role_catalogue
 
 
 class Credential():
     DEFAULT_CREDENTIAL_DIRECTORY = os.path.expanduser("~/.aws/credential_profiles/")
+    # Each profile's caches (see creds.cache) are kept in a directory of
+    # their own here, away from the profile directories older versions used.
+    CACHE_DIRECTORY = os.path.expanduser("~/.aws/credential_caches/")
+    PROFILE_DIRECTORIES_MIGRATED_SETTING = "profile_directories_migrated"
     OLD_ACCOUNTS_FILE_NAME = os.path.expanduser("~/.aws/accounts.json")
     CURRENT_PROFILE_FILE_NAME = os.path.expanduser("~/.aws/.current_profile")
     AWS_CREDENTIAL_FILE_NAME = os.path.expanduser("~/.aws/credentials")
     AWS_CONFIG_FILE_NAME = os.path.expanduser("~/.aws/config")
     CURRENT_ROLE_FILE_NAME = os.path.expanduser("~/.aws/.current_role")
+    ENVIRONMENT_PROFILE_VARIABLE = "AWS_CREDS_PROFILE"
+    DEFAULT_SECTION_NAME = "default"
 
+    # Thousands of these can be loaded at once (e.g. by the agent), so they
+    # don't each carry a __dict__.
+    __slots__ = ("id", "name", "description", "access_key", "_secret_key", "encrypted_secret_key", "region",
+                 "output", "roles", "tags", "create_date", "modified_date", "mfa_serial")
+
+
+    def __init__(self, name, description, access_key, secret_key, region, output, roles=None, id=None, create_date=None, modified_date=None, tags=None, mfa_serial=None):
+        if not id:
+            # Imported here as uuid is slow to import and only needed for new profiles.
+            import uuid
+            id = str(uuid.uuid4())
+
+        if not create_date:
+            create_date = str(datetime.datetime.utcnow().replace(tzinfo=None))
 
-    def __init__(self, name, description, access_key, secret_key, region, output, roles=[], id=str(uuid.uuid4()), create_date=str(datetime.datetime.utcnow().replace(tzinfo=None)), modified_date=None):
         self.id = id
         self.name = name.upper()
         self.description = description
         self.access_key = access_key
         self.secret_key = secret_key
+        self.encrypted_secret_key = None
         self.region = region
         self.output = output
-        self.roles = roles
+        self.roles = roles if isinstance(roles, role_catalogue.RoleCatalogue) else role_catalogue.RoleCatalogue(roles)
+        self.tags = tags or {}
         self.create_date = create_date
-        if not modified_date:
-            self.modified_date = create_date
-        else:
-            self.modifed_date = modified_date
+        self.modified_date = modified_date or create_date
+        # The serial number (ARN) of the MFA device to start sessions with, see util.get_mfa_session().
+        self.mfa_serial = mfa_serial or None
 
 
     def __lt__(self, other):
@@ -43,118 +65,306 @@ class Credential():
             return False
 
 
-    def to_json(self):
-        credential_dictionary = {
+    @property
+    def secret_key(self):
+        # Only decrypted (see vault) when it is actually used.
+        if self._secret_key is None and self.encrypted_secret_key is not None:
+            self._secret_key = vault.decrypt(self.encrypted_secret_key, self.id)
+
+        return self._secret_key
+
+
+    @secret_key.setter
+    def secret_key(self, secret_key):
+        self._secret_key = secret_key
+        self.encrypted_secret_key = None
+
+
+    def to_dictionary(self, encrypt=False):
+        """
+            Returns the profile as saved in the store. With encrypt set, the
+            Secret Key is encrypted if the store's secrets are (see vault).
+        """
+        if encrypt and vault.is_enabled():
+            if self.encrypted_secret_key is None:
+                self.encrypted_secret_key = vault.encrypt(self._secret_key, self.id)
+
+            credentials = {
+                "AccessKey": self.access_key,
+                "EncryptedSecretKey": self.encrypted_secret_key
+            }
+        else:
+            credentials = {
+                "AccessKey": self.access_key,
+                "SecretKey": self.secret_key
+            }
+
+        options = {
+            "Region": self.region,
+            "OutputType": self.output
+        }
+
+        if self.mfa_serial:
+            options["MfaSerial"] = self.mfa_serial
+
+        return {
             "Id": self.id,
             "Name": self.name,
             "Description": self.description,
-            "Credentials": {
-                "AccessKey": self.access_key,
-                "SecretKey": self.secret_key
-            },
-            "Options": {
-                "Region": self.region,
-                "OutputType": self.output
-            },
-            "Roles": self.roles,
+            "Credentials": credentials,
+            "Options": options,
+            "Roles": self.roles.to_list(),
+            "Tags": self.tags,
             "CreateDate": self.create_date,
-            "ModifiedDate": self.modifed_date
+            "ModifiedDate": self.modified_date
         }
 
-        return json.dumps(credential_dictionary, indent=4)
+
+    def to_json(self):
+        return json.dumps(self.to_dictionary(), indent=4)
 
 
     @staticmethod
-    def from_json(id):
-        credential_file_name = Credential.DEFAULT_CREDENTIAL_DIRECTORY + id + "/credential.json"
+    def from_dictionary(existing_credential):
+        # existing_credential may be shared with the store's cache, so it is
+        # never changed (the role catalogue only reads it) and its tags are copied.
+        credential = Credential(
+            existing_credential["Name"],
+            existing_credential["Description"],
+            existing_credential["Credentials"]["AccessKey"],
+            existing_credential["Credentials"].get("SecretKey"),
+            existing_credential["Options"]["Region"],
+            existing_credential["Options"]["OutputType"],
+            # Added for backwards compatibility
+            existing_credential.get("Roles", []),
+            existing_credential["Id"],
+            existing_credential["CreateDate"],
+            existing_credential["ModifiedDate"],
+            # Added for backwards compatibility
+            dict(existing_credential.get("Tags", {})),
+            existing_credential["Options"].get("MfaSerial")
+        )
+        credential.encrypted_secret_key = existing_credential["Credentials"].get("EncryptedSecretKey")
+        return credential
 
-        if os.path.exists(credential_file_name):
-            with open(credential_file_name, "r") as fh:
-                existing_credential = json.loads(fh.read())
 
-            # Added for backwards compatibility
-            if "Roles" not in existing_credential:
-                existing_credential["Roles"] = []
-            
-            credential = Credential(
-                existing_credential["Name"],
-                existing_credential["Description"],
-                existing_credential["Credentials"]["AccessKey"],
-                existing_credential["Credentials"]["SecretKey"],
-                existing_credential["Options"]["Region"],
-                existing_credential["Options"]["OutputType"],
-                existing_credential["Roles"],
-                existing_credential["Id"],
-                existing_credential["CreateDate"],
-                existing_credential["ModifiedDate"]
-            )
-
-            return credential
+    @staticmethod
+    def from_json(id):
+        existing_credential = store.get(id)
+
+        if existing_credential:
+            return Credential.from_dictionary(existing_credential)
         else:
             raise CredentialNotFoundError(id)
 
 
-    def save(self):
-        credential_file_name = self.get_credential_file_name()
-        os.makedirs(self.get_directory(), exist_ok=True)
-        self.modifed_date = str(datetime.datetime.utcnow().replace(tzinfo=None))
-        serialized_self = self.to_json()
+    def save(self, sync=True):
+        self.modified_date = str(datetime.datetime.utcnow().replace(tzinfo=None))
+        store.put(self.to_dictionary(encrypt=True))
+        cache.ProfileCache(self).clear()
 
-        with open(credential_file_name, "w+") as fh:
-            fh.write(serialized_self)
+        if sync:
+            Credential.sync_profiles_if_enabled()
 
 
-    def create_credential_file(self):
-        credential_file_contents = "[default]" + os.linesep
-        credential_file_contents += "aws_access_key_id=" + self.access_key + os.linesep
-        credential_file_contents += "aws_secret_access_key=" + self.secret_key
+    @staticmethod
+    def save_all(credentials):
+        """
+            Saves credentials (any iterable) in a single transaction, skipping
+            those with an Access Key that is already saved. Returns the number
+            of credentials saved and the number skipped.
+        """
+        saved = 0
+        skipped = 0
 
-        credential_file = open(Credential.AWS_CREDENTIAL_FILE_NAME, "w+")
-        credential_file.write(credential_file_contents)
-        credential_file.close()
+        with store.get_connection() as connection:
+            for credential in credentials:
+                if store.has_access_key(credential.access_key):
+                    skipped += 1
+                else:
+                    credential.modified_date = str(datetime.datetime.utcnow().replace(tzinfo=None))
+                    store.put(credential.to_dictionary(encrypt=True), connection)
+                    saved += 1
 
+        Credential.sync_profiles_if_enabled()
+        return saved, skipped
 
-    def create_default_options_file(self):
+
+    @staticmethod
+    def sync_profiles():
+        """
+            Writes every saved profile into its own named profile in the AWS
+            credentials and config files (see profiles.sync()).
+        """
+        return profiles.sync(Credential.iterate_all(), Credential.AWS_CREDENTIAL_FILE_NAME,
+                             Credential.AWS_CONFIG_FILE_NAME)
+
+
+    @staticmethod
+    def sync_profiles_if_enabled():
+        if defaults.DefaultConfiguration().sync_profiles:
+            Credential.sync_profiles()
+
+
+    def get_credential_file_contents(self, session=None):
+        """
+            Returns the [default] section for the AWS Credential file, using the
+            temporary credentials in session (as returned by STS) if given.
+        """
+        if session:
+            credential_file_contents = "[default]" + os.linesep
+            credential_file_contents += "aws_access_key_id=" + session["AccessKeyId"] + os.linesep
+            credential_file_contents += "aws_secret_access_key=" + session["SecretAccessKey"] + os.linesep
+            credential_file_contents += "aws_session_token=" + session["SessionToken"]
+        else:
+            credential_file_contents = "[default]" + os.linesep
+            credential_file_contents += "aws_access_key_id=" + self.access_key + os.linesep
+            credential_file_contents += "aws_secret_access_key=" + self.secret_key
+
+        return credential_file_contents
+
+
+    def get_default_options_file_contents(self):
         options_file_contents = "[default]" + os.linesep
         options_file_contents += "region=" + self.region + os.linesep
         options_file_contents += "output=" + self.output
-        options_file = open(Credential.AWS_CONFIG_FILE_NAME, "w+")
-        options_file.write(options_file_contents)
-        options_file.close()
+        return options_file_contents
+
+
+    def get_environment_variables(self):
+        """
+            Returns the environment variables that give a process this
+            credential (its MFA session if it has one) without touching the
+            shared AWS files (see 'aws-creds env').
+        """
+        session = self.get_mfa_session()
+        variables = {
+            "AWS_ACCESS_KEY_ID": session["AccessKeyId"] if session else self.access_key,
+            "AWS_SECRET_ACCESS_KEY": session["SecretAccessKey"] if session else self.secret_key,
+            "AWS_DEFAULT_REGION": self.region,
+            "AWS_REGION": self.region,
+            "AWS_DEFAULT_OUTPUT": self.output,
+            Credential.ENVIRONMENT_PROFILE_VARIABLE: self.id
+        }
+
+        if session:
+            variables["AWS_SESSION_TOKEN"] = session["SessionToken"]
+
+        return variables
+
+
+    def get_mfa_session(self):
+        """
+            Returns the cached session started with the profile's MFA device,
+            or None if it has no MFA device or the session has (nearly) expired.
+        """
+        if self.mfa_serial:
+            return cache.MfaSessionCache(self).get_valid(self.mfa_serial)
+        else:
+            return None
+
+
+    def create_credential_file(self):
+        with files.lock():
+            files.write(Credential.AWS_CREDENTIAL_FILE_NAME,
+                        Credential.merge_default_section(Credential.AWS_CREDENTIAL_FILE_NAME, self.get_credential_file_contents()))
 
 
+    def create_default_options_file(self):
+        with files.lock():
+            files.write(Credential.AWS_CONFIG_FILE_NAME,
+                        Credential.merge_default_section(Credential.AWS_CONFIG_FILE_NAME, self.get_default_options_file_contents()))
+
+
+    @staticmethod
+    def merge_default_section(file_name, section_contents):
+        """
+            Returns the contents of file_name with its [default] section replaced
+            by section_contents (or removed if it is None), keeping every other
+            section as it is. Call while holding files.lock().
+        """
+        return ini.merge_sections(ini.read(file_name), {Credential.DEFAULT_SECTION_NAME: section_contents})
+
+
+    @timing.traced("profile.login")
     def login(self):
-        self.create_credential_file()
-        self.create_default_options_file()
-        current_profile_file_contents = self.id
-        current_profile_file = open(Credential.CURRENT_PROFILE_FILE_NAME, "w+")
-        current_profile_file.write(current_profile_file_contents)
-        current_profile_file.close()
+        """
+            Writes the profile's keys (or its MFA session, including the
+            session token, while it has one) to the [default] profile, and
+            the profile to the shell prompt file (see creds.prompt).
+        """
+        # Imported here (as in the other methods that write the prompt file)
+        # so importing cred stays cheap and doesn't import util through it.
+        from creds import prompt
+
+        session = self.get_mfa_session()
+
+        with files.lock():
+            files.write_all({
+                Credential.AWS_CREDENTIAL_FILE_NAME: Credential.merge_default_section(
+                    Credential.AWS_CREDENTIAL_FILE_NAME, self.get_credential_file_contents(session)),
+                Credential.AWS_CONFIG_FILE_NAME: Credential.merge_default_section(
+                    Credential.AWS_CONFIG_FILE_NAME, self.get_default_options_file_contents()),
+                Credential.CURRENT_PROFILE_FILE_NAME: self.id,
+                prompt.PROMPT_FILE_NAME: prompt.get_contents(self)
+            })
+            files.remove(Credential.CURRENT_ROLE_FILE_NAME)
+
         return True
     
 
-    def assume_role(self, role_arn):
-        self.create_default_options_file()
-
+    def assume_role(self, role_arn, session):
+        """
+            Switches the [default] profile to the temporary credentials in
+            session, which STS returned for role_arn (see util.get_role_session()).
+        """
         if role_arn not in self.roles:
             raise RoleNotSavedInCurrentCredentialError(role_arn)
 
-        options_file_contents = os.linesep
-        options_file_contents += "role_arn=" + role_arn + os.linesep
-        options_file_contents += "source_profile=default"
-        options_file = open(Credential.AWS_CONFIG_FILE_NAME, "a")
-        options_file.write(options_file_contents)
-        options_file.close()
+        from creds import prompt
 
-        current_profile_file = open(Credential.CURRENT_ROLE_FILE_NAME, "w+")
-        current_profile_file.write(role_arn)
-        current_profile_file.close()
+        with files.lock():
+            files.write_all({
+                Credential.AWS_CREDENTIAL_FILE_NAME: Credential.merge_default_section(
+                    Credential.AWS_CREDENTIAL_FILE_NAME, self.get_credential_file_contents(session)),
+                Credential.AWS_CONFIG_FILE_NAME: Credential.merge_default_section(
+                    Credential.AWS_CONFIG_FILE_NAME, self.get_default_options_file_contents()),
+                Credential.CURRENT_ROLE_FILE_NAME: role_arn,
+                prompt.PROMPT_FILE_NAME: prompt.get_contents(self, role_arn)
+            })
 
         return True
 
 
+    def resolve_role(self, reference):
+        """
+            Returns the ARN of the saved role reference (an ARN, alias or
+            ACCOUNT:NAME) refers to. Only the profile's saved roles can be
+            assumed, so raises RoleNotSavedInCurrentCredentialError for any
+            other.
+        """
+        role = self.roles.find(reference)
+
+        if role is None:
+            raise RoleNotSavedInCurrentCredentialError(reference)
+
+        return role.arn
+
+
+    def record_role_use(self, role_arn):
+        """
+            Saves when role_arn was last assumed. Only the profile's document
+            changes, so unlike save() its caches are kept.
+        """
+        self.roles.get(role_arn).last_used = str(datetime.datetime.utcnow().replace(tzinfo=None))
+        store.put(self.to_dictionary(encrypt=True))
+
+
     def get_current_role(self):
-        if os.path.exists(Credential.CURRENT_ROLE_FILE_NAME):
+        if os.environ.get(Credential.ENVIRONMENT_PROFILE_VARIABLE) == self.id:
+            # Roles are only assumed through the shared AWS files.
+            return None
+        elif os.path.exists(Credential.CURRENT_ROLE_FILE_NAME):
             with open(Credential.CURRENT_ROLE_FILE_NAME, "r") as fh:
                 current_role_arn = fh.read()
 
@@ -166,14 +376,40 @@ class Credential():
             return None 
 
 
+    def update_prompt(self):
+        """
+            Rewrites the shell prompt file if this is the profile logged into,
+            e.g. once its account id or Access Key age have been looked up.
+        """
+        from creds import prompt
+
+        with files.lock():
+            if os.path.exists(Credential.CURRENT_PROFILE_FILE_NAME):
+                with open(Credential.CURRENT_PROFILE_FILE_NAME, "r") as fh:
+                    current_profile_id = fh.read()
+
+                if current_profile_id == self.id:
+                    files.write(prompt.PROMPT_FILE_NAME, prompt.get_contents(self, self.get_current_role()))
+
+
     def unassume_role(self):
-        self.create_default_options_file()
-        os.remove(Credential.CURRENT_ROLE_FILE_NAME)
+        # Logging in again puts back the profile's own (long lived) keys.
+        self.login()
 
 
     def remove(self):
-        os.remove(self.get_credential_file_name())
-        os.rmdir(self.get_directory())
+        store.delete(self.id)
+        cache.ProfileCache(self).clear()
+        cache.RoleSessionCache(self).clear()
+        cache.MfaSessionCache(self).clear()
+        Credential.sync_profiles_if_enabled()
+
+        if os.path.isdir(self.get_cache_directory()):
+            try:
+                os.rmdir(self.get_cache_directory())
+            except OSError:
+                pass
+
         self.id = None
         self.name = None
         self.description = None
@@ -186,18 +422,23 @@ class Credential():
         return True
 
 
-    def get_directory(self):
-        return Credential.DEFAULT_CREDENTIAL_DIRECTORY + self.id
-
-    def get_credential_file_name(self):
-        return self.get_directory() + "/credential.json"
+    def get_cache_directory(self):
+        return Credential.CACHE_DIRECTORY + self.id
 
 
     @staticmethod
     def migrate():
         """
-            Run once to migrate file version from < v0.5.0 to new structure.
+            Run once to migrate file version from < v0.5.0 to new structure, and
+            to move profiles from the one directory per profile layout into the
+            profile store.
         """
+        Credential.migrate_accounts_file()
+        Credential.migrate_profile_directories()
+
+
+    @staticmethod
+    def migrate_accounts_file():
         if os.path.exists(Credential.OLD_ACCOUNTS_FILE_NAME):
             with open(Credential.OLD_ACCOUNTS_FILE_NAME, "r") as fh:
                 old_accounts = json.loads(fh.read())
@@ -217,46 +458,199 @@ class Credential():
 
 
     @staticmethod
+    def migrate_profile_directories():
+        """
+            Moves the profiles out of their directories into the store, and
+            their caches into CACHE_DIRECTORY. Done once per store, which
+            records that it has been, so the directories aren't looked
+            through on every command.
+        """
+        if store.get_setting(Credential.PROFILE_DIRECTORIES_MIGRATED_SETTING):
+            return
+
+        migrated_directories = []
+
+        with store.get_connection() as connection:
+            if os.path.isdir(Credential.DEFAULT_CREDENTIAL_DIRECTORY):
+                for profile in os.listdir(Credential.DEFAULT_CREDENTIAL_DIRECTORY):
+                    credential_file_name = Credential.DEFAULT_CREDENTIAL_DIRECTORY + profile + "/credential.json"
+
+                    if profile != "defaults" and os.path.isfile(credential_file_name):
+                        with open(credential_file_name, "r") as fh:
+                            existing_credential = json.loads(fh.read())
+
+                        # Added for backwards compatibility
+                        if "Roles" not in existing_credential:
+                            existing_credential["Roles"] = []
+
+                        store.put(existing_credential, connection)
+
+                    if profile != "defaults" and os.path.isdir(Credential.DEFAULT_CREDENTIAL_DIRECTORY + profile):
+                        migrated_directories.append(profile)
+
+            store.put_setting(Credential.PROFILE_DIRECTORIES_MIGRATED_SETTING, True, connection)
+
+        # Only clean up once every profile has been committed to the store.
+        for profile in migrated_directories:
+            directory = Credential.DEFAULT_CREDENTIAL_DIRECTORY + profile
+
+            for file_name in [cache.ProfileCache.FILE_NAME, cache.RoleSessionCache.FILE_NAME,
+                              cache.MfaSessionCache.FILE_NAME]:
+                if os.path.isfile(directory + "/" + file_name):
+                    os.makedirs(Credential.CACHE_DIRECTORY + profile, exist_ok=True)
+                    os.replace(directory + "/" + file_name, Credential.CACHE_DIRECTORY + profile + "/" + file_name)
+
+            if os.path.isfile(directory + "/credential.json"):
+                os.remove(directory + "/credential.json")
+
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+
+    @staticmethod
+    @timing.traced("profiles.get_all")
     def get_all():
-        all_credentials = []
-        profiles = os.listdir(Credential.DEFAULT_CREDENTIAL_DIRECTORY)
+        return [Credential.from_dictionary(c) for c in store.get_all()]
+
+
+    @staticmethod
+    def iterate_all(tags=None):
+        for existing_credential in store.iterate(tags):
+            yield Credential.from_dictionary(existing_credential)
+
 
-        for profile in profiles:
-            if profile != "defaults":
-                all_credentials.append(Credential.from_json(profile))
+    @staticmethod
+    @timing.traced("profiles.select")
+    def select(expressions=None):
+        """
+            Returns the saved profiles matching every one of expressions: either
+            KEY=VALUE (the profile has that tag) or a shell style pattern
+            (e.g. 'PROD-*') for its name or id, of which one has to match. Tags
+            are looked up in the store's index, so only the profiles with them
+            are read.
+        """
+        tags, patterns = Credential.parse_filters(expressions or [])
+        return Credential.match_patterns(Credential.iterate_all(tags), patterns)
+
+
+    @staticmethod
+    @timing.traced("profiles.select_summaries")
+    def select_summaries(expressions=None):
+        """
+            Like select(), but returns a CredentialSummary of each profile,
+            read from the store's indexed columns without reading its
+            document. Use to list or pick profiles, then load() the one needed.
+        """
+        tags, patterns = Credential.parse_filters(expressions or [])
+        summaries = [CredentialSummary(*row) for row in store.get_summaries(tags)]
+        return Credential.match_patterns(summaries, patterns)
+
+
+    @staticmethod
+    def match_patterns(credentials, patterns):
+        """Returns the credentials (or summaries) whose name or id matches one of patterns, or all if there are none."""
+        if not patterns:
+            return list(credentials)
 
-        all_credentials.sort()
-        return all_credentials
+        import fnmatch
+        patterns = [p.upper() for p in patterns]
+        return [c for c in credentials
+                if any(fnmatch.fnmatchcase(c.name, p) or fnmatch.fnmatchcase(c.id.upper(), p) for p in patterns)]
+
+
+    @staticmethod
+    def parse_filters(expressions):
+        """Splits expressions into a dict of the KEY=VALUE tags and a list of everything else."""
+        tags = {}
+        patterns = []
+
+        for expression in expressions:
+            if "=" in expression:
+                key, value = expression.split("=", 1)
+                tags[key.strip()] = value.strip()
+            else:
+                patterns.append(expression)
+
+        return tags, patterns
+
+
+    @staticmethod
+    def get_tags():
+        """Returns every tag in use, as a dict of key to a dict of value to the number of profiles with it."""
+        return store.get_tags()
 
 
     @staticmethod
     def get_by_access_key(access_key):
-        all_credentials = Credential.get_all()
+        existing_credential = store.get_by_access_key(access_key)
 
-        for credential in all_credentials:
-            if credential.access_key == access_key:
-                return credential
+        if existing_credential:
+            return Credential.from_dictionary(existing_credential)
         
         raise(NoCredentialFoundForAccessKeyError(access_key))
+
+
+    @staticmethod
+    def get_by_name(name):
+        existing_credential = store.get_by_name(name)
+
+        if existing_credential:
+            return Credential.from_dictionary(existing_credential)
+
+        raise(CredentialNotFoundError(name))
+
+
+    @staticmethod
+    def get_by_name_or_id(name_or_id):
+        try:
+            return Credential.get_by_name(name_or_id)
+        except CredentialNotFoundError:
+            return Credential.from_json(name_or_id)
     
 
     @staticmethod
     def logout():
-        if os.path.exists(Credential.CURRENT_PROFILE_FILE_NAME):
-            os.remove(Credential.CURRENT_PROFILE_FILE_NAME)
+        from creds import prompt
+
+        try:
+            my_credential = Credential.get_current()
 
-        if os.path.exists(Credential.AWS_CREDENTIAL_FILE_NAME):
-            os.remove(Credential.AWS_CREDENTIAL_FILE_NAME)
+            if my_credential:
+                cache.ProfileCache(my_credential).clear()
+                cache.RoleSessionCache(my_credential).clear()
+        except CredentialNotFoundError:
+            pass
 
-        if os.path.exists(Credential.AWS_CONFIG_FILE_NAME):
-            os.remove(Credential.AWS_CONFIG_FILE_NAME)
+        with files.lock():
+            files.remove(Credential.CURRENT_PROFILE_FILE_NAME)
+            files.remove(Credential.CURRENT_ROLE_FILE_NAME)
+            files.remove(prompt.PROMPT_FILE_NAME)
+
+            # Only the [default] profile is ours, leave any other profiles be.
+            for file_name in [Credential.AWS_CREDENTIAL_FILE_NAME, Credential.AWS_CONFIG_FILE_NAME]:
+                contents = Credential.merge_default_section(file_name, None)
+
+                if contents.strip():
+                    files.write(file_name, contents)
+                else:
+                    files.remove(file_name)
 
         return True
     
 
     @staticmethod
     def get_current():
-        if os.path.exists(Credential.CURRENT_PROFILE_FILE_NAME):
+        """
+            Returns the credential in use: the one exported into this process
+            by 'aws-creds env' if there is one, otherwise the one logged into.
+        """
+        my_credential = Credential.get_environment_current()
+
+        if my_credential:
+            return my_credential
+        elif os.path.exists(Credential.CURRENT_PROFILE_FILE_NAME):
             with open(Credential.CURRENT_PROFILE_FILE_NAME, "r") as fh:
                 current_profile_id = fh.read()
 
@@ -266,6 +660,52 @@ class Credential():
             return None
 
 
+    @staticmethod
+    def get_environment_current():
+        profile_id = os.environ.get(Credential.ENVIRONMENT_PROFILE_VARIABLE)
+
+        if profile_id:
+            try:
+                my_credential = Credential.from_json(profile_id)
+            except CredentialNotFoundError:
+                return None
+
+            # Only trust the variable while the exported Access Key (or MFA session) is still in use.
+            if os.environ.get("AWS_ACCESS_KEY_ID") == my_credential.access_key:
+                return my_credential
+
+            session = my_credential.get_mfa_session()
+
+            if session and os.environ.get("AWS_ACCESS_KEY_ID") == session["AccessKeyId"]:
+                return my_credential
+
+        return None
+
+
+class CredentialSummary():
+    """
+        What listing or picking a saved profile needs of it (see
+        Credential.select_summaries()). Its keys, roles and options are only
+        read from the store by load().
+    """
+    __slots__ = ("id", "name", "description", "tags")
+
+
+    def __init__(self, id, name, description, tags):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.tags = tags
+
+
+    def __lt__(self, other):
+        return self.name < other.name
+
+
+    def load(self):
+        return Credential.from_json(self.id)
+
+
 class CredentialNotFoundError(Exception):
     def __init__(self, credential_id):
         self.credential_id = credential_id
@@ -281,4 +721,7 @@ class NoCredentialFoundForAccessKeyError(Exception):
 class RoleNotSavedInCurrentCredentialError(Exception):
     def __init__(self, role_arn):
         self.role_arn = role_arn
-        self.message = "Sorry, you can only assume roles that have been saved into the current credential."
\ No newline at end of file
+        self.message = "Sorry, you can only assume roles that have been saved into the current credential."
+
+
+store.register_migration(Credential.migrate)
@@ -0,0 +1,79 @@
+import os
+from creds import timing
+
+
+KEY_FILE_NAME = os.path.expanduser("~/.aws/credential_profiles/.cache.key")
+NONCE_SIZE = 12
+
+
+def get_key():
+    """
+        Returns the key used to encrypt cached session credentials when the
+        saved profiles aren't encrypted (see cache.get_session_key()),
+        creating a random one (readable only by the owner) the first time it
+        is needed. It is kept next to the cache, so this only obfuscates the
+        sessions: anyone who can read your files can decrypt them.
+    """
+    if not os.path.exists(KEY_FILE_NAME):
+        os.makedirs(os.path.dirname(KEY_FILE_NAME), exist_ok=True)
+
+        try:
+            fd = os.open(KEY_FILE_NAME, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            # Another process created it first, use theirs.
+            pass
+        else:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(os.urandom(32))
+
+    with open(KEY_FILE_NAME, "rb") as fh:
+        return fh.read()
+
+
+@timing.traced("crypto.encrypt")
+def encrypt(data, key=None, associated_data=None):
+    """
+        Encrypts data (bytes) with AES-GCM, returning the nonce and ciphertext
+        as base64 text. associated_data (bytes) isn't encrypted, but the same
+        has to be given to decrypt it.
+    """
+    # Imported here as cryptography is slow to import and rarely needed.
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    nonce = os.urandom(NONCE_SIZE)
+    ciphertext = AESGCM(key or get_key()).encrypt(nonce, data, associated_data)
+    return encode(nonce + ciphertext)
+
+
+@timing.traced("crypto.decrypt")
+def decrypt(token, key=None, associated_data=None):
+    """
+        Decrypts text returned by encrypt(). Raises DecryptionError if it was
+        encrypted with another key or has been tampered with.
+    """
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    try:
+        data = decode(token)
+        return AESGCM(key or get_key()).decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], associated_data)
+    except (InvalidTag, ValueError):
+        raise DecryptionError()
+
+
+def encode(data):
+    """Returns data (bytes) as base64 text."""
+    # Imported here as base64 is slow to import (it imports struct) and only
+    # needed for encrypted data.
+    import base64
+    return base64.b64encode(data).decode()
+
+
+def decode(text):
+    """Returns the bytes encode() returned text for."""
+    import base64
+    return base64.b64decode(text)
+
+
+class DecryptionError(Exception):
+    def __init__(self):
+        self.message = "Sorry, the data couldn't be decrypted. It was encrypted with another key or has been changed."
@@ -1,12 +1,16 @@
 import json
 import os
+from creds import files
 
 
 class DefaultConfiguration():
     CONFIG_FILE_NAME = os.path.expanduser("~/.aws/credential_profiles/defaults/defaults.json")
     DEFAULT_DEFAULTS = {
             "output": "json",
-            "region": "us-east-1"
+            "region": "us-east-1",
+            "cache_ttl": 3600,
+            "sync_profiles": False,
+            "unlock_timeout": 900
         }
 
     def __init__(self):
@@ -16,6 +20,9 @@ class DefaultConfiguration():
         if not os.path.exists(DefaultConfiguration.CONFIG_FILE_NAME):
             self.output = DefaultConfiguration.DEFAULT_DEFAULTS["output"]
             self.region = DefaultConfiguration.DEFAULT_DEFAULTS["region"]
+            self.cache_ttl = DefaultConfiguration.DEFAULT_DEFAULTS["cache_ttl"]
+            self.sync_profiles = DefaultConfiguration.DEFAULT_DEFAULTS["sync_profiles"]
+            self.unlock_timeout = DefaultConfiguration.DEFAULT_DEFAULTS["unlock_timeout"]
             self.save()
         else:
             self.load()
@@ -23,14 +30,20 @@ class DefaultConfiguration():
     def save(self):
         defaults = {
             "output": self.output,
-            "region": self.region
+            "region": self.region,
+            "cache_ttl": self.cache_ttl,
+            "sync_profiles": self.sync_profiles,
+            "unlock_timeout": self.unlock_timeout
         }
 
-        with open(DefaultConfiguration.CONFIG_FILE_NAME, "w+") as fh:
-            fh.write(json.dumps(defaults, indent=4))
+        files.write(DefaultConfiguration.CONFIG_FILE_NAME, json.dumps(defaults, indent=4))
 
     def load(self):
         with open(DefaultConfiguration.CONFIG_FILE_NAME, "r") as fh:
             defaults = json.loads(fh.read())
             self.output = defaults["output"]
             self.region = defaults["region"]
+            # Added for backwards compatibility
+            self.cache_ttl = defaults.get("cache_ttl", DefaultConfiguration.DEFAULT_DEFAULTS["cache_ttl"])
+            self.sync_profiles = defaults.get("sync_profiles", DefaultConfiguration.DEFAULT_DEFAULTS["sync_profiles"])
+            self.unlock_timeout = defaults.get("unlock_timeout", DefaultConfiguration.DEFAULT_DEFAULTS["unlock_timeout"])
@@ -0,0 +1,73 @@
+import os
+import sys
+
+# Also defined in creds.timing, which is only imported when timing is asked for.
+TIMINGS_OPTION = "--timings"
+TRACE_FILE_VARIABLE = "AWS_CREDS_TRACE_FILE"
+
+
+def main():
+    """
+        Console script entry point. 'aws-creds login <NAME|ID> --no-age-check'
+        and 'aws-creds credential-process <NAME|ID>' are served from here
+        without importing click, as they are run from scripts, shell hooks and
+        AWS SDKs where start up time matters. Everything else (including any
+        error in the fast path) is handled by the click application.
+
+        --timings (anywhere in the arguments) prints how long each phase of
+        the command took, see creds.timing.
+    """
+    arguments = sys.argv[1:]
+
+    if TIMINGS_OPTION in arguments or os.environ.get(TRACE_FILE_VARIABLE):
+        from creds import timing
+
+        arguments = timing.enable_from_arguments(arguments)
+        sys.argv[1:] = arguments
+
+        with timing.span("aws-creds " + (arguments[0] if arguments else "")):
+            run(arguments)
+    else:
+        run(arguments)
+
+
+def run(arguments):
+    if len(arguments) == 2 and arguments[0] == "credential-process" and not arguments[1].startswith("-"):
+        from creds import agent
+        sys.exit(agent.credential_process(arguments[1]))
+
+    if len(arguments) == 3 and arguments[0] == "login" and "--no-age-check" in arguments:
+        profile = [a for a in arguments[1:] if a != "--no-age-check"][0]
+
+        if not profile.startswith("-") and fast_login(profile):
+            return
+
+    from creds import timing
+
+    with timing.span("import cli"):
+        from creds.main import main as click_main
+
+    click_main()
+
+
+def fast_login(profile):
+    from creds import cred, util, vault, history
+
+    try:
+        util.check_environment()
+        my_credential = cred.Credential.get_by_name_or_id(profile)
+
+        if my_credential.mfa_serial and not my_credential.get_mfa_session():
+            # Needs an MFA code, which the click application asks for.
+            return False
+
+        my_credential.login()
+        history.record("login", my_credential)
+    except (cred.CredentialNotFoundError, util.EnvironmentVariableIsSetError,
+            vault.VaultLockedError, vault.IncorrectPassphraseError):
+        return False
+
+    print(" ")
+    print("Successfully logged into '" + my_credential.name + "'.")
+    print(" ")
+    return True
@@ -0,0 +1,179 @@
+import os
+import sys
+import threading
+import subprocess
+from creds import cred, timing
+
+
+DEFAULT_WORKERS = 16
+
+
+def select(expressions=None):
+    """
+        Returns the saved profiles matching expressions (see
+        Credential.select()), or every profile if there are none.
+    """
+    return cred.Credential.select(expressions)
+
+
+def run_command(credentials, command, workers=DEFAULT_WORKERS, output=None):
+    """
+        Runs command (a list of arguments) once for every credential in
+        credentials, at most workers at a time, each with that credential in
+        its environment (see 'aws-creds env') so nothing in ~/.aws changes.
+        Every line the commands print is written to output as it arrives,
+        tagged with the profile's name. Returns a dict of profile name to exit
+        code, and a dict of profile name to error for the ones that failed.
+    """
+    output = output or sys.stdout
+    output_lock = threading.Lock()
+    environment = {k: v for k, v in os.environ.items() if k not in ("AWS_SESSION_TOKEN", "AWS_PROFILE")}
+    width = max([len(c.name) for c in credentials] or [0])
+
+    def run(my_credential):
+        tag = ("[" + my_credential.name + "]").ljust(width + 2) + " "
+        process = subprocess.Popen(command, env=dict(environment, **my_credential.get_environment_variables()),
+                                   stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+        for line in process.stdout:
+            with output_lock:
+                output.write(tag + line.decode(errors="replace").rstrip("\r\n") + "\n")
+                output.flush()
+
+        return process.wait()
+
+    return collect(credentials, run, workers, lambda code: None if code == 0 else "Exited with " + str(code))
+
+
+def run_callable(credentials, function, workers=DEFAULT_WORKERS, create_session=None, services=()):
+    """
+        Calls function(session, credential) once for every credential in
+        credentials, at most workers at a time, where session.client() and
+        session.resource() return boto3 clients and resources using that
+        credential's keys. The clients for services (the names of the ones
+        function uses) are created before each credential is handed to a
+        worker, so the workers only make calls. Returns a dict of profile name
+        to whatever function returned, and a dict of profile name to the
+        exception it raised for the ones that failed.
+    """
+    create_session = create_session or SessionFactory()
+
+    def prepare(my_credential):
+        session = create_session(my_credential)
+
+        for service_name in services:
+            session.client(service_name)
+
+        return session
+
+    return collect(credentials, lambda c, session: function(session, c), workers, prepare=prepare)
+
+
+def collect(credentials, function, workers, get_error=None, prepare=None):
+    """
+        Calls function(credential) for every credential in credentials on a
+        pool of workers. If prepare is given, prepare(credential) is called on
+        the calling thread before each credential is handed to a worker and
+        function is called with the credential and what it returned. Returns
+        a dict of profile name to result and a dict of profile name to error.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    results = {}
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+
+        for my_credential in credentials:
+            if prepare is None:
+                futures[executor.submit(function, my_credential)] = my_credential
+                continue
+
+            try:
+                prepared = prepare(my_credential)
+            except Exception as err:
+                failures[my_credential.name] = err
+            else:
+                futures[executor.submit(function, my_credential, prepared)] = my_credential
+
+        for future in as_completed(futures):
+            name = futures[future].name
+
+            try:
+                results[name] = future.result()
+            except Exception as err:
+                failures[name] = err
+            else:
+                error = get_error(results[name]) if get_error else None
+
+                if error:
+                    failures[name] = error
+
+    return results, failures
+
+
+class SessionFactory():
+    """
+        Hands out an AccountSession per credential. Every account's clients
+        come from one shared boto3 session, so the service models and event
+        handlers are set up once rather than once per account. Creating a
+        client is CPU bound, so callers fanning out create them up front on
+        one thread (see collect()) rather than have every worker wait its turn.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session = None
+
+    def __call__(self, my_credential):
+        return AccountSession(self, my_credential)
+
+    def create_client(self, service_name, my_credential, **kwargs):
+        # Sessions aren't thread safe, the clients they create are.
+        with self.lock:
+            with timing.span("client " + service_name):
+                return self.get_session().client(service_name, **self.get_arguments(my_credential, kwargs))
+
+    def create_resource(self, service_name, my_credential, **kwargs):
+        with self.lock:
+            with timing.span("resource " + service_name):
+                return self.get_session().resource(service_name, **self.get_arguments(my_credential, kwargs))
+
+    def get_session(self):
+        if self.session is None:
+            with timing.span("import boto3"):
+                import boto3
+
+            self.session = timing.instrument(boto3.session.Session())
+
+        return self.session
+
+    def get_arguments(self, my_credential, kwargs):
+        arguments = {
+            "aws_access_key_id": my_credential.access_key,
+            "aws_secret_access_key": my_credential.secret_key,
+            "region_name": my_credential.region
+        }
+        arguments.update(kwargs)
+        return arguments
+
+
+class AccountSession():
+    """The part of a boto3 session's interface needed to make calls as one account."""
+    def __init__(self, factory, my_credential):
+        self.factory = factory
+        self.credential = my_credential
+        self.region_name = my_credential.region
+        self.clients = {}
+
+    def client(self, service_name, **kwargs):
+        # Clients created without arguments are kept, so the ones created up front are the ones handed out.
+        if kwargs:
+            return self.factory.create_client(service_name, self.credential, **kwargs)
+
+        if service_name not in self.clients:
+            self.clients[service_name] = self.factory.create_client(service_name, self.credential)
+
+        return self.clients[service_name]
+
+    def resource(self, service_name, **kwargs):
+        return self.factory.create_resource(service_name, self.credential, **kwargs)
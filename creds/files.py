@@ -0,0 +1,169 @@
+import os
+import threading
+import contextlib
+from creds import timing
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks on this platform, writes are still atomic.
+    fcntl = None
+
+
+LOCK_FILE_NAME = os.path.expanduser("~/.aws/.aws-creds.lock")
+
+_lock = threading.RLock()
+_lock_depth = 0
+_lock_file = None
+
+
+@contextlib.contextmanager
+def lock():
+    """
+        Holds an exclusive advisory lock shared by every aws-creds process, so
+        concurrent logins, role changes and logouts happen one at a time. The
+        lock can be taken again by the process (or thread) already holding it.
+    """
+    global _lock_depth, _lock_file
+
+    with _lock:
+        if _lock_depth == 0:
+            os.makedirs(os.path.dirname(LOCK_FILE_NAME), exist_ok=True)
+            _lock_file = open(LOCK_FILE_NAME, "a")
+
+            if fcntl:
+                fcntl.flock(_lock_file.fileno(), fcntl.LOCK_EX)
+
+        _lock_depth += 1
+
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+
+            if _lock_depth == 0:
+                # Closing the file releases the lock.
+                _lock_file.close()
+                _lock_file = None
+
+
+def write(file_name, contents):
+    write_all({file_name: contents})
+
+
+@timing.traced("files.write")
+def write_all(files):
+    """
+        Replaces the contents of every file in files (a dict of file name to
+        contents). Each file is written to a temporary file next to it and
+        synced to disk, and only once they all have been written are they
+        renamed over the originals, so readers only ever see complete files.
+        The originals are kept (as hard links) until every rename has
+        succeeded, so a failure part way through puts back any already
+        replaced and the files are never left out of step with each other.
+        The directories are synced last, so the renames survive a crash too.
+    """
+    temporary_file_names = {}
+    backup_file_names = {}
+    replaced_file_names = []
+
+    with lock():
+        try:
+            for file_name, contents in files.items():
+                temporary_file_names[file_name] = write_temporary_file(file_name, contents)
+
+            for file_name in files:
+                backup_file_names[file_name] = create_backup(file_name)
+
+            for file_name, temporary_file_name in temporary_file_names.items():
+                os.replace(temporary_file_name, file_name)
+                replaced_file_names.append(file_name)
+        except BaseException:
+            for file_name in replaced_file_names:
+                restore_backup(file_name, backup_file_names[file_name])
+
+            for temporary_file_name in list(temporary_file_names.values()) + list(backup_file_names.values()):
+                if temporary_file_name and os.path.exists(temporary_file_name):
+                    os.remove(temporary_file_name)
+
+            raise
+
+        for directory in set(os.path.dirname(file_name) for file_name in files):
+            sync_directory(directory)
+
+        for backup_file_name in backup_file_names.values():
+            if backup_file_name:
+                os.remove(backup_file_name)
+
+
+def write_temporary_file(file_name, contents):
+    directory = os.path.dirname(file_name)
+    os.makedirs(directory, exist_ok=True)
+    # Not using tempfile as it is slow to import, the lock stops two writers
+    # from using the same name.
+    temporary_file_name = os.path.join(directory, "." + os.path.basename(file_name) + "." + str(os.getpid()) + ".tmp")
+    fd = os.open(temporary_file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+    try:
+        # Keep the permissions of the file being replaced.
+        if os.path.exists(file_name):
+            os.chmod(temporary_file_name, os.stat(file_name).st_mode & 0o777)
+
+        with os.fdopen(fd, "w") as fh:
+            fh.write(contents)
+            fh.flush()
+            os.fsync(fh.fileno())
+    except BaseException:
+        os.remove(temporary_file_name)
+        raise
+
+    return temporary_file_name
+
+
+def create_backup(file_name):
+    """Returns the name of a hard link to file_name, or None if it doesn't exist yet."""
+    if not os.path.exists(file_name):
+        return None
+
+    backup_file_name = os.path.join(os.path.dirname(file_name),
+                                    "." + os.path.basename(file_name) + "." + str(os.getpid()) + ".bak")
+
+    # Left behind if this process id was used by one that crashed.
+    if os.path.exists(backup_file_name):
+        os.remove(backup_file_name)
+
+    os.link(file_name, backup_file_name)
+    return backup_file_name
+
+
+def restore_backup(file_name, backup_file_name):
+    # Called while already failing, so don't hide that error behind this one.
+    try:
+        if backup_file_name:
+            os.replace(backup_file_name, file_name)
+        else:
+            os.remove(file_name)
+    except OSError:
+        pass
+
+
+def sync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # Directories can't be opened on every platform (e.g. Windows).
+        return
+
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Nor synced on every file system.
+        pass
+    finally:
+        os.close(fd)
+
+
+def remove(file_name):
+    with lock():
+        if os.path.exists(file_name):
+            os.remove(file_name)
@@ -0,0 +1,227 @@
+import time
+import threading
+from creds import cred, cache, fanout, util
+
+
+MAX_ATTEMPTS = 10
+CALLS_PER_SECOND = 10
+
+
+class RateLimiter():
+    """
+        Spaces calls out so no more than calls_per_second start each second,
+        across every thread using it.
+    """
+    def __init__(self, calls_per_second=CALLS_PER_SECOND):
+        self.lock = threading.Lock()
+        self.interval = 1 / calls_per_second
+        self.next_call = 0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_call)
+            self.next_call = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
+
+
+class Fleet():
+    """
+        Checks and rotates the Access Keys of many saved profiles at once. IAM
+        calls are made on a pool of workers, spaced out by a shared
+        RateLimiter and retried with botocore's adaptive retry mode when IAM
+        throttles them. Anything that changes the store is done on the calling
+        thread, one profile (and transaction) at a time.
+    """
+    def __init__(self, workers=fanout.DEFAULT_WORKERS, calls_per_second=CALLS_PER_SECOND, factory=None):
+        from botocore.config import Config
+
+        self.workers = workers
+        self.limiter = RateLimiter(calls_per_second)
+        self.factory = factory or fanout.SessionFactory()
+        self.config = Config(retries={"mode": "adaptive", "max_attempts": MAX_ATTEMPTS})
+
+    def call(self, iam, operation, **kwargs):
+        self.limiter.wait()
+        return getattr(iam, operation)(**kwargs)
+
+    def get_iam(self, my_credential):
+        return self.factory(my_credential).client("iam", config=self.config)
+
+    def get_access_key(self, iam, my_credential):
+        """
+            Returns the metadata of my_credential's Access Key and of every
+            Access Key its user has.
+        """
+        access_keys = self.call(iam, "list_access_keys")["AccessKeyMetadata"]
+
+        for access_key in access_keys:
+            if access_key["AccessKeyId"] == my_credential.access_key:
+                return access_key, access_keys
+
+        raise AccessKeyNotFoundError(my_credential.access_key)
+
+    def audit(self, credentials):
+        """
+            Returns a dict of profile name to a dict with the "access_key", its
+            "age" in days, "status", "user" and "key_count" (the number of keys
+            the user has), and a dict of profile name to the error for the
+            profiles that couldn't be checked.
+        """
+        def check(my_credential, iam):
+            access_key, access_keys = self.get_access_key(iam, my_credential)
+            create_date = str(access_key["CreateDate"].replace(tzinfo=None))
+            return {
+                "access_key": my_credential.access_key,
+                "age": util.get_days_old(create_date),
+                "create_date": create_date,
+                "status": access_key["Status"],
+                "user": access_key["UserName"],
+                "key_count": len(access_keys)
+            }
+
+        results, failures = fanout.collect(credentials, check, self.workers, prepare=self.get_iam)
+
+        for my_credential in credentials:
+            if my_credential.name in results:
+                cache.ProfileCache(my_credential).set("access_key_create_date",
+                                                      results[my_credential.name]["create_date"], util.get_cache_ttl())
+
+        return results, failures
+
+    def rotate(self, credentials, older_than=None):
+        """
+            Rotates the Access Key of every credential in credentials (only the
+            keys at least older_than days old, if given). For each one a new
+            key is created, saved to the store, and only then is the old key
+            deleted, so a failure at any point never leaves a profile without a
+            working key. If the profile that is logged into is rotated, it is
+            logged into again with its new key.
+
+            Returns a dict of profile id to new Access Key, a list of the ids
+            of the profiles skipped as their key is too new, and a dict of
+            profile id to the error for the profiles that failed.
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+        current = cred.Credential.get_current()
+        rotated = {}
+        skipped = []
+        failures = {}
+
+        def create(my_credential, iam):
+            access_key, access_keys = self.get_access_key(iam, my_credential)
+
+            if older_than is not None and \
+                    util.get_days_old(str(access_key["CreateDate"].replace(tzinfo=None))) < older_than:
+                return None
+
+            if len(access_keys) > 1:
+                raise util.TooManyAccessKeysError([a["AccessKeyId"] for a in access_keys])
+
+            new_access_key = self.call(iam, "create_access_key", UserName=access_key["UserName"])["AccessKey"]
+            return iam, access_key, new_access_key
+
+        def delete(iam, access_key):
+            self.call(iam, "delete_access_key", UserName=access_key["UserName"], AccessKeyId=access_key["AccessKeyId"])
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}
+
+            # The IAM clients are created here rather than on the workers, see fanout.SessionFactory.
+            for my_credential in credentials:
+                try:
+                    iam = self.get_iam(my_credential)
+                except Exception as err:
+                    failures[my_credential.id] = err
+                else:
+                    pending[executor.submit(create, my_credential, iam)] = ("create", my_credential)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    step, my_credential = pending.pop(future)
+
+                    try:
+                        result = future.result()
+                    except Exception as err:
+                        if step == "create":
+                            failures[my_credential.id] = err
+                        else:
+                            failures[my_credential.id] = OldAccessKeyNotDeletedError(my_credential, err)
+
+                        continue
+
+                    if step == "create":
+                        if result is None:
+                            skipped.append(my_credential.id)
+                            continue
+
+                        iam, old_access_key, new_access_key = result
+
+                        try:
+                            self.save_access_key(my_credential, new_access_key)
+                        except Exception as err:
+                            failures[my_credential.id] = NewAccessKeyNotSavedError(new_access_key["AccessKeyId"], err)
+                            continue
+
+                        rotated[my_credential.id] = my_credential.access_key
+
+                        try:
+                            # Saving cleared the profile's cache, the new key's age is known without asking IAM.
+                            cache.ProfileCache(my_credential).set("access_key_create_date",
+                                                                  str(new_access_key["CreateDate"].replace(tzinfo=None)),
+                                                                  util.get_cache_ttl())
+
+                            if current and current.id == my_credential.id:
+                                my_credential.login()
+                        except Exception as err:
+                            # The old key may still be in use until the profile is logged into again.
+                            failures[my_credential.id] = OldAccessKeyNotDeletedError(my_credential, err)
+                            continue
+
+                        pending[executor.submit(delete, iam, old_access_key)] = ("delete", my_credential)
+
+        if rotated:
+            cred.Credential.sync_profiles_if_enabled()
+
+        return rotated, skipped, failures
+
+    def save_access_key(self, my_credential, new_access_key):
+        """
+            Saves new_access_key (as returned by IAM) as my_credential's key.
+            If it can't be saved (e.g. the store is locked by another process
+            or the vault is locked), my_credential is left with its old key.
+        """
+        old_access_key, old_secret_key = my_credential.access_key, my_credential.secret_key
+        my_credential.access_key = new_access_key["AccessKeyId"]
+        my_credential.secret_key = new_access_key["SecretAccessKey"]
+
+        try:
+            my_credential.save(sync=False)
+        except Exception:
+            my_credential.access_key, my_credential.secret_key = old_access_key, old_secret_key
+            raise
+
+
+class AccessKeyNotFoundError(Exception):
+    def __init__(self, access_key):
+        self.access_key = access_key
+        self.message = "Sorry, the saved Access Key (" + access_key + ") doesn't belong to this user anymore."
+
+
+class NewAccessKeyNotSavedError(Exception):
+    def __init__(self, access_key, reason):
+        self.access_key = access_key
+        self.reason = reason
+        self.message = "A new Access Key (" + access_key + ") was created but couldn't be saved (" + str(reason) + \
+            "), the old one is still in use. Delete the new one with 'aws iam delete-access-key'."
+
+
+class OldAccessKeyNotDeletedError(Exception):
+    def __init__(self, my_credential, reason):
+        self.reason = reason
+        self.message = "The new Access Key was saved, but the old one couldn't be deleted (" + str(reason) + ")."
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+from creds import files
+
+
+HISTORY_FILE_NAME = os.path.expanduser("~/.aws/login_history.log")
+# The log is rotated to login_history.log.1 (and so on) once it reaches
+# MAX_SIZE, and only BACKUP_COUNT old logs are kept, so it never grows past
+# a few MB however long it is used for.
+MAX_SIZE = 1024 * 1024
+BACKUP_COUNT = 4
+BLOCK_SIZE = 8192
+# The events that leave the [default] profile on a profile (and role).
+SWITCH_EVENTS = ("login", "assume", "unassume")
+RECENT_LOOKBACK = 500
+
+
+def record(event, my_credential, role_arn=None, **details):
+    """
+        Appends event (login, assume, unassume, rotate or logout) for
+        my_credential to the history log. Each entry is one line of JSON,
+        written with a single append so concurrent commands never interleave.
+    """
+    entry = {
+        "Time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "Event": event,
+        "ProfileId": my_credential.id if my_credential else None,
+        "Name": my_credential.name if my_credential else None
+    }
+
+    if role_arn:
+        entry["Role"] = role_arn
+
+    entry.update(details)
+    line = (json.dumps(entry) + "\n").encode()
+
+    try:
+        if os.path.getsize(HISTORY_FILE_NAME) + len(line) > MAX_SIZE:
+            rotate(len(line))
+    except OSError:
+        os.makedirs(os.path.dirname(HISTORY_FILE_NAME), exist_ok=True)
+
+    fd = os.open(HISTORY_FILE_NAME, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def rotate(size):
+    with files.lock():
+        # Another process may have rotated it while this one waited for the lock.
+        if os.path.getsize(HISTORY_FILE_NAME) + size <= MAX_SIZE:
+            return
+
+        for i in range(BACKUP_COUNT - 1, 0, -1):
+            if os.path.exists(get_file_name(i)):
+                os.replace(get_file_name(i), get_file_name(i + 1))
+
+        os.replace(HISTORY_FILE_NAME, get_file_name(1))
+
+
+def get_file_name(backup=0):
+    return HISTORY_FILE_NAME + "." + str(backup) if backup else HISTORY_FILE_NAME
+
+
+def iterate_reversed():
+    """
+        Yields the entries of the history log newest first, carrying on into
+        the rotated logs. The files are read backwards a block at a time, so
+        only as much of them as is used is ever read.
+    """
+    for backup in range(BACKUP_COUNT + 1):
+        try:
+            fh = open(get_file_name(backup), "rb")
+        except FileNotFoundError:
+            continue
+
+        with fh:
+            for line in read_lines_reversed(fh):
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Half written (or not written by aws-creds), skip it.
+                    continue
+
+
+def read_lines_reversed(fh):
+    position = fh.seek(0, os.SEEK_END)
+    remainder = b""
+
+    while position > 0:
+        size = min(BLOCK_SIZE, position)
+        position -= size
+        fh.seek(position)
+        lines = (fh.read(size) + remainder).split(b"\n")
+        # The first line may carry on in the block before this one.
+        remainder = lines.pop(0)
+
+        for line in reversed(lines):
+            if line:
+                yield line
+
+    if remainder:
+        yield remainder
+
+
+def tail(count, profile_id=None):
+    """Returns the last count entries (for profile_id, if given), oldest first."""
+    entries = []
+
+    for entry in iterate_reversed():
+        if len(entries) >= count:
+            break
+
+        if profile_id is None or entry.get("ProfileId") == profile_id:
+            entries.append(entry)
+
+    return entries[::-1]
+
+
+def get_recent_profile_ids(limit):
+    """Returns the ids of the limit profiles switched to most recently, most recent first."""
+    profile_ids = []
+
+    for i, entry in enumerate(iterate_reversed()):
+        if len(profile_ids) >= limit or i >= RECENT_LOOKBACK:
+            break
+
+        if entry.get("Event") in SWITCH_EVENTS and entry.get("ProfileId") not in profile_ids:
+            profile_ids.append(entry["ProfileId"])
+
+    return profile_ids
+
+
+def get_previous(profile_id, role_arn):
+    """
+        Returns the most recent login, assume or unassume entry that left a
+        different profile (or role) in use than profile_id and role_arn, or
+        None if there isn't one.
+    """
+    for entry in iterate_reversed():
+        if entry.get("Event") in SWITCH_EVENTS and \
+                (entry.get("ProfileId"), entry.get("Role")) != (profile_id, role_arn):
+            return entry
+
+    return None
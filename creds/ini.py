@@ -0,0 +1,73 @@
+import os
+
+
+def read(file_name):
+    if os.path.exists(file_name):
+        with open(file_name, "r") as fh:
+            return fh.read()
+    else:
+        return ""
+
+
+def split_sections(contents):
+    """
+        Splits the contents of an INI file (e.g. ~/.aws/credentials) into a list
+        of (name, text) pairs, one per section, where text is the section's
+        exact text from its header up to the next header. Anything before the
+        first header is returned with a name of None.
+    """
+    sections = []
+    name = None
+    text = ""
+
+    for line in contents.splitlines(True):
+        stripped = line.strip()
+
+        if stripped.startswith("[") and stripped.endswith("]"):
+            if text:
+                sections.append((name, text))
+
+            name = stripped[1:-1].strip()
+            text = ""
+
+        text += line
+
+    if text:
+        sections.append((name, text))
+
+    return sections
+
+
+def merge_sections(contents, replacements):
+    """
+        Returns contents with the sections named in replacements (a dict of
+        section name to the section's new text, header included, or None to
+        remove it) replaced, added to the end or removed. Every other section
+        is kept exactly as it was.
+    """
+    sections = []
+    remaining = dict(replacements)
+
+    for name, text in split_sections(contents):
+        if name in remaining:
+            new_text = remaining.pop(name)
+
+            if new_text is not None:
+                # Keep the blank lines that separated the old section from the next.
+                sections.append(new_text + text[len(text.rstrip()):])
+        else:
+            sections.append(text)
+
+    for name, new_text in remaining.items():
+        if new_text is not None:
+            # Separate it from the section before with a blank line.
+            if sections and not sections[-1].endswith("\n"):
+                sections[-1] += os.linesep
+
+            if sections and sections[-1].strip() and not sections[-1].endswith("\n\n"):
+                sections[-1] += os.linesep
+
+            sections.append(new_text)
+
+    return "".join(sections)
+
@@ -1,15 +1,30 @@
 #!/bin/python3
 import sys
 import click
-from creds import cli, cred
+from creds import cli, vault
 
 
-@click.group()
+class Main(click.Group):
+    def invoke(self, ctx):
+        # Any command can need a Secret Key, and so the passphrase.
+        try:
+            return super().invoke(ctx)
+        except (vault.VaultLockedError, vault.IncorrectPassphraseError) as err:
+            click.echo(" ")
+            click.echo(err.message)
+            click.echo(" ")
+            sys.exit(1)
+
+
+@click.group(cls=Main)
 @click.version_option()
 def main():
     """
         aws-creds makes it easier to use multiple AWS accounts when you don't have SSO available. 
         You can easily save multiple profiles, and then log into them with an simple set of commands.
+
+        Add --timings to any command to see how long each part of it took, or set AWS_CREDS_TRACE_FILE
+        to append the timings of every command to a file (as OpenTelemetry OTLP JSON).
     """
     pass
 
@@ -33,16 +48,36 @@ main.add_command(cli.ls)
 main.add_command(cli.rm)
 main.add_command(cli.login)
 main.add_command(cli.logout)
+main.add_command(cli.switch)
+main.add_command(cli.show_history)
+main.add_command(cli.prompt_snippet)
+main.add_command(cli.env)
+main.add_command(cli.each)
+main.add_command(cli.sync)
+main.add_command(cli.agent)
+main.add_command(cli.credential_process)
 main.add_command(cli.status)
 main.add_command(cli.update)
 main.add_command(cli.rotate)
+main.add_command(cli.audit)
+main.add_command(cli.import_profiles)
+main.add_command(cli.export_profiles)
+main.add_command(cli.tag)
+main.add_command(cli.tags)
+main.add_command(cli.encrypt)
+main.add_command(cli.decrypt)
+main.add_command(cli.unlock)
+main.add_command(cli.lock)
+main.add_command(cli.mfa)
 default.add_command(cli.get_defaults)
 default.add_command(cli.set_defaults)
 main.add_command(default)
 role.add_command(cli.add_role)
+role.add_command(cli.import_roles)
+role.add_command(cli.discover_roles)
 role.add_command(cli.assume_role)
 role.add_command(cli.unassume_role)
+role.add_command(cli.refresh_role)
 role.add_command(cli.list_roles)
 role.add_command(cli.remove_role)
-main.add_command(role)
-cred.Credential.migrate()
\ No newline at end of file
+main.add_command(role)
\ No newline at end of file
@@ -0,0 +1,239 @@
+import bisect
+import itertools
+import click
+
+
+VISIBLE_MATCHES = 10
+
+KEY_ENTER = ("\r", "\n")
+KEY_BACKSPACE = ("\x7f", "\x08")
+KEY_UP = ("\x1b[A", "\x1bOA", "\x10")
+KEY_DOWN = ("\x1b[B", "\x1bOB", "\x0e")
+KEY_ABORT = ("\x03", "\x04", "\x1b")
+
+
+class SearchIndex():
+    """
+        Fuzzy search over a list of credentials by name and description, fast
+        enough to run on every keystroke with thousands of profiles.
+
+        Everything that doesn't depend on the query is worked out once: the
+        profiles are sorted by name, their names and text are lower cased and
+        joined into one string each (so a substring is found in every profile
+        at once with str.find()), and for every character there is a bitset
+        (an int, bit i for profile i) of the profiles holding it. A query's
+        matches are then a handful of integer ANDs, and only as many profiles
+        as are shown are ever looked at one by one.
+
+        The profiles in recent_ids (most recently used first, see
+        history.get_recent_profile_ids()) come before the rest when they
+        match.
+    """
+    def __init__(self, credentials, recent_ids=()):
+        self.credentials = sorted(credentials, key=lambda c: c.name)
+        positions = {c.id: i for i, c in enumerate(self.credentials)}
+        self.recent = [positions[i] for i in recent_ids if i in positions]
+        self.names = [c.name.lower() for c in self.credentials]
+        self.texts = [n + " " + (c.description or "").lower() for n, c in zip(self.names, self.credentials)]
+        self.name_corpus, self.name_offsets = join_lines(self.names)
+        self.text_corpus, self.text_offsets = join_lines(self.texts)
+        self.everything = (1 << len(self.credentials)) - 1
+        self.characters = {}
+        profiles = {}
+
+        for i, text in enumerate(self.texts):
+            for character in set(text):
+                profiles.setdefault(character, []).append(i)
+
+        # Setting bits one at a time would copy the whole int every time, so
+        # write out the binary digits and convert them in one go.
+        for character, indexes in profiles.items():
+            digits = bytearray(b"0" * len(self.texts))
+
+            for i in indexes:
+                digits[i] = ord("1")
+
+            self.characters[character] = int(digits[::-1], 2)
+
+    def search(self, query, limit=None):
+        """
+            Returns the best limit (or all) credentials matching query, best
+            first, and how many match in all. A profile matches if its name
+            and description hold every character of the query. Name prefixes
+            come first, then substrings of the name, substrings of the
+            description, the query's characters in order, and the rest,
+            with the recently used profiles holding the query ahead of them.
+        """
+        query = query.lower()
+        bits = self.everything
+
+        for character in set(query):
+            bits &= self.characters.get(character, 0)
+
+        total = bin(bits).count("1")
+        limit = total if limit is None else min(limit, total)
+        best = []
+        seen = set()
+
+        def add(i):
+            if i not in seen:
+                seen.add(i)
+                best.append(i)
+
+        for i in self.recent:
+            if len(best) >= limit:
+                break
+
+            if bits >> i & 1 and query in self.texts[i]:
+                add(i)
+
+        if query:
+            for i in range(bisect.bisect_left(self.names, query), bisect.bisect_left(self.names, query + "\uffff")):
+                if len(best) >= limit:
+                    break
+
+                add(i)
+
+            for corpus, offsets in [(self.name_corpus, self.name_offsets), (self.text_corpus, self.text_offsets)]:
+                position = corpus.find(query)
+
+                while position >= 0 and len(best) < limit:
+                    add(bisect.bisect_right(offsets, position) - 1)
+                    position = corpus.find(query, position + 1)
+
+        for in_order in [True, False]:
+            for i in iterate_bits(bits):
+                if len(best) >= limit:
+                    break
+
+                if not in_order or is_subsequence(query, self.texts[i]):
+                    add(i)
+
+        return [self.credentials[i] for i in best], total
+
+
+def iterate_bits(bits):
+    """Yields the positions of the set bits in bits, lowest first."""
+    # Searching the binary digits is much quicker than testing each bit in turn.
+    digits = bin(bits)[:1:-1]
+    i = digits.find("1")
+
+    while i >= 0:
+        yield i
+        i = digits.find("1", i + 1)
+
+
+def is_subsequence(query, text):
+    position = -1
+
+    for character in query:
+        position = text.find(character, position + 1)
+
+        if position < 0:
+            return False
+
+    return True
+
+
+def join_lines(lines):
+    """Returns lines joined into one string, and the offset each one starts at."""
+    offsets = list(itertools.accumulate([len(line) + 1 for line in lines], initial=0))[:-1]
+    return "\n".join(lines), offsets
+
+
+def pick(credentials, prompt_text, query="", recent_ids=()):
+    """
+        Asks the user to choose one of credentials and returns it. In a
+        terminal the list is narrowed down as they type; otherwise query (or a
+        line read from stdin) is searched for, and the matches numbered to
+        choose from if there is more than one. Profiles in recent_ids are
+        listed first. Raises click.Abort if nothing is chosen.
+    """
+    if not credentials:
+        click.echo("Sorry, there are no saved profiles.")
+        raise click.Abort()
+
+    index = SearchIndex(credentials, recent_ids)
+
+    if click.get_text_stream("stdin").isatty() and click.get_text_stream("stdout").isatty():
+        return pick_interactively(index, prompt_text, query or "")
+    else:
+        return pick_by_query(index, prompt_text, query)
+
+
+def pick_interactively(index, prompt_text, query):
+    selected = 0
+    drawn_lines = 0
+
+    while True:
+        matches, total = index.search(query, VISIBLE_MATCHES)
+        selected = min(selected, max(len(matches) - 1, 0))
+        lines = [prompt_text + ": " + query]
+
+        for i, my_credential in enumerate(matches):
+            line = ("> " if i == selected else "  ") + my_credential.name
+
+            if my_credential.description:
+                line += "  " + my_credential.description
+
+            lines.append('\033[7m' + line + '\033[0m' if i == selected else line)
+
+        lines.append(str(total) + " of " + str(len(index.credentials)) + " profiles")
+        drawn_lines = redraw(lines, drawn_lines)
+
+        key = click.getchar()
+
+        if key in KEY_ENTER:
+            if matches:
+                redraw([], drawn_lines)
+                return matches[selected]
+        elif key in KEY_ABORT:
+            redraw([], drawn_lines)
+            raise click.Abort()
+        elif key in KEY_BACKSPACE:
+            query = query[:-1]
+            selected = 0
+        elif key in KEY_UP:
+            selected = max(selected - 1, 0)
+        elif key in KEY_DOWN:
+            selected = min(selected + 1, len(matches) - 1)
+        elif key.isprintable():
+            query += key
+            selected = 0
+
+
+def redraw(lines, drawn_lines):
+    """Replaces the drawn_lines last drawn with lines, returning how many were drawn."""
+    output = ""
+
+    if drawn_lines:
+        # Back to the start of the first line drawn, then clear everything below it.
+        output += "\033[" + str(drawn_lines - 1) + "F" if drawn_lines > 1 else "\r"
+
+    output += "\033[J" + "\n".join(lines)
+    click.echo(output, nl=False)
+    return len(lines)
+
+
+def pick_by_query(index, prompt_text, query):
+    if not query:
+        query = click.prompt(prompt_text + " (search)", type=str, prompt_suffix=": ")
+
+    matches, _ = index.search(query, VISIBLE_MATCHES)
+    exact = [c for c in index.credentials if c.name == query.upper() or c.id == query]
+
+    if exact:
+        return exact[0]
+    elif len(matches) == 1:
+        return matches[0]
+    elif not matches:
+        click.echo("Sorry, no profiles match '" + query + "'.")
+        raise click.Abort()
+
+    for i, my_credential in enumerate(matches):
+        click.echo("[" + str(i + 1).zfill(3) + "] " + my_credential.name)
+        click.echo("      " + my_credential.description)
+
+    click.echo(" ")
+    selection = click.prompt(prompt_text, type=click.IntRange(1, len(matches)), prompt_suffix="? ")
+    return matches[selection - 1]
@@ -0,0 +1,86 @@
+import os
+from creds import files, ini
+
+
+MANAGED_MARKER = "# Managed by aws-creds (aws-creds sync), changes will be overwritten."
+
+
+def get_credential_section(credential):
+    contents = "[" + credential.name + "]" + os.linesep
+    contents += MANAGED_MARKER + os.linesep
+    contents += "aws_access_key_id=" + credential.access_key + os.linesep
+    contents += "aws_secret_access_key=" + credential.secret_key + os.linesep
+    return contents
+
+
+def get_config_section(credential):
+    contents = "[profile " + credential.name + "]" + os.linesep
+    contents += MANAGED_MARKER + os.linesep
+    contents += "region=" + credential.region + os.linesep
+    contents += "output=" + credential.output + os.linesep
+    return contents
+
+
+def sync(credentials, credential_file_name, config_file_name):
+    """
+        Writes every credential in credentials into its own named profile
+        ([NAME] in the credentials file, [profile NAME] in the config file), so
+        it can be used with AWS_PROFILE=NAME without logging in.
+
+        Only sections that changed are replaced and a file is only written if
+        something in it changed. Sections written by an earlier sync for
+        profiles that no longer exist are removed, and sections aws-creds
+        didn't write (including [default]) are never touched. Returns the
+        names of the profiles that were skipped because a section aws-creds
+        doesn't manage already uses their name.
+    """
+    with files.lock():
+        credential_contents = ini.read(credential_file_name)
+        config_contents = ini.read(config_file_name)
+        credential_sections = dict(ini.split_sections(credential_contents))
+        config_sections = dict(ini.split_sections(config_contents))
+        credential_replacements = {}
+        config_replacements = {}
+        conflicts = []
+
+        for credential in credentials:
+            credential_section = credential.name
+            config_section = "profile " + credential.name
+
+            # [DEFAULT] means something else to most INI parsers.
+            if credential.name.lower() == "default" or \
+                    not is_managed(credential_sections, credential_section) or \
+                    not is_managed(config_sections, config_section):
+                conflicts.append(credential.name)
+                continue
+
+            credential_replacements[credential_section] = get_credential_section(credential)
+            config_replacements[config_section] = get_config_section(credential)
+
+        remove_stale_sections(credential_sections, credential_replacements)
+        remove_stale_sections(config_sections, config_replacements)
+
+        changed_files = {}
+
+        for file_name, contents, sections, replacements in [
+                (credential_file_name, credential_contents, credential_sections, credential_replacements),
+                (config_file_name, config_contents, config_sections, config_replacements)]:
+            changed = {n: t for n, t in replacements.items() if sections.get(n, "").rstrip() != (t or "").rstrip()}
+
+            if changed:
+                changed_files[file_name] = ini.merge_sections(contents, changed)
+
+        if changed_files:
+            files.write_all(changed_files)
+
+    return conflicts
+
+
+def is_managed(sections, name):
+    return name not in sections or MANAGED_MARKER in sections[name]
+
+
+def remove_stale_sections(sections, replacements):
+    for name, text in sections.items():
+        if name is not None and name not in replacements and MANAGED_MARKER in text:
+            replacements[name] = None
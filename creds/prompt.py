@@ -0,0 +1,153 @@
+import os
+from creds import cache
+
+
+# Read by the shell snippets below on every prompt, so it only holds what
+# the prompt shows, tab separated on one line: the profile's name, its
+# account id, the colour of its Access Key's age and the assumed role ("-"
+# for any that isn't known).
+PROMPT_FILE_NAME = os.path.expanduser("~/.aws/.aws-creds-prompt")
+SHELLS = ["bash", "zsh", "fish"]
+
+
+def get_contents(my_credential, role_arn=None):
+    """
+        Returns the prompt file for my_credential (and role_arn, if it is
+        assumed). Only what is already cached is used, nothing is fetched
+        from AWS. The account id and the Access Key's age don't change for a
+        given key, so they are used even once the cache has expired.
+    """
+    profile_cache = cache.ProfileCache(my_credential)
+    role = my_credential.roles.get(role_arn) if role_arn else None
+
+    if role:
+        account = role.account_id
+    else:
+        account = (profile_cache.get("account_details", expired=True) or {}).get("account")
+
+    create_date = profile_cache.get("access_key_create_date", expired=True)
+    fields = [my_credential.name, account, get_colour(create_date), role.get_reference() if role else None]
+    return "\t".join((f or "-").replace("\t", " ").replace("\n", " ") for f in fields) + "\n"
+
+
+def get_colour(create_date):
+    # The same thresholds as the age check after 'aws-creds login'.
+    if create_date is None:
+        return None
+
+    # Imported here as util imports cred, which imports this module.
+    from creds import util
+
+    days_old = util.get_days_old(create_date)
+
+    if days_old < 50:
+        return "green"
+    elif days_old < 60:
+        return "yellow"
+    else:
+        return "red"
+
+
+def get_snippet(shell):
+    return SNIPPETS[shell].replace("{file}", PROMPT_FILE_NAME)
+
+
+BASH_SNIPPET = r"""# aws-creds prompt: reads {file} with builtins only, so nothing is forked.
+__aws_creds_prompt() {
+    local exit_status=$? name account colour role
+    AWS_CREDS_PROMPT=
+
+    if [ -f "{file}" ]; then
+        IFS=$'\t' read -r name account colour role < "{file}"
+
+        case "$colour" in
+            green) colour=$'\001\e[32m\002' ;;
+            yellow) colour=$'\001\e[33m\002' ;;
+            red) colour=$'\001\e[31m\002' ;;
+            *) colour= ;;
+        esac
+
+        AWS_CREDS_PROMPT="$colour$name"
+        [ "$account" != "-" ] && AWS_CREDS_PROMPT+="@$account"
+        [ "$role" != "-" ] && AWS_CREDS_PROMPT+=" ($role)"
+        [ -n "$colour" ] && AWS_CREDS_PROMPT+=$'\001\e[0m\002'
+        AWS_CREDS_PROMPT="[$AWS_CREDS_PROMPT] "
+    fi
+
+    return $exit_status
+}
+
+PROMPT_COMMAND="__aws_creds_prompt${PROMPT_COMMAND:+;$PROMPT_COMMAND}"
+
+case "$PS1" in
+    *AWS_CREDS_PROMPT*) ;;
+    *) PS1='${AWS_CREDS_PROMPT}'"$PS1" ;;
+esac
+"""
+
+ZSH_SNIPPET = r"""# aws-creds prompt: reads {file} with builtins only, so nothing is forked.
+__aws_creds_prompt() {
+    local name account colour role
+    AWS_CREDS_PROMPT=
+
+    if [[ -f "{file}" ]]; then
+        IFS=$'\t' read -r name account colour role < "{file}"
+        AWS_CREDS_PROMPT="${name//\%/%%}"
+        [[ "$account" != "-" ]] && AWS_CREDS_PROMPT+="@$account"
+        [[ "$role" != "-" ]] && AWS_CREDS_PROMPT+=" (${role//\%/%%})"
+        [[ "$colour" != "-" ]] && AWS_CREDS_PROMPT="%F{$colour}$AWS_CREDS_PROMPT%f"
+        AWS_CREDS_PROMPT="[$AWS_CREDS_PROMPT] "
+    fi
+}
+
+autoload -Uz add-zsh-hook
+add-zsh-hook precmd __aws_creds_prompt
+setopt PROMPT_SUBST
+
+if [[ "$PROMPT" != *AWS_CREDS_PROMPT* ]]; then
+    PROMPT='${AWS_CREDS_PROMPT}'"$PROMPT"
+fi
+"""
+
+FISH_SNIPPET = r"""# aws-creds prompt: reads {file} with builtins only, so nothing is forked.
+function __aws_creds_prompt
+    test -f "{file}"; or return
+    read --delimiter \t name account colour role < "{file}"
+
+    if test "$colour" != "-"
+        set_color $colour
+    end
+
+    printf "[%s" $name
+    test "$account" != "-"; and printf "@%s" $account
+    test "$role" != "-"; and printf " (%s)" $role
+
+    if test "$colour" != "-"
+        set_color normal
+    end
+
+    printf "] "
+end
+
+function __aws_creds_return
+    return $argv[1]
+end
+
+if not functions -q __aws_creds_original_prompt
+    functions -c fish_prompt __aws_creds_original_prompt
+
+    function fish_prompt
+        set -l exit_status $status
+        __aws_creds_prompt
+        # So the original prompt still sees the last command's status.
+        __aws_creds_return $exit_status
+        __aws_creds_original_prompt
+    end
+end
+"""
+
+SNIPPETS = {
+    "bash": BASH_SNIPPET,
+    "zsh": ZSH_SNIPPET,
+    "fish": FISH_SNIPPET
+}
@@ -0,0 +1,234 @@
+import json
+
+
+FORMATS = ["text", "csv", "ndjson"]
+CSV_FIELDS = ["arn", "alias", "tags"]
+
+
+class Role():
+    """
+        A role saved with a profile, to be assumed with its keys. The account
+        and name are read from the ARN (arn:aws:iam::ACCOUNT:role/PATH/NAME).
+    """
+    __slots__ = ("arn", "account_id", "name", "alias", "tags", "last_used")
+
+
+    def __init__(self, arn, alias=None, tags=None, last_used=None):
+        parts = arn.split(":", 5)
+        resource = parts[5] if len(parts) == 6 else ""
+
+        self.arn = arn
+        self.account_id = parts[4] if len(parts) == 6 else ""
+        self.name = resource.split("/")[-1] if resource.startswith("role/") else resource
+        self.alias = alias or None
+        self.tags = tags or {}
+        self.last_used = last_used
+
+
+    def get_reference(self):
+        """Returns how the role can be referred to on the command line, e.g. 'aws-creds role assume <reference>'."""
+        return self.alias or self.account_id + ":" + self.name
+
+
+    def to_dictionary(self):
+        dictionary = {"Arn": self.arn}
+
+        if self.alias:
+            dictionary["Alias"] = self.alias
+
+        if self.tags:
+            dictionary["Tags"] = self.tags
+
+        if self.last_used:
+            dictionary["LastUsed"] = self.last_used
+
+        return dictionary
+
+
+    @staticmethod
+    def from_value(value):
+        """Returns value (a saved role, or the bare ARN saved by older versions) as a Role."""
+        if isinstance(value, Role):
+            return value
+        elif isinstance(value, str):
+            # Added for backwards compatibility
+            return Role(value)
+        else:
+            return Role(value["Arn"], value.get("Alias"), dict(value.get("Tags", {})), value.get("LastUsed"))
+
+
+class RoleCatalogue():
+    """
+        The roles saved with a profile, indexed by ARN, alias and
+        ACCOUNT:NAME so any of them is found without looking through the
+        rest. The roles are only built (and indexed) the first time they are
+        used, so loading a profile with hundreds of roles costs nothing until
+        then, and the saved values it was loaded from are never changed.
+    """
+    __slots__ = ("_values", "_roles", "_aliases", "_names")
+
+
+    def __init__(self, values=None):
+        self._values = values if values is not None else []
+        self._roles = None
+
+
+    def load(self):
+        if self._roles is None:
+            self._roles = {}
+            self._aliases = {}
+            self._names = {}
+
+            for value in self._values:
+                self.index(Role.from_value(value))
+
+        return self._roles
+
+
+    def index(self, role):
+        self._roles[role.arn] = role
+        self._names[(role.account_id, role.name.lower())] = role.arn
+
+        if role.alias:
+            self._aliases[role.alias.lower()] = role.arn
+
+
+    def __iter__(self):
+        return iter(list(self.load().values()))
+
+
+    def __len__(self):
+        return len(self._roles) if self._roles is not None else len(self._values)
+
+
+    def __contains__(self, role_arn):
+        return role_arn in self.load()
+
+
+    def get(self, role_arn):
+        return self.load().get(role_arn)
+
+
+    def find(self, reference):
+        """Returns the role reference (an ARN, alias or ACCOUNT:NAME) refers to, or None if there isn't one."""
+        roles = self.load()
+        arn = reference if reference in roles else self._aliases.get(reference.lower())
+
+        if arn is None and ":" in reference and not reference.startswith("arn:"):
+            account_id, name = reference.split(":", 1)
+            arn = self._names.get((account_id.strip(), name.strip().lower()))
+
+        return roles.get(arn) if arn else None
+
+
+    def add(self, role):
+        """
+            Adds role, or updates the saved role with its ARN (keeping its
+            alias, tags and last use unless role has them). Raises
+            RoleAliasInUseError if another role has its alias.
+        """
+        roles = self.load()
+        existing = roles.get(role.arn)
+
+        if role.alias and self._aliases.get(role.alias.lower(), role.arn) != role.arn:
+            raise RoleAliasInUseError(role.alias, self._aliases[role.alias.lower()])
+
+        if existing:
+            if existing.alias and existing.alias != role.alias and role.alias:
+                del self._aliases[existing.alias.lower()]
+
+            role.alias = role.alias or existing.alias
+            role.tags = dict(existing.tags, **role.tags)
+            role.last_used = role.last_used or existing.last_used
+
+        self.index(role)
+        return existing is None
+
+
+    def remove(self, role_arn):
+        role = self.load().pop(role_arn)
+        self._names.pop((role.account_id, role.name.lower()), None)
+
+        if role.alias:
+            self._aliases.pop(role.alias.lower(), None)
+
+        return role
+
+
+    def to_list(self):
+        if self._roles is None:
+            return [Role.from_value(v).to_dictionary() if isinstance(v, str) else dict(v) for v in self._values]
+        else:
+            return [role.to_dictionary() for role in self._roles.values()]
+
+
+def is_role_arn(arn):
+    parts = arn.split(":", 5)
+    return len(parts) == 6 and parts[0] == "arn" and parts[2] == "iam" and parts[5].startswith("role/")
+
+
+def guess_format(file_name, default):
+    if file_name.endswith(".ndjson") or file_name.endswith(".jsonl"):
+        return "ndjson"
+    elif file_name.endswith(".csv"):
+        return "csv"
+    else:
+        return default
+
+
+def read(fh, format):
+    """
+        Yields a Role for every role in fh: one ARN (optionally followed by
+        an alias) per line of text, CSV with arn, alias and tags (KEY=VALUE
+        separated by spaces) columns, or one JSON object per line with the
+        same keys (or Arn, Alias and Tags, as saved).
+    """
+    readers = {
+        "text": read_text,
+        "csv": read_csv,
+        "ndjson": read_ndjson
+    }
+
+    for arn, alias, tags in readers[format](fh):
+        if not is_role_arn(arn):
+            raise InvalidRoleArnError(arn)
+
+        yield Role(arn, alias, tags)
+
+
+def read_text(fh):
+    for line in fh:
+        line = line.strip()
+
+        if line and not line.startswith("#"):
+            arn, _, alias = line.partition(" ")
+            yield arn, alias.strip(), {}
+
+
+def read_csv(fh):
+    # Imported here as csv is only needed to read role files.
+    import csv
+
+    for record in csv.DictReader(fh):
+        tags = dict(t.split("=", 1) for t in (record.get("tags") or "").split() if "=" in t)
+        yield record["arn"].strip(), (record.get("alias") or "").strip(), tags
+
+
+def read_ndjson(fh):
+    for line in fh:
+        if line.strip():
+            record = {k.lower(): v for k, v in json.loads(line).items()}
+            yield record["arn"], record.get("alias"), record.get("tags") or {}
+
+
+class RoleAliasInUseError(Exception):
+    def __init__(self, alias, role_arn):
+        self.alias = alias
+        self.role_arn = role_arn
+        self.message = "Sorry, the alias '" + alias + "' is already used for '" + role_arn + "'."
+
+
+class InvalidRoleArnError(Exception):
+    def __init__(self, arn):
+        self.arn = arn
+        self.message = "Sorry, '" + arn + "' isn't the ARN of an IAM role (arn:aws:iam::ACCOUNT:role/NAME)."
@@ -0,0 +1,433 @@
+import os
+import json
+import sqlite3
+from creds import timing
+
+
+STORE_FILE_NAME = os.path.expanduser("~/.aws/credential_profiles/profiles.db")
+SCHEMA_VERSION = 5
+
+_connection = None
+_migrations = []
+
+
+def get_connection():
+    """
+        Returns the (process wide) connection to the profile store, creating
+        the store and its schema the first time it is used.
+    """
+    global _connection
+
+    if _connection is None:
+        with timing.span("store.open"):
+            os.makedirs(os.path.dirname(STORE_FILE_NAME), exist_ok=True)
+
+            if not os.path.exists(STORE_FILE_NAME):
+                # The store holds secret keys, so it should only be readable by the owner.
+                os.close(os.open(STORE_FILE_NAME, os.O_CREAT | os.O_WRONLY, 0o600))
+
+            # The agent reloads the store from whichever thread notices it has
+            # changed (one at a time, under its lock).
+            _connection = sqlite3.connect(STORE_FILE_NAME, check_same_thread=False)
+            create_schema(_connection)
+
+            for migration in _migrations:
+                migration()
+
+    return _connection
+
+
+def register_migration(migration):
+    """
+        Registers a function to run the first time the store is opened in this
+        process, so data saved by older versions is only checked for by the
+        commands that actually use the store.
+    """
+    _migrations.append(migration)
+
+
+def create_schema(connection):
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+
+    if version < 1:
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "id TEXT PRIMARY KEY, "
+                "name TEXT NOT NULL, "
+                "document TEXT NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS profiles_name ON profiles (name)")
+
+    if version < 2:
+        with connection:
+            connection.execute("ALTER TABLE profiles ADD COLUMN access_key TEXT")
+            connection.execute("CREATE INDEX IF NOT EXISTS profiles_access_key ON profiles (access_key)")
+            rebuild_index(connection)
+
+    if version < 3:
+        with connection:
+            # An inverted index of the profiles' tags, so profiles can be found
+            # by tag without reading every document.
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tags ("
+                "profile_id TEXT NOT NULL, "
+                "key TEXT NOT NULL, "
+                "value TEXT NOT NULL, "
+                "PRIMARY KEY (profile_id, key))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS tags_key_value ON tags (key, value)")
+            rebuild_index(connection)
+
+    if version < 4:
+        with connection:
+            # Settings that have to change in the same transaction as the
+            # profiles, e.g. the key the profiles' secrets are encrypted with.
+            connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    if version < 5:
+        with connection:
+            # So profiles can be listed without reading their documents (see get_summaries()).
+            connection.execute("ALTER TABLE profiles ADD COLUMN description TEXT")
+            rebuild_index(connection)
+
+    if version < SCHEMA_VERSION:
+        connection.execute("PRAGMA user_version = " + str(SCHEMA_VERSION))
+
+
+def rebuild_index(connection=None):
+    """
+        Re-derives the indexed name, access key and description columns (and
+        the tags index) from the stored documents, for when they no longer agree with
+        each other.
+    """
+    if connection is None:
+        with get_connection() as connection:
+            rebuild_index(connection)
+    else:
+        rows = connection.execute("SELECT id, document FROM profiles").fetchall()
+        # Stores being upgraded from before version 3 (or 5) don't have them yet.
+        index_tags = has_tags_table(connection)
+        index_description = has_column(connection, "profiles", "description")
+
+        for id, document in rows:
+            document = json.loads(document)
+            connection.execute(
+                "UPDATE profiles SET name = ?, access_key = ? WHERE id = ?",
+                (document["Name"], document["Credentials"]["AccessKey"], id)
+            )
+
+            if index_description:
+                connection.execute("UPDATE profiles SET description = ? WHERE id = ?",
+                                   (document.get("Description"), id))
+
+            if index_tags:
+                put_tags(document, connection)
+
+
+def has_tags_table(connection):
+    return connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tags'").fetchone() is not None
+
+
+def has_column(connection, table, column):
+    return any(row[1] == column for row in connection.execute("PRAGMA table_info(" + table + ")"))
+
+
+def close():
+    global _connection
+
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+    _cache.clear()
+
+
+class DocumentCache():
+    """
+        Keeps every profile document this process has read, parsed, along
+        with the text it was parsed from, so reading a profile again costs a
+        dict lookup rather than a query and a JSON parse.
+
+        validate() is called before every read. If the store file has been
+        replaced, the connection is reopened and everything is dropped. If
+        another process has committed a change (PRAGMA data_version), the
+        documents are read again but only those whose text changed are
+        parsed again. Changes made by this process mark just the documents
+        they touch as stale.
+
+        The documents handed out are shared, so they must not be changed
+        (see copy_document()).
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.documents = {}
+        self.complete = False
+        self.order = None
+        self.stale = set()
+        self.file_id = None
+        self.data_version = None
+
+    def validate(self):
+        connection = get_connection()
+
+        if get_file_id() != self.file_id:
+            if self.file_id is not None:
+                # A different store file, the connection still reads the old one.
+                close()
+                connection = get_connection()
+
+            self.file_id = get_file_id()
+
+        data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+
+        if data_version != self.data_version:
+            self.data_version = data_version
+
+            if self.complete:
+                self.load_all()
+            else:
+                self.documents = {}
+                self.stale = set()
+
+        for id in self.stale:
+            row = connection.execute("SELECT document FROM profiles WHERE id = ?", (id,)).fetchone()
+
+            if row:
+                self.add(id, row[0])
+            else:
+                self.documents.pop(id, None)
+
+        if self.stale:
+            self.stale = set()
+            self.order = None
+
+        return connection
+
+    def add(self, id, text):
+        """Returns the parsed document for text, only parsing it if it isn't cached already."""
+        cached = self.documents.get(id)
+
+        if cached is None or cached[0] != text:
+            cached = (text, json.loads(text))
+            self.documents[id] = cached
+
+        return cached[1]
+
+    def load_all(self):
+        documents = {}
+        order = []
+
+        for id, text in get_connection().execute("SELECT id, document FROM profiles ORDER BY name, id"):
+            cached = self.documents.get(id)
+            documents[id] = cached if cached and cached[0] == text else (text, json.loads(text))
+            order.append(id)
+
+        self.documents = documents
+        self.order = order
+        self.complete = True
+        self.stale = set()
+
+    def get_all(self):
+        if not self.complete:
+            self.load_all()
+
+        if self.order is None:
+            self.order = sorted(self.documents, key=lambda id: (self.documents[id][1]["Name"], id))
+
+        return [self.documents[id][1] for id in self.order]
+
+    def get(self, id):
+        if id in self.documents:
+            return self.documents[id][1]
+
+        row = get_connection().execute("SELECT document FROM profiles WHERE id = ?", (id,)).fetchone()
+        return self.add(id, row[0]) if row else None
+
+    def invalidate(self, id):
+        self.stale.add(id)
+
+
+_cache = DocumentCache()
+
+
+def get_file_id():
+    try:
+        stat = os.stat(STORE_FILE_NAME)
+        return (stat.st_dev, stat.st_ino)
+    except OSError:
+        return None
+
+
+def copy_document(document):
+    """Returns a copy of document that can be changed without changing the cached one."""
+    document = dict(document)
+
+    for key, value in document.items():
+        if isinstance(value, dict):
+            document[key] = dict(value)
+        elif isinstance(value, list):
+            document[key] = list(value)
+
+    return document
+
+
+@timing.traced("store.get")
+def get(id):
+    _cache.validate()
+    return _cache.get(id)
+
+
+def get_by_access_key(access_key):
+    return _get_by_index("access_key", access_key, lambda d: d["Credentials"]["AccessKey"])
+
+
+def get_by_name(name):
+    return _get_by_index("name", name.upper(), lambda d: d["Name"])
+
+
+@timing.traced("store.get")
+def _get_by_index(column, value, document_value):
+    query = "SELECT id FROM profiles WHERE " + column + " = ? ORDER BY id LIMIT 1"
+    row = _cache.validate().execute(query, (value,)).fetchone()
+
+    if row:
+        document = _cache.get(row[0])
+
+        if document_value(document) == value:
+            return document
+        else:
+            # The index is out of sync with the document it points to.
+            rebuild_index()
+            row = _cache.validate().execute(query, (value,)).fetchone()
+            return _cache.get(row[0]) if row else None
+    else:
+        return None
+
+
+@timing.traced("store.get_all")
+def get_all():
+    _cache.validate()
+    return _cache.get_all()
+
+
+def iterate(tags=None):
+    """
+        Yields every profile document (or, if tags is given, only those with
+        every one of its key/value pairs, found through the tags index). When
+        not every document is cached already, they are read from the store as
+        they are needed rather than all at once (and aren't cached).
+    """
+    connection = _cache.validate()
+
+    if tags:
+        matching = " INTERSECT ".join(["SELECT profile_id FROM tags WHERE key = ? AND value = ?"] * len(tags))
+        query = "SELECT id, document FROM profiles WHERE id IN (" + matching + ") ORDER BY name, id"
+        parameters = [p for pair in tags.items() for p in pair]
+
+        for id, text in connection.execute(query, parameters).fetchall():
+            yield _cache.add(id, text)
+    elif _cache.complete:
+        for document in _cache.get_all():
+            yield document
+    else:
+        for row in connection.execute("SELECT document FROM profiles ORDER BY name, id"):
+            yield json.loads(row[0])
+
+
+@timing.traced("store.get_summaries")
+def get_summaries(tags=None):
+    """
+        Returns the id, name, description and tags (a dict) of every profile
+        (or only those with every one of tags' key/value pairs), ordered by
+        name, from the indexed columns and the tags index, so no document is
+        read or parsed.
+    """
+    connection = _cache.validate()
+    query = "SELECT id, name, description FROM profiles"
+    tags_query = "SELECT profile_id, key, value FROM tags"
+    parameters = []
+
+    if tags:
+        matching = " INTERSECT ".join(["SELECT profile_id FROM tags WHERE key = ? AND value = ?"] * len(tags))
+        query += " WHERE id IN (" + matching + ")"
+        tags_query += " WHERE profile_id IN (" + matching + ")"
+        parameters = [p for pair in tags.items() for p in pair]
+
+    profile_tags = {}
+
+    for id, key, value in connection.execute(tags_query, parameters):
+        profile_tags.setdefault(id, {})[key] = value
+
+    return [(id, name, description, profile_tags.get(id, {}))
+            for id, name, description in connection.execute(query + " ORDER BY name, id", parameters)]
+
+
+def get_tags():
+    """Returns every tag in use as a dict of key to a dict of value to the number of profiles with it."""
+    tags = {}
+
+    for key, value, count in get_connection().execute(
+            "SELECT key, value, COUNT(*) FROM tags GROUP BY key, value ORDER BY key, value"):
+        tags.setdefault(key, {})[value] = count
+
+    return tags
+
+
+def has_access_key(access_key):
+    row = get_connection().execute("SELECT 1 FROM profiles WHERE access_key = ? LIMIT 1", (access_key,)).fetchone()
+    return row is not None
+
+
+@timing.traced("store.put")
+def put(document, connection=None):
+    """
+        Inserts or replaces a profile document. When a connection is passed in
+        the caller is responsible for the transaction, which lets several
+        documents be written at once.
+    """
+    if connection is None:
+        with get_connection() as connection:
+            put(document, connection)
+    else:
+        connection.execute(
+            "INSERT OR REPLACE INTO profiles (id, name, access_key, description, document) VALUES (?, ?, ?, ?, ?)",
+            (document["Id"], document["Name"], document["Credentials"]["AccessKey"], document.get("Description"),
+             json.dumps(document))
+        )
+        put_tags(document, connection)
+        _cache.invalidate(document["Id"])
+
+
+def put_tags(document, connection):
+    connection.execute("DELETE FROM tags WHERE profile_id = ?", (document["Id"],))
+    connection.executemany(
+        "INSERT INTO tags (profile_id, key, value) VALUES (?, ?, ?)",
+        [(document["Id"], key, value) for key, value in document.get("Tags", {}).items()]
+    )
+
+
+def get_setting(name):
+    row = get_connection().execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+
+    if row:
+        return json.loads(row[0])
+    else:
+        return None
+
+
+def put_setting(name, value, connection):
+    """Saves value under name, or removes the setting if value is None."""
+    if value is None:
+        connection.execute("DELETE FROM settings WHERE name = ?", (name,))
+    else:
+        connection.execute("INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)", (name, json.dumps(value)))
+
+
+def delete(id):
+    with get_connection() as connection:
+        connection.execute("DELETE FROM profiles WHERE id = ?", (id,))
+        connection.execute("DELETE FROM tags WHERE profile_id = ?", (id,))
+        _cache.invalidate(id)
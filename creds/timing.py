@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+import threading
+
+
+TRACE_FILE_VARIABLE = "AWS_CREDS_TRACE_FILE"
+TIMINGS_OPTION = "--timings"
+SERVICE_NAME = "aws-creds"
+
+# Spans are only recorded once enable() has been called, until then span()
+# and traced() cost next to nothing.
+enabled = False
+
+_spans = []
+_local = threading.local()
+_root = None
+_trace_id = None
+
+
+class Span():
+    """
+        A timed phase of a command (e.g. reading the store, or an STS call),
+        used as a context manager. Spans started inside another one on the
+        same thread are its children; spans started on other threads are
+        children of the first span of the process (the command).
+    """
+    def __init__(self, name, attributes=None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.id = os.urandom(8).hex()
+        self.parent = None
+        self.start_time = None
+        self.start = None
+        self.duration = None
+        self.error = None
+
+    def __enter__(self):
+        global _root
+
+        stack = get_stack()
+        self.parent = stack[-1] if stack else _root
+        self.start_time = time.time_ns()
+        self.start = time.perf_counter_ns()
+        stack.append(self)
+
+        if _root is None:
+            _root = self
+
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.duration = time.perf_counter_ns() - self.start
+
+        if exception_type is not None and not issubclass(exception_type, SystemExit):
+            self.error = exception_type.__name__
+
+        stack = get_stack()
+
+        if self in stack:
+            stack.remove(self)
+
+        _spans.append(self)
+
+
+class NullSpan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        pass
+
+
+_null_span = NullSpan()
+
+
+def get_stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+
+    return _local.stack
+
+
+def span(name, **attributes):
+    """Returns a context manager timing the code inside it as name, if timing is enabled."""
+    if enabled:
+        return Span(name, attributes)
+    else:
+        return _null_span
+
+
+def traced(name):
+    """Decorates a function so every call to it is timed as name."""
+    def decorator(function):
+        def wrapper(*args, **kwargs):
+            if enabled:
+                with Span(name):
+                    return function(*args, **kwargs)
+            else:
+                return function(*args, **kwargs)
+
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    return decorator
+
+
+def enable_from_arguments(arguments):
+    """
+        Turns timing on if --timings is in arguments (the breakdown is
+        printed to stderr when the process exits) or AWS_CREDS_TRACE_FILE is
+        set (the spans are appended to that file, see write_trace()). Returns
+        arguments without --timings. Anything after -- is an argument to
+        pass on (e.g. to the command 'aws-creds each' runs), so it is left be.
+    """
+    end = arguments.index("--") if "--" in arguments else len(arguments)
+    options = arguments[:end]
+    print_timings = TIMINGS_OPTION in options
+    trace_file_name = os.environ.get(TRACE_FILE_VARIABLE)
+
+    if print_timings or trace_file_name:
+        enable(print_timings, trace_file_name)
+
+    return [a for a in options if a != TIMINGS_OPTION] + arguments[end:]
+
+
+def enable(print_timings=False, trace_file_name=None):
+    global enabled, _trace_id
+
+    # Imported here as it is only needed when timing.
+    import atexit
+
+    enabled = True
+    _trace_id = os.urandom(16).hex()
+    atexit.register(finish, print_timings, trace_file_name)
+
+
+def finish(print_timings, trace_file_name):
+    # Close the spans still open (e.g. the command, when it called sys.exit()).
+    for open_span in reversed(get_stack()):
+        open_span.__exit__(None, None, None)
+
+    if print_timings:
+        print_breakdown(sys.stderr)
+
+    if trace_file_name:
+        write_trace(trace_file_name)
+
+
+def instrument(session):
+    """
+        Times every AWS API call made through session (a boto3 session), from
+        building the request to parsing the response, retries included.
+    """
+    if not enabled:
+        return session
+
+    events = session.events
+
+    def before_call(model, context, **kwargs):
+        context["aws_creds_span"] = Span("aws " + model.service_model.service_name + "." + model.name).__enter__()
+
+    def after_call(context, **kwargs):
+        if "aws_creds_span" in context:
+            context.pop("aws_creds_span").__exit__(None, None, None)
+
+    def after_call_error(context, exception=None, **kwargs):
+        if "aws_creds_span" in context:
+            context["aws_creds_span"].error = type(exception).__name__ if exception else "Error"
+            context.pop("aws_creds_span").__exit__(None, None, None)
+
+    events.register("before-call", before_call, unique_id="aws-creds-timing-before-call")
+    events.register("after-call", after_call, unique_id="aws-creds-timing-after-call")
+    events.register("after-call-error", after_call_error, unique_id="aws-creds-timing-after-call-error")
+    return session
+
+
+def get_spans():
+    """Returns every finished span, in the order they started."""
+    return sorted(_spans, key=lambda s: s.start)
+
+
+def print_breakdown(fh):
+    """
+        Prints every span as a tree with its time in milliseconds. Spans with
+        the same name and parent (e.g. the same query run 500 times) are added
+        up and printed once, with how many times they ran.
+    """
+    children = {}
+
+    for finished_span in get_spans():
+        children.setdefault(finished_span.parent.id if finished_span.parent else None, []).append(finished_span)
+
+    def print_children(parent_ids, depth):
+        groups = {}
+
+        for parent_id in parent_ids:
+            for child in children.get(parent_id, []):
+                groups.setdefault(child.name, []).append(child)
+
+        for name, spans in groups.items():
+            total = sum(s.duration for s in spans) / 1e6
+            count = " (x" + str(len(spans)) + ")" if len(spans) > 1 else ""
+            error = " [" + spans[-1].error + "]" if spans[-1].error else ""
+            print("%9.1f ms  %s%s%s%s" % (total, "  " * depth, name, count, error), file=fh)
+            print_children([s.id for s in spans], depth + 1)
+
+    print(" ", file=fh)
+    print("Timings", file=fh)
+    print(" ", file=fh)
+    print_children([None], 0)
+    print(" ", file=fh)
+
+
+def write_trace(file_name):
+    """
+        Appends the spans to file_name as one line of OTLP JSON (the format
+        of the OpenTelemetry collector's file exporter and otlpjsonfile
+        receiver), so traces from many machines can be collected and added up.
+    """
+    resource_attributes = {"service.name": SERVICE_NAME}
+
+    if hasattr(os, "uname"):
+        resource_attributes["host.name"] = os.uname().nodename
+
+    trace = {
+        "resourceSpans": [{
+            "resource": {"attributes": get_otlp_attributes(resource_attributes)},
+            "scopeSpans": [{
+                "scope": {"name": SERVICE_NAME},
+                "spans": [get_otlp_span(s) for s in get_spans()]
+            }]
+        }]
+    }
+
+    # Imported here as json is slow to import and only needed when writing a trace.
+    import json
+
+    fd = os.open(file_name, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+
+    with os.fdopen(fd, "w") as fh:
+        # One write per trace, so traces from processes running at once don't interleave.
+        fh.write(json.dumps(trace, separators=(",", ":")) + "\n")
+
+
+def get_otlp_span(finished_span):
+    otlp_span = {
+        "traceId": _trace_id,
+        "spanId": finished_span.id,
+        "name": finished_span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(finished_span.start_time),
+        "endTimeUnixNano": str(finished_span.start_time + finished_span.duration),
+        "attributes": get_otlp_attributes(finished_span.attributes),
+        # 1 is OK, 2 is ERROR.
+        "status": {"code": 2, "message": finished_span.error} if finished_span.error else {"code": 1}
+    }
+
+    if finished_span.parent:
+        otlp_span["parentSpanId"] = finished_span.parent.id
+
+    return otlp_span
+
+
+def get_otlp_attributes(attributes):
+    return [{"key": key, "value": {"stringValue": str(value)}} for key, value in attributes.items()]
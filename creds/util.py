@@ -1,8 +1,7 @@
-import boto3
 import json
 import datetime
 import os
-from creds import cred
+from creds import cred, cache, defaults, roles, timing
 
 
 AWS_CLI_ENVIRONMENT_VARIABLES = ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY",
@@ -10,6 +9,13 @@ AWS_CLI_ENVIRONMENT_VARIABLES = ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY",
                                  "AWS_DEFAULT_OUTPUT", "AWS_CA_BUNDLE", 
                                  "AWS_SHARED_CREDENTIALS_FILE", "AWS_CONFIG_FILE"]
 
+ROLE_SESSION_REFRESH_WINDOW = cache.SESSION_REFRESH_WINDOW
+# GetSessionToken allows 15 minutes to 36 hours, 12 hours covers a working day.
+MFA_SESSION_DURATION = 43200
+
+_session = None
+_clients = {}
+
 
 def logged_in():
     if cred.Credential.get_current():
@@ -18,56 +24,350 @@ def logged_in():
         return False
 
 
-def get_access_key_age():
-    if logged_in():
-        session = boto3.Session()
-        credentials = session.get_credentials()
-        access_key_id = credentials.access_key
-        iam = boto3.client('iam')
-        access_keys = iam.list_access_keys()
-        days_old = 0
-
-        for access_key_metadata in access_keys["AccessKeyMetadata"]:
-            if access_key_metadata["AccessKeyId"] == access_key_id:
-                create_date = access_key_metadata["CreateDate"].replace(tzinfo=None)
-                current_time = datetime.datetime.utcnow().replace(tzinfo=None)
-                time_string = str(current_time - create_date).split(",")[0]
-                try:
-                    days_old = int(time_string.split(" ")[0])
-                except:
-                    days_old = 0
-
-        return days_old
+def get_session():
+    """
+        Returns the boto3 session shared by every helper in this process, so
+        credentials are only resolved once.
+    """
+    global _session
+
+    if _session is None:
+        with timing.span("import boto3"):
+            import boto3
+
+        with timing.span("boto3 session"):
+            _session = timing.instrument(boto3.session.Session())
+
+    return _session
+
+
+def get_client(service_name):
+    """
+        Returns the shared client for service_name. Clients are thread safe
+        once created, but creating them isn't, so always create them here (on
+        the calling thread) before handing them to a worker thread.
+    """
+    if service_name not in _clients:
+        session = get_session()
+
+        with timing.span("client " + service_name):
+            _clients[service_name] = session.client(service_name)
+
+    return _clients[service_name]
+
+
+def reset_session():
+    global _session
+
+    _session = None
+    _clients.clear()
+
+
+def get_access_key_age(refresh=False):
+    my_credential = cred.Credential.get_current()
+
+    if my_credential:
+        profile_cache = cache.ProfileCache(my_credential)
+        # None is cached too, for a key that isn't in the list of the user's keys.
+        create_date = cache.MISSING if refresh else profile_cache.get("access_key_create_date", default=cache.MISSING)
+
+        if create_date is cache.MISSING:
+            create_date = fetch_access_key_create_date(get_client("iam"), my_credential.access_key)
+            profile_cache.set("access_key_create_date", create_date, get_cache_ttl())
+            my_credential.update_prompt()
+
+        return get_days_old(create_date)
     else:
         raise NotLoggedInError()
 
 
-def get_account_details():
-    if logged_in():
-        sts = boto3.client("sts")
-        iam = boto3.client("iam")
-        id = sts.get_caller_identity()
-        details = { }
-    
-        details["account"] = id["Account"]
-        details["username"] = id["Arn"].split("/")[1]
+def fetch_access_key_create_date(iam, access_key_id):
+    # Not the Access Key of the session, which is temporary when logged in with MFA.
+    access_keys = iam.list_access_keys()
+
+    for access_key_metadata in access_keys["AccessKeyMetadata"]:
+        if access_key_metadata["AccessKeyId"] == access_key_id:
+            return str(access_key_metadata["CreateDate"].replace(tzinfo=None))
+
+    return None
 
-        # List account aliases through the pagination interface
+
+def get_days_old(create_date):
+    days_old = 0
+
+    if create_date:
+        create_date = datetime.datetime.fromisoformat(create_date)
+        current_time = datetime.datetime.utcnow().replace(tzinfo=None)
+        time_string = str(current_time - create_date).split(",")[0]
         try:
-            paginator = iam.get_paginator("list_account_aliases")
-            for response in paginator.paginate():
-                details["aliases"] = response["AccountAliases"][0]
+            days_old = int(time_string.split(" ")[0])
         except:
-            details["aliases"] = "N/A"
+            days_old = 0
+
+    return days_old
+
+
+def get_account_details(refresh=False):
+    my_credential = cred.Credential.get_current()
+
+    if my_credential:
+        profile_cache = cache.ProfileCache(my_credential)
+        cache_key = get_account_details_cache_key(my_credential)
+        details = None if refresh else profile_cache.get(cache_key)
+
+        if details is None:
+            details = fetch_caller_identity(get_client("sts"))
+            details["aliases"] = fetch_account_alias(get_client("iam"))
+            profile_cache.set(cache_key, details, get_cache_ttl())
+            my_credential.update_prompt()
 
         return details
     else:
         raise NotLoggedInError()
 
 
+def get_status_details(include_access_key_age=True, refresh=False):
+    """
+        Returns the same details as get_account_details() (plus "access_key_age"
+        when include_access_key_age is set). Anything not in the profile's
+        cache is fetched with the STS and IAM calls made concurrently rather
+        than one after another.
+    """
+    my_credential = cred.Credential.get_current()
+
+    if my_credential:
+        profile_cache = cache.ProfileCache(my_credential)
+        cache_key = get_account_details_cache_key(my_credential)
+        details = None if refresh else profile_cache.get(cache_key)
+        create_date = cache.MISSING if refresh or not include_access_key_age else \
+            profile_cache.get("access_key_create_date", default=cache.MISSING)
+        fetch_create_date = include_access_key_age and create_date is cache.MISSING
+
+        if details is None or fetch_create_date:
+            import concurrent.futures
+            sts = get_client("sts")
+            iam = get_client("iam")
+            # Resolved up front, as the session itself isn't thread safe.
+            get_session().get_credentials()
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+                if details is None:
+                    identity = executor.submit(fetch_caller_identity, sts)
+                    aliases = executor.submit(fetch_account_alias, iam)
+
+                if fetch_create_date:
+                    access_key_create_date = executor.submit(fetch_access_key_create_date, iam, my_credential.access_key)
+
+                if details is None:
+                    details = identity.result()
+                    details["aliases"] = aliases.result()
+                    profile_cache.set(cache_key, details, get_cache_ttl())
+
+                if fetch_create_date:
+                    create_date = access_key_create_date.result()
+                    profile_cache.set("access_key_create_date", create_date, get_cache_ttl())
+
+            my_credential.update_prompt()
+
+        details = dict(details)
+
+        if include_access_key_age:
+            details["access_key_age"] = get_days_old(create_date)
+
+        return details
+    else:
+        raise NotLoggedInError()
+
+
+def get_account_details_cache_key(my_credential):
+    # An assumed role reports the details of the role's account.
+    current_role = my_credential.get_current_role()
+
+    if current_role:
+        return "account_details:" + current_role
+    else:
+        return "account_details"
+
+
+def get_cache_ttl():
+    return defaults.DefaultConfiguration().cache_ttl
+
+
+def fetch_caller_identity(sts):
+    id = sts.get_caller_identity()
+    details = { }
+
+    details["account"] = id["Account"]
+    details["username"] = id["Arn"].split("/")[1]
+
+    return details
+
+
+def fetch_account_alias(iam):
+    aliases = "N/A"
+
+    # List account aliases through the pagination interface
+    try:
+        paginator = iam.get_paginator("list_account_aliases")
+        for response in paginator.paginate():
+            aliases = response["AccountAliases"][0]
+    except:
+        aliases = "N/A"
+
+    return aliases
+
+
+def get_role_session(my_credential, role_arn, refresh=False):
+    """
+        Returns temporary credentials (AccessKeyId, SecretAccessKey,
+        SessionToken and Expiration) for role_arn, assumed with my_credential's
+        keys, or with its MFA session if it has one (see get_mfa_session()),
+        so roles that require MFA can be assumed. They are reused from the
+        profile's encrypted role session cache until they are within
+        ROLE_SESSION_REFRESH_WINDOW of expiring.
+    """
+    role_session_cache = cache.RoleSessionCache(my_credential)
+    session = None if refresh else role_session_cache.get(role_arn)
+
+    if session is None or expires_soon(session):
+        import botocore.exceptions
+        sts = create_session(my_credential, my_credential.get_mfa_session()).client("sts")
+
+        try:
+            response = sts.assume_role(RoleArn=role_arn, RoleSessionName=get_role_session_name(my_credential))
+        except botocore.exceptions.ClientError as err:
+            raise RoleAssumptionError(role_arn, str(err))
+
+        session = get_temporary_credentials(response)
+        role_session_cache.set(role_arn, session)
+
+    return session
+
+
+def get_mfa_session(my_credential, code=None, refresh=False, duration=MFA_SESSION_DURATION):
+    """
+        Returns temporary credentials for my_credential from STS
+        GetSessionToken, authenticated with its MFA device and code, so
+        accounts that require MFA can be used with them. They are reused from
+        the profile's encrypted MFA session cache until they are within
+        ROLE_SESSION_REFRESH_WINDOW of expiring, so the code is only needed
+        once per session. Returns None if there is no session to reuse and no
+        code to fetch one with.
+    """
+    session = None if refresh else my_credential.get_mfa_session()
+
+    if session is None and code:
+        import botocore.exceptions
+        sts = create_session(my_credential).client("sts")
+
+        try:
+            response = sts.get_session_token(DurationSeconds=duration, SerialNumber=my_credential.mfa_serial,
+                                             TokenCode=code)
+        except botocore.exceptions.ClientError as err:
+            raise MfaSessionError(my_credential.mfa_serial, str(err))
+
+        session = get_temporary_credentials(response)
+        cache.MfaSessionCache(my_credential).set(my_credential.mfa_serial, session)
+
+    return session
+
+
+def get_temporary_credentials(response):
+    return {
+        "AccessKeyId": response["Credentials"]["AccessKeyId"],
+        "SecretAccessKey": response["Credentials"]["SecretAccessKey"],
+        "SessionToken": response["Credentials"]["SessionToken"],
+        "Expiration": response["Credentials"]["Expiration"].isoformat()
+    }
+
+
+def discover_roles(my_credential, source, role_name=None, path_prefix="/"):
+    """
+        Returns a Role for every role my_credential's keys can list: with
+        source "organizations", role_name in every active account of its
+        organisation (aliased by the account's name), or with source "iam",
+        every role in its own account under path_prefix.
+    """
+    import botocore.exceptions
+    session = create_session(my_credential)
+    discovered = []
+
+    try:
+        if source == "organizations":
+            for page in session.client("organizations").get_paginator("list_accounts").paginate():
+                for account in page["Accounts"]:
+                    if account["Status"] == "ACTIVE":
+                        alias = "".join(c if c.isalnum() else "-" for c in account["Name"].lower()).strip("-")
+                        arn = "arn:aws:iam::" + account["Id"] + ":role/" + role_name
+                        discovered.append(roles.Role(arn, alias, {"account": account["Name"]}))
+        else:
+            for page in session.client("iam").get_paginator("list_roles").paginate(PathPrefix=path_prefix):
+                for role in page["Roles"]:
+                    discovered.append(roles.Role(role["Arn"]))
+    except botocore.exceptions.ClientError as err:
+        raise RoleDiscoveryError(source, str(err))
+
+    return discovered
+
+
+def refresh_role_session(my_credential, force=False):
+    """
+        Renews the session of the role currently assumed with my_credential if
+        it is about to expire (or if force is set), and switches the [default]
+        profile over to it. Returns the session in use, or None if no role is
+        assumed.
+    """
+    role_arn = my_credential.get_current_role()
+
+    if role_arn:
+        session = cache.RoleSessionCache(my_credential).get(role_arn)
+
+        if force or session is None or expires_soon(session):
+            session = get_role_session(my_credential, role_arn, refresh=force)
+            my_credential.assume_role(role_arn, session)
+
+        return session
+    else:
+        return None
+
+
+def expires_soon(session):
+    return cache.expires_soon(session)
+
+
+def get_role_session_name(my_credential):
+    # Session names are limited to 64 characters of [\w+=,.@-].
+    name = "".join(c if c.isalnum() or c in "+=,.@-_" else "-" for c in my_credential.name)
+    return ("aws-creds-" + name)[:64]
+
+
+def create_session(my_credential, session=None):
+    """
+        Returns a new boto3 session using my_credential's keys directly (or
+        the temporary credentials in session), for calls that must not depend
+        on which profile is logged into.
+    """
+    with timing.span("import boto3"):
+        import boto3
+
+    if session:
+        return timing.instrument(boto3.session.Session(
+            aws_access_key_id=session["AccessKeyId"],
+            aws_secret_access_key=session["SecretAccessKey"],
+            aws_session_token=session["SessionToken"],
+            region_name=my_credential.region
+        ))
+
+    return timing.instrument(boto3.session.Session(
+        aws_access_key_id=my_credential.access_key,
+        aws_secret_access_key=my_credential.secret_key,
+        region_name=my_credential.region
+    ))
+
+
 def rotate_access_keys():
     if logged_in():
-        iam = boto3.client('iam')
+        iam = get_client("iam")
         access_keys = iam.list_access_keys()["AccessKeyMetadata"]
         if len(access_keys) <= 1:
             current_access_key = access_keys[0]["AccessKeyId"]
@@ -77,11 +377,17 @@ def rotate_access_keys():
             credential.access_key = new_access_key_details["AccessKey"]["AccessKeyId"]
             credential.secret_key = new_access_key_details["AccessKey"]["SecretAccessKey"]
             credential.save()
+            # Saving cleared the profile's cache, the new key's age is known without asking IAM.
+            cache.ProfileCache(credential).set("access_key_create_date",
+                                               str(new_access_key_details["AccessKey"]["CreateDate"].replace(tzinfo=None)),
+                                               get_cache_ttl())
             iam.delete_access_key(
                 UserName=account_details["username"],
                 AccessKeyId=current_access_key
             )
-            cred.Credential.logout()
+            # Switch the logged in session over to the new key rather than logging out.
+            credential.login()
+            reset_session()
             return credential
         else:
             raise TooManyAccessKeysError([
@@ -117,4 +423,25 @@ class TooManyAccessKeysError(Exception):
 
 class NotLoggedInError(Exception):
     def __init__(self):
-        self.message = "You're not logged in."
\ No newline at end of file
+        self.message = "You're not logged in."
+
+
+class RoleAssumptionError(Exception):
+    def __init__(self, role_arn, reason):
+        self.role_arn = role_arn
+        self.reason = reason
+        self.message = "Sorry, the role '" + role_arn + "' couldn't be assumed."
+
+
+class RoleDiscoveryError(Exception):
+    def __init__(self, source, reason):
+        self.source = source
+        self.reason = reason
+        self.message = "Sorry, the roles couldn't be listed from " + ("AWS Organizations." if source == "organizations" else "IAM.")
+
+
+class MfaSessionError(Exception):
+    def __init__(self, serial_number, reason):
+        self.serial_number = serial_number
+        self.reason = reason
+        self.message = "Sorry, a session couldn't be started with the MFA device '" + serial_number + "'."
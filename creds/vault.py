@@ -0,0 +1,351 @@
+import os
+import sys
+import json
+import time
+import threading
+from creds import store, crypto, files, defaults, timing
+
+
+SETTING_NAME = "encryption"
+# The unlock cache holds the key itself, so it is only kept in the per user
+# directory in memory that is cleared on log out. Without one it isn't kept
+# at all, as it would stay on disk (use the OS keyring instead).
+RUNTIME_DIRECTORY = os.environ.get("XDG_RUNTIME_DIR")
+UNLOCK_FILE_NAME = os.path.join(RUNTIME_DIRECTORY, ".aws-creds-unlock") if RUNTIME_DIRECTORY else None
+# Where older versions kept it when there was no runtime directory.
+OLD_UNLOCK_FILE_NAME = os.path.expanduser("~/.aws/.aws-creds-unlock")
+KEY_SIZE = 32
+SALT_SIZE = 16
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+KEYRING_SERVICE = "aws-creds"
+
+# Whether get_key() may ask for the passphrase, turned off by the agent.
+prompt = True
+
+_settings = None
+_settings_loaded = False
+_key = None
+_key_expires = 0
+# Secret Keys are read from worker threads (see fanout and fleet), only one
+# of them may look for the key (or ask for the passphrase) at a time.
+_key_lock = threading.Lock()
+
+
+def get_settings():
+    """
+        Returns how the key the Secret Keys are encrypted with is protected
+        (as saved in the store), or None if they aren't encrypted.
+    """
+    global _settings, _settings_loaded
+
+    if not _settings_loaded:
+        _settings = store.get_setting(SETTING_NAME)
+        _settings_loaded = True
+
+    return _settings
+
+
+def is_enabled():
+    return get_settings() is not None
+
+
+def reset():
+    """Forgets the settings and key read by this process, e.g. when the store has changed."""
+    global _settings_loaded
+
+    _settings_loaded = False
+    remember(None, 0)
+
+
+def remember(key, expires):
+    global _key, _key_expires
+
+    _key = key
+    _key_expires = expires
+
+
+def encrypt(secret, profile_id, key=None):
+    # The profile's id is bound to the ciphertext, so it can't be moved to another profile.
+    return crypto.encrypt(secret.encode(), key or get_key(), profile_id.encode())
+
+
+def decrypt(token, profile_id, key=None):
+    return crypto.decrypt(token, key or get_key(), profile_id.encode()).decode()
+
+
+def get_key():
+    """
+        Returns the key the Secret Keys are encrypted with, from this process,
+        the unlock cache, the OS keyring or (in a terminal) the passphrase, in
+        that order. A key derived from the passphrase is put in the unlock
+        cache, so the commands run after it don't derive it again. Raises
+        VaultLockedError if it can't be found.
+    """
+    settings = get_enabled_settings()
+
+    if _key is not None and time.time() < _key_expires:
+        return _key
+
+    with _key_lock:
+        # Another thread may have found the key while this one waited.
+        if _key is not None and time.time() < _key_expires:
+            return _key
+
+        return find_key(settings)
+
+
+def get_cache_key():
+    """
+        Returns the key the cached role and MFA sessions are encrypted with,
+        derived from the key the Secret Keys are encrypted with (so they are
+        as well protected, but never encrypted with the same key).
+    """
+    # Imported here as hashlib is slow to import and only needed once a role
+    # or MFA session is read or written.
+    import hmac
+    import hashlib
+
+    return hmac.new(get_key(), b"aws-creds session cache", hashlib.sha256).digest()
+
+
+def find_key(settings):
+    key = read_unlock_file(settings)
+
+    if key is None and settings["Protector"] == "keyring":
+        key = unwrap(settings)
+        remember(key, float("inf"))
+
+    if key is None and prompt and sys.stdin.isatty():
+        # Imported here as it is only needed when the store is locked.
+        import getpass
+        key = unlock(getpass.getpass("Passphrase for your saved profiles: "))
+
+    if key is None:
+        raise VaultLockedError()
+
+    return key
+
+
+def get_enabled_settings():
+    settings = get_settings()
+
+    if settings is None:
+        raise EncryptionNotEnabledError()
+
+    return settings
+
+
+def can_cache_key():
+    return UNLOCK_FILE_NAME is not None
+
+
+def read_unlock_file(settings):
+    """
+        Returns the key from the unlock cache, or None if it isn't there. An
+        expired (or unreadable) cache is deleted rather than left on disk.
+    """
+    if os.path.exists(OLD_UNLOCK_FILE_NAME):
+        files.remove(OLD_UNLOCK_FILE_NAME)
+
+    if UNLOCK_FILE_NAME is None:
+        return None
+
+    try:
+        with open(UNLOCK_FILE_NAME, "r") as fh:
+            cache = json.loads(fh.read())
+
+        expires = cache["Expires"]
+        key = crypto.decode(cache["Key"])
+        valid = cache["KeyId"] == settings["KeyId"] and expires >= time.time()
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError):
+        valid = False
+
+    if not valid:
+        files.remove(UNLOCK_FILE_NAME)
+        return None
+
+    remember(key, expires)
+    return key
+
+
+def unlock(passphrase=None, timeout=None):
+    """
+        Unwraps the key with passphrase (or the OS keyring's key) and keeps it
+        in the unlock cache for timeout seconds (by default 'unlock_timeout'
+        under 'aws-creds default'). Returns the key.
+    """
+    settings = get_enabled_settings()
+    key = unwrap(settings, passphrase)
+    cache_key(key, settings["KeyId"], timeout)
+    return key
+
+
+def cache_key(key, key_id, timeout=None):
+    if timeout is None:
+        timeout = defaults.DefaultConfiguration().unlock_timeout
+
+    expires = time.time() + timeout
+
+    if timeout > 0 and can_cache_key():
+        cache = {
+            "KeyId": key_id,
+            "Key": crypto.encode(key),
+            "Expires": expires
+        }
+
+        files.write(UNLOCK_FILE_NAME, json.dumps(cache))
+
+    remember(key, expires)
+
+
+def lock():
+    """Removes the key from the unlock cache and this process."""
+    if UNLOCK_FILE_NAME:
+        files.remove(UNLOCK_FILE_NAME)
+
+    files.remove(OLD_UNLOCK_FILE_NAME)
+    remember(None, 0)
+
+
+@timing.traced("vault.derive_key")
+def derive_key(passphrase, salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """Derives a key from passphrase with scrypt, which is deliberately slow (see SCRYPT_N)."""
+    # Imported here as cryptography is slow to import and rarely needed.
+    from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+    return Scrypt(salt=salt, length=KEY_SIZE, n=n, r=r, p=p).derive(passphrase.encode())
+
+
+def protect(key, key_id, passphrase=None):
+    """
+        Returns the settings to save for key: key encrypted (wrapped) with a
+        key derived from passphrase, or if there is no passphrase, with a
+        random key kept in the OS keyring.
+    """
+    settings = {"KeyId": key_id}
+
+    if passphrase is None:
+        wrapping_key = os.urandom(KEY_SIZE)
+        get_keyring().set_password(KEYRING_SERVICE, key_id, crypto.encode(wrapping_key))
+        settings["Protector"] = "keyring"
+    else:
+        salt = os.urandom(SALT_SIZE)
+        wrapping_key = derive_key(passphrase, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        settings.update({
+            "Protector": "scrypt",
+            "Salt": crypto.encode(salt),
+            "N": SCRYPT_N,
+            "R": SCRYPT_R,
+            "P": SCRYPT_P
+        })
+
+    settings["WrappedKey"] = crypto.encrypt(key, wrapping_key, key_id.encode())
+    return settings
+
+
+def unwrap(settings, passphrase=None):
+    if settings["Protector"] == "keyring":
+        wrapping_key = get_keyring().get_password(KEYRING_SERVICE, settings["KeyId"])
+
+        if wrapping_key is None:
+            raise VaultLockedError()
+
+        wrapping_key = crypto.decode(wrapping_key)
+    elif passphrase is None:
+        raise VaultLockedError()
+    else:
+        wrapping_key = derive_key(passphrase, crypto.decode(settings["Salt"]),
+                                  settings["N"], settings["R"], settings["P"])
+
+    try:
+        return crypto.decrypt(settings["WrappedKey"], wrapping_key, settings["KeyId"].encode())
+    except crypto.DecryptionError:
+        raise IncorrectPassphraseError()
+
+
+def get_keyring():
+    try:
+        import keyring
+    except ImportError:
+        raise KeyringNotInstalledError()
+
+    return keyring
+
+
+def enable(passphrase=None):
+    """
+        Encrypts the Secret Key of every saved profile with a new random key,
+        protected by passphrase (or the OS keyring if there isn't one). If
+        they are already encrypted, only the protection of the key changes
+        (e.g. a new passphrase), nothing is encrypted again.
+    """
+    settings = get_settings()
+
+    if settings:
+        key = get_key()
+        key_id = settings["KeyId"]
+    else:
+        key = os.urandom(KEY_SIZE)
+        key_id = os.urandom(8).hex()
+
+    new_settings = protect(key, key_id, passphrase)
+
+    with store.get_connection() as connection:
+        if settings is None:
+            for document in store.get_all():
+                document = store.copy_document(document)
+                credentials = document["Credentials"]
+                credentials["EncryptedSecretKey"] = encrypt(credentials.pop("SecretKey"), document["Id"], key)
+                store.put(document, connection)
+
+        store.put_setting(SETTING_NAME, new_settings, connection)
+
+    reset()
+
+    if passphrase is None:
+        remember(key, float("inf"))
+    else:
+        cache_key(key, key_id)
+
+
+def disable():
+    """Decrypts the Secret Key of every saved profile and stops encrypting them."""
+    key = get_key()
+
+    with store.get_connection() as connection:
+        for document in store.get_all():
+            document = store.copy_document(document)
+            credentials = document["Credentials"]
+
+            if "EncryptedSecretKey" in credentials:
+                credentials["SecretKey"] = decrypt(credentials.pop("EncryptedSecretKey"), document["Id"], key)
+                store.put(document, connection)
+
+        store.put_setting(SETTING_NAME, None, connection)
+
+    lock()
+    reset()
+
+
+class VaultLockedError(Exception):
+    def __init__(self):
+        self.message = "Sorry, your saved profiles are encrypted and locked, unlock them with 'aws-creds unlock'."
+
+
+class IncorrectPassphraseError(Exception):
+    def __init__(self):
+        self.message = "Sorry, that passphrase is incorrect."
+
+
+class EncryptionNotEnabledError(Exception):
+    def __init__(self):
+        self.message = "Your saved profiles aren't encrypted, turn it on with 'aws-creds encrypt'."
+
+
+class KeyringNotInstalledError(VaultLockedError):
+    # Without the keyring, the profiles can't be unlocked.
+    def __init__(self):
+        self.message = "Sorry, the OS keyring can only be used once the 'keyring' package is installed (pip install keyring)."
@@ -0,0 +1,1215 @@
+#!/bin/python3
+"""
+    Benchmarks for aws-creds. Every benchmark runs against a throwaway HOME
+    so the user's real profiles are never touched.
+
+    Usage: python3 scripts/benchmark.py [login] [startup] [status] [import] [stress] [agent] [each] [rotate] [picker] [filter] [encrypt] [cache] [listing] [roles] [mfa] [history] [prompt]
+                                        [suite [--sizes 10,100,...] [--save FILE] [--compare FILE]]
+"""
+import os
+import sys
+import json
+import tempfile
+import statistics
+import subprocess
+import time
+
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOGIN_PROFILE_COUNT = 500
+LOGIN_BUDGET_MS = 50
+RUNS = 20
+STARTUP_BUDGET_MS = 100
+OFFLINE_COMMANDS = [["--help"], ["ls"], ["default", "get"]]
+STUB_LATENCY_MS = 100
+IMPORT_PROFILE_COUNTS = [1000, 10000]
+IMPORT_MEMORY_GROWTH_MB = 10
+STRESS_PROCESSES = 8
+STRESS_SWITCHES = 50
+AGENT_CLIENTS = 16
+AGENT_REQUESTS = 200
+AGENT_WARMUP_REQUESTS = 10
+AGENT_BUDGET_MS = 10
+EACH_PROFILE_COUNT = 300
+EACH_WORKERS = 32
+ROTATE_PROFILE_COUNT = 80
+PICKER_PROFILE_COUNT = 5000
+PICKER_BUDGET_MS = 1
+PICKER_QUERIES = ["prodpay", "billing", "team-dat", "0042", "zzz", "sandbox eu", "apcore"]
+FILTER_PROFILE_COUNT = 10000
+FILTER_TEAMS = 50
+ENCRYPT_KDF_COSTS = [2 ** 14, 2 ** 15, 2 ** 16, 2 ** 17]
+ENCRYPT_KDF_RUNS = 3
+ENCRYPT_LOGIN_OVERHEAD_MS = 40
+CACHE_PROFILE_COUNT = 10000
+CACHE_SPEEDUP = 10
+LISTING_PROFILE_COUNT = 10000
+LISTING_RUNS = 5
+ROLES_COUNT = 1000
+ROLES_LOOKUP_BUDGET_MS = 0.1
+MFA_LOGINS = 10
+HISTORY_RECORDS = 1000
+HISTORY_BUDGET_MS = 1
+PROMPT_RUNS = 10000
+PROMPT_BUDGET_US = 100
+SUITE_SIZES = [10, 100, 1000, 10000]
+SUITE_RUNS = 20
+SUITE_COMMAND_RUNS = 10
+SUITE_RESULTS_DIRECTORY = os.path.join(REPOSITORY_DIRECTORY, ".benchmarks")
+SUITE_REGRESSION_RATIO = 1.5
+SUITE_NOISE_MS = 1
+
+
+def create_home(profile_count, role_arns=()):
+    """
+        Creates a temporary HOME holding a profile store with profile_count
+        synthetic profiles (each with role_arns saved), written through the
+        store in a single transaction.
+    """
+    home = tempfile.mkdtemp(prefix="aws-creds-benchmark-")
+    script = (
+        "import sys, json\n"
+        "from creds import cred, store\n"
+        "with store.get_connection() as connection:\n"
+        "    for i in range(int(sys.argv[1])):\n"
+        "        c = cred.Credential('PROFILE-%05d' % i, 'Synthetic profile', 'AKIA%016d' % i, 'secret', 'us-east-1', 'json', json.loads(sys.argv[2]), str(i), 'now')\n"
+        "        c.modified_date = 'now'\n"
+        "        store.put(c.to_dictionary(), connection)\n"
+    )
+    run_python(home, script, str(profile_count), json.dumps(list(role_arns)))
+    return home
+
+
+def run_python(home, script, *args, options=[]):
+    # aws-creds refuses to run with AWS_* variables set, so don't pass them
+    # through, and the unlock cache has to be in the throwaway HOME as well.
+    environment = {k: v for k, v in os.environ.items() if not k.startswith("AWS_")}
+    environment.update(HOME=home, PYTHONPATH=REPOSITORY_DIRECTORY, XDG_RUNTIME_DIR=os.path.join(home, "run"))
+    os.makedirs(environment["XDG_RUNTIME_DIR"], mode=0o700, exist_ok=True)
+    return subprocess.run([sys.executable] + options + ["-c", script] + list(args), env=environment,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True)
+
+
+def time_command(home, arguments, runs=RUNS):
+    """Returns the wall time (in ms) of each run of 'aws-creds <arguments>'."""
+    script = "import sys; sys.argv[0] = 'aws-creds'; from creds.entry import main; main()"
+    timings = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_python(home, script, *arguments)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return timings
+
+
+def benchmark_login():
+    home = create_home(LOGIN_PROFILE_COUNT)
+    timings = time_command(home, ["login", "PROFILE-00250", "--no-age-check"])
+    median = statistics.median(timings)
+
+    report("login <NAME> --no-age-check (" + str(LOGIN_PROFILE_COUNT) + " profiles)", timings)
+    return median <= LOGIN_BUDGET_MS
+
+
+def import_time(home, arguments):
+    """
+        Runs 'aws-creds <arguments>' under 'python -X importtime' and returns
+        the cumulative import time (in ms) and the names of every module imported.
+    """
+    script = "import sys; sys.argv[0] = 'aws-creds'; from creds.entry import main; main()"
+    output = run_python(home, script, *arguments, options=["-X", "importtime"]).stdout.decode()
+    modules = {}
+
+    for line in output.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, module = line.split("|")
+            modules[module.strip()] = int(cumulative) / 1000
+
+    top_level = [t for m, t in modules.items() if m in ("creds.entry", "creds.main")]
+    return sum(top_level), modules.keys()
+
+
+def benchmark_startup():
+    """
+        Cold start of the commands that never call AWS must stay under
+        STARTUP_BUDGET_MS of imports and must not import boto3/botocore.
+    """
+    home = create_home(10)
+    within_budget = True
+
+    for arguments in OFFLINE_COMMANDS:
+        timings = []
+
+        for _ in range(RUNS):
+            total, modules = import_time(home, arguments)
+            timings.append(total)
+
+        aws_modules = [m for m in modules if m.split(".")[0] in ("boto3", "botocore")]
+        report("import time of 'aws-creds " + " ".join(arguments) + "'", timings)
+
+        if aws_modules:
+            print("    imports " + ", ".join(sorted(aws_modules)[:3]) + "...")
+            within_budget = False
+
+        if statistics.median(timings) > STARTUP_BUDGET_MS:
+            within_budget = False
+
+    return within_budget
+
+
+def use_home(home):
+    """
+        Points this process at home and returns the creds package. Only call
+        once per process, the creds modules work out their paths on import
+        (see run_separately()).
+    """
+    os.environ["HOME"] = home
+
+    for variable in [k for k in os.environ if k.startswith("AWS_")]:
+        del os.environ[variable]
+
+    sys.path.insert(0, REPOSITORY_DIRECTORY)
+    import creds.cred
+    import creds.util
+    return creds
+
+
+def create_stubbed_session(responses, latency_ms=STUB_LATENCY_MS):
+    """
+        Returns a boto3 session whose clients answer from responses (a dict of
+        service name to a dict of operation name to parsed response) after
+        latency_ms, and a dict counting the clients it constructed. Unlike
+        botocore's Stubber, responses don't have to be asked for in order.
+    """
+    import boto3
+    from botocore.awsrequest import AWSResponse
+
+    session = boto3.session.Session(aws_access_key_id="AKIA0000000000000000", aws_secret_access_key="secret",
+                                    region_name="us-east-1")
+    constructed = {}
+    create_client = session.client
+
+    def client(service_name, **kwargs):
+        constructed[service_name] = constructed.get(service_name, 0) + 1
+        new_client = create_client(service_name, **kwargs)
+
+        def respond(model, **_):
+            time.sleep(latency_ms / 1000)
+            return AWSResponse(None, 200, {}, None), responses[service_name][model.name]
+
+        new_client.meta.events.register("before-call", respond)
+        return new_client
+
+    session.client = client
+    return session, constructed
+
+
+def get_status_responses():
+    """Returns the responses to the STS and IAM calls behind 'aws-creds status', for create_stubbed_session()."""
+    import datetime
+    return {
+        "sts": {"GetCallerIdentity": {"UserId": "user", "Account": "123456789012",
+                                      "Arn": "arn:aws:iam::123456789012:user/benchmark"}},
+        "iam": {"ListAccountAliases": {"AccountAliases": ["benchmark"], "IsTruncated": False},
+                "ListAccessKeys": {"AccessKeyMetadata": [{
+                    "UserName": "benchmark", "AccessKeyId": "AKIA0000000000000000",
+                    "Status": "Active", "CreateDate": datetime.datetime(2020, 1, 1)}]}}
+    }
+
+
+def benchmark_status():
+    """
+        Runs the STS/IAM lookups behind 'aws-creds status' against stubbed
+        clients, both one after another and overlapped. Overlapping the three
+        calls should save most of two calls worth of latency, using one client
+        per service, and once cached no calls should be made at all.
+    """
+    creds = use_home(create_home(10))
+    creds.cred.Credential.get_all()[0].login()
+    responses = get_status_responses()
+
+    def sequential():
+        creds.util.get_account_details(refresh=True)
+        creds.util.get_access_key_age(refresh=True)
+
+    def concurrent():
+        creds.util.get_status_details(refresh=True)
+
+    timings = {}
+
+    for name, function in [("sequential", sequential), ("concurrent", concurrent)]:
+        timings[name] = []
+
+        for _ in range(RUNS):
+            session, constructed = create_stubbed_session(responses)
+            creds.util.reset_session()
+            creds.util._session = session
+
+            start = time.perf_counter()
+            function()
+            timings[name].append((time.perf_counter() - start) * 1000)
+
+        report("status details, " + name + " (" + str(STUB_LATENCY_MS) + " ms per call)", timings[name])
+        print("    clients constructed: " + str(constructed))
+
+    saved = statistics.median(timings["sequential"]) - statistics.median(timings["concurrent"])
+    within_budget = saved > 1.5 * STUB_LATENCY_MS and list(constructed.values()) == [1, 1]
+
+    # With a warm cache no clients should be needed at all.
+    session, constructed = create_stubbed_session(responses)
+    creds.util.reset_session()
+    creds.util._session = session
+    creds.util.get_status_details()
+    print("status details, cached: clients constructed: " + str(constructed))
+
+    return within_budget and not constructed
+
+
+def benchmark_import():
+    """
+        Imports IMPORT_PROFILE_COUNTS profiles from NDJSON into an empty store,
+        and checks that the peak memory of the import barely grows with the
+        size of the file.
+    """
+    script = (
+        "import sys, resource\n"
+        "sys.argv = ['aws-creds', 'import', sys.argv[1]]\n"
+        "from creds.main import main\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    )
+    peak_memory = []
+
+    for profile_count in IMPORT_PROFILE_COUNTS:
+        home = create_home(0)
+        file_name = os.path.join(home, "profiles.ndjson")
+
+        with open(file_name, "w") as fh:
+            for i in range(profile_count):
+                fh.write(json.dumps({"name": "PROFILE-%05d" % i, "description": "Synthetic profile",
+                                     "access_key": "AKIA%016d" % i, "secret_key": "secret"}) + "\n")
+
+        start = time.perf_counter()
+        output = run_python(home, script, file_name).stdout.decode()
+        elapsed = (time.perf_counter() - start) * 1000
+        peak_memory.append(int(output.split()[-1]) / 1024)
+
+        report("import of " + str(profile_count) + " profiles", [elapsed])
+        print("    peak memory: %.1f MB" % peak_memory[-1])
+
+    return peak_memory[-1] - peak_memory[0] < IMPORT_MEMORY_GROWTH_MB
+
+
+def benchmark_stress():
+    """
+        Has STRESS_PROCESSES processes log in and assume roles at random while
+        this process keeps reading ~/.aws/credentials and ~/.aws/config. Every
+        read must see exactly what one of the switches wrote: never a
+        truncated, empty or interleaved file.
+    """
+    home = create_home(4)
+    setup_script = (
+        "import json\n"
+        "from creds import cred, roles\n"
+        "expected = {'credentials': [], 'config': []}\n"
+        "session = {'AccessKeyId': 'ASIA', 'SecretAccessKey': 'secret', 'SessionToken': 'token'}\n"
+        "for c in cred.Credential.get_all():\n"
+        "    c.roles.add(roles.Role('arn:aws:iam::123456789012:role/' + c.name))\n"
+        "    c.save()\n"
+        "    expected['credentials'].append(c.get_credential_file_contents())\n"
+        "    expected['credentials'].append(c.get_credential_file_contents(session))\n"
+        "    expected['config'].append(c.get_default_options_file_contents())\n"
+        "    c.login()\n"
+        "print(json.dumps(expected))\n"
+    )
+    switch_script = (
+        "import sys, random\n"
+        "from creds import cred\n"
+        "credentials = cred.Credential.get_all()\n"
+        "session = {'AccessKeyId': 'ASIA', 'SecretAccessKey': 'secret', 'SessionToken': 'token'}\n"
+        "for i in range(int(sys.argv[1])):\n"
+        "    c = random.choice(credentials)\n"
+        "    c.login() if i % 2 else c.assume_role(next(iter(c.roles)).arn, session)\n"
+    )
+    expected = json.loads(run_python(home, setup_script).stdout.decode())
+    environment = {k: v for k, v in os.environ.items() if not k.startswith("AWS_")}
+    environment.update(HOME=home, PYTHONPATH=REPOSITORY_DIRECTORY)
+
+    start = time.perf_counter()
+    processes = [subprocess.Popen([sys.executable, "-c", switch_script, str(STRESS_SWITCHES)], env=environment)
+                 for _ in range(STRESS_PROCESSES)]
+    reads = 0
+    bad_reads = 0
+
+    while any(p.poll() is None for p in processes):
+        for name in ["credentials", "config"]:
+            with open(os.path.join(home, ".aws", name), "r") as fh:
+                if fh.read() not in expected[name]:
+                    bad_reads += 1
+
+            reads += 1
+
+    elapsed = (time.perf_counter() - start) * 1000
+    failed = [p for p in processes if p.returncode != 0]
+
+    report(str(STRESS_PROCESSES * STRESS_SWITCHES) + " switches from " + str(STRESS_PROCESSES) + " processes", [elapsed])
+    print("    " + str(reads) + " reads, " + str(bad_reads) + " bad, " + str(len(failed)) + " processes failed")
+    return bad_reads == 0 and not failed
+
+
+def benchmark_agent():
+    """
+        Has AGENT_CLIENTS threads each ask a running agent for AGENT_REQUESTS
+        credentials (half of them for an assumed role), opening a connection
+        per request as 'aws-creds credential-process' does. The clients share
+        this process (and its GIL) with the agent, so the 99th percentile
+        budget of AGENT_BUDGET_MS includes the time spent queueing behind
+        each other. Each client first makes AGENT_WARMUP_REQUESTS untimed
+        requests (while the agent starts its threads), and then they all
+        start together. Every answer must be right.
+    """
+    import datetime
+    import threading
+    role_arn = "arn:aws:iam::123456789012:role/benchmark"
+    creds = use_home(create_home(LOGIN_PROFILE_COUNT, [role_arn]))
+    import creds.agent
+    socket_file_name = os.path.join(os.environ["HOME"], "agent.sock")
+    agent = creds.agent.CredentialAgent()
+    expiration = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)).isoformat()
+
+    # Sessions the agent already holds (under the ARN it resolves the role
+    # to), so STS is never called.
+    for credential in {c.id: c for c in agent.credentials.values()}.values():
+        agent.sessions[(credential.id, credential.resolve_role(role_arn))] = {"AccessKeyId": "ASIA", "SecretAccessKey": "secret",
+                                                     "SessionToken": "token", "Expiration": expiration}
+
+    threading.Thread(target=agent.serve, args=(socket_file_name,), daemon=True).start()
+
+    while not os.path.exists(socket_file_name):
+        time.sleep(0.01)
+
+    timings = []
+    wrong = []
+    warmed_up = threading.Barrier(AGENT_CLIENTS + 1)
+
+    def client(number):
+        for i in range(AGENT_WARMUP_REQUESTS):
+            creds.agent.request("PROFILE-%05d" % i, role_arn if i % 2 else None, socket_file_name)
+
+        warmed_up.wait()
+
+        for i in range(AGENT_REQUESTS):
+            name = "PROFILE-%05d" % ((number * AGENT_REQUESTS + i) % LOGIN_PROFILE_COUNT)
+            role = role_arn if i % 2 else None
+
+            start = time.perf_counter()
+            output = creds.agent.request(name, role, socket_file_name)
+            timings.append((time.perf_counter() - start) * 1000)
+
+            if output.get("AccessKeyId") != ("ASIA" if role else "AKIA%016d" % int(name[-5:])):
+                wrong.append(output)
+
+    clients = [threading.Thread(target=client, args=(n,)) for n in range(AGENT_CLIENTS)]
+
+    for thread in clients:
+        thread.start()
+
+    warmed_up.wait()
+    start = time.perf_counter()
+
+    for thread in clients:
+        thread.join()
+
+    elapsed = time.perf_counter() - start
+    agent.stop()
+    p99 = sorted(timings)[int(len(timings) * 0.99)]
+
+    report("agent, " + str(len(timings)) + " requests from " + str(AGENT_CLIENTS) + " clients", timings)
+    print("    p99: %.2f ms, %d requests/s, %d wrong" % (p99, len(timings) / elapsed, len(wrong)))
+    return p99 <= AGENT_BUDGET_MS and not wrong
+
+
+def benchmark_each():
+    """
+        Calls GetCallerIdentity for EACH_PROFILE_COUNT profiles against a stub
+        answering after STUB_LATENCY_MS, EACH_WORKERS at a time, where every
+        tenth account fails. It must take less than twice the time of the
+        calls laid end to end in EACH_WORKERS lanes, and the failures must be
+        reported for exactly the right accounts. Then runs a command for 50 of
+        the profiles and checks every tagged line came from the right one.
+    """
+    import io
+    creds = use_home(create_home(EACH_PROFILE_COUNT))
+    import creds.fanout
+    import boto3
+    from botocore.awsrequest import AWSResponse
+    credentials = creds.fanout.select()
+    by_access_key = {c.access_key: c for c in credentials}
+    factory = creds.fanout.SessionFactory()
+    factory.session = boto3.session.Session()
+
+    def respond(request_signer, **_):
+        time.sleep(STUB_LATENCY_MS / 1000)
+        credential = by_access_key[request_signer._credentials.access_key]
+
+        if int(credential.name[-5:]) % 10 == 0:
+            return AWSResponse(None, 403, {}, None), {
+                "Error": {"Code": "AccessDenied", "Message": "Stubbed failure"},
+                "ResponseMetadata": {"HTTPStatusCode": 403}}
+
+        return AWSResponse(None, 200, {}, None), {"UserId": "user", "Account": credential.id,
+                                                  "Arn": "arn:aws:iam::123456789012:user/" + credential.name}
+
+    factory.session.events.register("before-call.sts.GetCallerIdentity", respond)
+
+    start = time.perf_counter()
+    results, failures = creds.fanout.run_callable(
+        credentials, lambda session, c: session.client("sts").get_caller_identity()["Account"],
+        EACH_WORKERS, factory, services=["sts"])
+    elapsed = (time.perf_counter() - start) * 1000
+    ideal = -(-EACH_PROFILE_COUNT // EACH_WORKERS) * STUB_LATENCY_MS
+    within_budget = elapsed < 2 * ideal
+    expected_failures = {c.name for c in credentials if int(c.name[-5:]) % 10 == 0}
+    correct = set(failures) == expected_failures and all(results[c.name] == c.id for c in credentials
+                                                          if c.name not in expected_failures)
+
+    report("each, " + str(EACH_PROFILE_COUNT) + " accounts, " + str(EACH_WORKERS) + " workers", [elapsed])
+    print("    ideal: %d ms, %d failed, results correct: %s" % (ideal, len(failures), correct))
+
+    output = io.StringIO()
+    script = "import os; print(os.environ['AWS_ACCESS_KEY_ID']); print(os.environ['AWS_CREDS_PROFILE'])"
+
+    start = time.perf_counter()
+    _, command_failures = creds.fanout.run_command(credentials[:50], [sys.executable, "-c", script],
+                                                   EACH_WORKERS, output)
+    elapsed = (time.perf_counter() - start) * 1000
+    expected = {c.name: {c.access_key, c.id} for c in credentials[:50]}
+    lines = output.getvalue().splitlines()
+    tagged = all(line.split("]")[0][1:] in expected and line.split()[-1] in expected[line.split("]")[0][1:]]
+                 for line in lines)
+
+    report("each, command for 50 profiles", [elapsed])
+    print("    %d lines, tagged correctly: %s" % (len(lines), tagged))
+
+    return within_budget and correct and tagged and len(lines) == 100 and not command_failures
+
+
+class RawResponse():
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **_):
+        yield self.body
+
+
+def create_iam_stub(credentials, throttle_every):
+    """
+        Returns a before-send handler playing IAM for credentials, one user per
+        profile with a single Access Key created 100 days ago. Every
+        throttle_every-th request is throttled, so botocore's retries are
+        exercised, and a dict of the keys each user has is kept up to date.
+    """
+    import re
+    import datetime
+    import threading
+    from urllib.parse import parse_qs
+    from botocore.awsrequest import AWSResponse
+
+    lock = threading.Lock()
+    users = {c.access_key: "user-" + c.name for c in credentials}
+    keys = {"user-" + c.name: [c.access_key] for c in credentials}
+    created = {c.access_key: datetime.datetime(2000, 1, 1) for c in credentials}
+    counter = [0]
+
+    def respond(request, **_):
+        time.sleep(STUB_LATENCY_MS / 1000)
+        access_key = re.search(r"Credential=([^/]+)/", request.headers["Authorization"].decode()).group(1)
+        body = {k: v[0] for k, v in parse_qs(request.body.decode() if isinstance(request.body, bytes) else request.body).items()}
+        action = body["Action"]
+
+        with lock:
+            counter[0] += 1
+            user = users[access_key]
+
+            if counter[0] % throttle_every == 0:
+                return AWSResponse(request.url, 400, {}, RawResponse(
+                    b"<ErrorResponse><Error><Type>Sender</Type><Code>Throttling</Code>"
+                    b"<Message>Rate exceeded</Message></Error><RequestId>1</RequestId></ErrorResponse>"))
+
+            if action == "ListAccessKeys":
+                members = "".join("<member><UserName>%s</UserName><AccessKeyId>%s</AccessKeyId><Status>Active</Status>"
+                                  "<CreateDate>%s</CreateDate></member>" % (user, k, created[k].isoformat() + "Z")
+                                  for k in keys[user])
+                result = "<AccessKeyMetadata>%s</AccessKeyMetadata><IsTruncated>false</IsTruncated>" % members
+            elif action == "CreateAccessKey":
+                new_access_key = "AKIANEW%013d" % counter[0]
+                users[new_access_key] = user
+                created[new_access_key] = datetime.datetime.utcnow()
+                keys[user].append(new_access_key)
+                result = ("<AccessKey><UserName>%s</UserName><AccessKeyId>%s</AccessKeyId><Status>Active</Status>"
+                          "<SecretAccessKey>secret</SecretAccessKey><CreateDate>%s</CreateDate></AccessKey>"
+                          % (user, new_access_key, created[new_access_key].isoformat() + "Z"))
+            else:
+                keys[user].remove(body["AccessKeyId"])
+                result = ""
+
+        return AWSResponse(request.url, 200, {}, RawResponse(
+            ("<%sResponse><%sResult>%s</%sResult><ResponseMetadata><RequestId>1</RequestId></ResponseMetadata></%sResponse>"
+             % (action, action, result, action, action)).encode()))
+
+    return respond, keys
+
+
+def benchmark_rotate():
+    """
+        Audits and then rotates ROTATE_PROFILE_COUNT profiles against a stubbed
+        IAM that throttles one request in seven. Every profile must end up
+        saved with a new key, its user holding only that key, and the logged
+        in profile must be logged in with its new key.
+    """
+    creds = use_home(create_home(ROTATE_PROFILE_COUNT))
+    import boto3
+    import creds.fanout
+    import creds.fleet
+    credentials = creds.cred.Credential.get_all()
+    credentials[0].login()
+    respond, keys = create_iam_stub(credentials, 7)
+    factory = creds.fanout.SessionFactory()
+    factory.session = boto3.session.Session()
+    factory.session.events.register("before-send.iam", respond)
+    fleet = creds.fleet.Fleet(workers=16, calls_per_second=50, factory=factory)
+
+    start = time.perf_counter()
+    results, failures = fleet.audit(credentials)
+    elapsed = (time.perf_counter() - start) * 1000
+    audited = len(results) == ROTATE_PROFILE_COUNT and not failures
+
+    report("audit of " + str(ROTATE_PROFILE_COUNT) + " profiles", [elapsed])
+    print("    %d checked, %d failed" % (len(results), len(failures)))
+
+    start = time.perf_counter()
+    rotated, skipped, failures = fleet.rotate(creds.cred.Credential.get_all(), older_than=90)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    saved = {c.name: c.access_key for c in creds.cred.Credential.get_all()}
+    consistent = all(keys["user-" + name] == [access_key] for name, access_key in saved.items())
+    logged_in = "aws_access_key_id=" + saved[credentials[0].name] in open(creds.cred.Credential.AWS_CREDENTIAL_FILE_NAME).read()
+
+    report("rotation of " + str(ROTATE_PROFILE_COUNT) + " profiles", [elapsed])
+    print("    %d rotated, %d skipped, %d failed, store matches IAM: %s, current profile logged in: %s" % (
+        len(rotated), len(skipped), len(failures), consistent, logged_in))
+
+    return audited and len(rotated) == ROTATE_PROFILE_COUNT and consistent and logged_in
+
+
+def benchmark_picker():
+    """
+        Types PICKER_QUERIES into the picker's search index one character at
+        a time (then deletes the last one) over PICKER_PROFILE_COUNT profiles.
+        The 95th percentile keystroke must take under PICKER_BUDGET_MS.
+    """
+    import random
+    sys.path.insert(0, REPOSITORY_DIRECTORY)
+    from creds import cred, picker
+
+    random.seed(1)
+    words = ["prod", "dev", "staging", "payments", "team", "data", "ml", "web", "api", "core", "billing", "audit",
+             "sandbox", "eu", "us", "ap"]
+    credentials = [cred.Credential("-".join(random.sample(words, 3)) + "-%04d" % i,
+                                   " ".join(random.sample(words, 4)) + " account",
+                                   "AKIA%016d" % i, "secret", "us-east-1", "json", [], str(i), "now")
+                   for i in range(PICKER_PROFILE_COUNT)]
+
+    start = time.perf_counter()
+    index = picker.SearchIndex(credentials)
+    report("picker index of " + str(PICKER_PROFILE_COUNT) + " profiles", [(time.perf_counter() - start) * 1000])
+
+    timings = []
+
+    for query in PICKER_QUERIES:
+        for typed in [query[:i] for i in range(1, len(query) + 1)] + [query[:-1], ""]:
+            start = time.perf_counter()
+            index.search(typed, picker.VISIBLE_MATCHES)
+            timings.append((time.perf_counter() - start) * 1000)
+
+    p95 = sorted(timings)[int(len(timings) * 0.95)]
+    report("picker keystrokes (" + str(len(timings)) + ")", timings)
+    print("    p95: %.2f ms" % p95)
+    return p95 < PICKER_BUDGET_MS
+
+
+def benchmark_filter():
+    """
+        Selects the profiles of one team out of FILTER_PROFILE_COUNT tagged
+        profiles (env=prod|dev, team=0..FILTER_TEAMS) through the tags index,
+        and by reading every profile and checking its tags. The index must be
+        the quicker of the two.
+    """
+    script = (
+        "import sys, time\n"
+        "from creds import cred, store\n"
+        "with store.get_connection() as connection:\n"
+        "    for i in range(int(sys.argv[1])):\n"
+        "        tags = {'env': 'prod' if i % 2 else 'dev', 'team': 'team-%d' % (i % int(sys.argv[2]))}\n"
+        "        c = cred.Credential('PROFILE-%05d' % i, 'Synthetic profile', 'AKIA%016d' % i, 'secret',\n"
+        "                            'us-east-1', 'json', [], str(i), 'now', tags=tags)\n"
+        "        c.modified_date = 'now'\n"
+        "        store.put(c.to_dictionary(), connection)\n"
+        "for name, select in [('index', lambda: cred.Credential.select(['env=prod', 'team=team-1'])),\n"
+        "                     ('scan', lambda: [c for c in cred.Credential.iterate_all()\n"
+        "                                       if c.tags.get('env') == 'prod' and c.tags.get('team') == 'team-1'])]:\n"
+        "    timings = []\n"
+        "    for run in range(5):\n"
+        "        start = time.perf_counter()\n"
+        "        count = len(select())\n"
+        "        timings.append((time.perf_counter() - start) * 1000)\n"
+        "    print(name, count, ' '.join(str(t) for t in timings))\n"
+    )
+    home = create_home(0)
+    output = run_python(home, script, str(FILTER_PROFILE_COUNT), str(FILTER_TEAMS)).stdout.decode()
+    medians = {}
+
+    for line in output.splitlines()[-2:]:
+        name, count, *timings = line.split()
+        timings = [float(t) for t in timings]
+        medians[name] = statistics.median(timings)
+        report("filter by " + name + " (" + count + " of " + str(FILTER_PROFILE_COUNT) + " profiles)", timings)
+
+    return medians["index"] < medians["scan"]
+
+
+def benchmark_encrypt():
+    """
+        Times scrypt at each of ENCRYPT_KDF_COSTS (the cost of a command run
+        while the profiles are locked, on top of the command itself), then
+        'ls' and 'login' over LOGIN_PROFILE_COUNT profiles before and after
+        they are encrypted. Once unlocked, login may only be slower by
+        ENCRYPT_LOGIN_OVERHEAD_MS (mostly importing cryptography), and 'ls'
+        must not decrypt (or import cryptography) at all.
+    """
+    sys.path.insert(0, REPOSITORY_DIRECTORY)
+    from creds import vault
+
+    for n in ENCRYPT_KDF_COSTS:
+        timings = []
+
+        for _ in range(ENCRYPT_KDF_RUNS):
+            start = time.perf_counter()
+            vault.derive_key("benchmark", os.urandom(vault.SALT_SIZE), n)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        report("scrypt with N=2^" + str(n.bit_length() - 1) + (" (default)" if n == vault.SCRYPT_N else ""), timings)
+
+    home = create_home(LOGIN_PROFILE_COUNT)
+    login = ["login", "PROFILE-00250", "--no-age-check"]
+    plain_login_timings = time_command(home, login)
+    report("ls (" + str(LOGIN_PROFILE_COUNT) + " profiles)", time_command(home, ["ls"]))
+    report("login <NAME> --no-age-check", plain_login_timings)
+
+    run_python(home, "from creds import vault; vault.enable('benchmark')")
+    ls_timings = time_command(home, ["ls"])
+    login_timings = time_command(home, login)
+    _, modules = import_time(home, ["ls"])
+    report("ls, encrypted", ls_timings)
+    report("login <NAME> --no-age-check, encrypted and unlocked", login_timings)
+
+    if "cryptography" in modules:
+        print("    'ls' imports cryptography")
+
+    overhead = statistics.median(login_timings) - statistics.median(plain_login_timings)
+    print("    login overhead: %.1f ms" % overhead)
+    return overhead <= ENCRYPT_LOGIN_OVERHEAD_MS and "cryptography" not in modules
+
+
+def benchmark_cache():
+    """
+        Reads every one of CACHE_PROFILE_COUNT profiles from the store once,
+        again in the same process (from the cache, must be CACHE_SPEEDUP
+        times quicker), and again after another process has changed one of
+        them (only that one is parsed again, so it must still beat the first).
+    """
+    script = (
+        "import sys, time, subprocess\n"
+        "from creds import store\n"
+        "def timed():\n"
+        "    start = time.perf_counter()\n"
+        "    store.get_all()\n"
+        "    return (time.perf_counter() - start) * 1000\n"
+        "print('first', timed())\n"
+        "print('cached', ' '.join(str(timed()) for _ in range(20)))\n"
+        "changed = []\n"
+        "for i in range(5):\n"
+        "    subprocess.run([sys.executable, '-c', 'from creds import store\\n'\n"
+        "                    'd = dict(store.get(\"%d\"), Description=\"Changed\")\\n'\n"
+        "                    'store.put(d)' % i], check=True)\n"
+        "    changed.append(str(timed()))\n"
+        "print('changed', ' '.join(changed))\n"
+    )
+    home = create_home(CACHE_PROFILE_COUNT)
+    output = run_python(home, script).stdout.decode()
+    medians = {}
+
+    for line in output.splitlines()[-3:]:
+        name, *timings = line.split()
+        timings = [float(t) for t in timings]
+        medians[name] = statistics.median(timings)
+
+    report("get_all, first read (" + str(CACHE_PROFILE_COUNT) + " profiles)", [medians["first"]])
+    report("get_all, cached", [medians["cached"]])
+    report("get_all, after another process changed one profile", [medians["changed"]])
+    return medians["cached"] * CACHE_SPEEDUP < medians["first"] and medians["changed"] < medians["first"]
+
+
+def benchmark_listing():
+    """
+        Lists LISTING_PROFILE_COUNT profiles the way 'ls' and the picker do
+        (summaries read from the store's columns) and as whole profiles, each
+        in a fresh process, timing it and tracing the memory held by the
+        result. The summaries must be the quicker and the smaller of the two.
+    """
+    script = (
+        "import sys, time, tracemalloc\n"
+        "from creds import cred, store\n"
+        "store.get_connection()\n"
+        "select = getattr(cred.Credential, sys.argv[1])\n"
+        "tracemalloc.start()\n"
+        "start = time.perf_counter()\n"
+        "listed = select()\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        "current, peak = tracemalloc.get_traced_memory()\n"
+        "print(elapsed, current / 1024 / 1024, peak / 1024 / 1024)\n"
+    )
+    home = create_home(LISTING_PROFILE_COUNT)
+    results = {}
+
+    for name in ["select_summaries", "select"]:
+        timings = []
+        memory = []
+
+        for _ in range(LISTING_RUNS):
+            elapsed, held, peak = [float(v) for v in run_python(home, script, name).stdout.decode().split()]
+            timings.append(elapsed)
+            memory.append((held, peak))
+
+        results[name] = (statistics.median(timings), memory[-1][0])
+        report(name + " (" + str(LISTING_PROFILE_COUNT) + " profiles)", timings)
+        print("    held: %.1f MB, peak: %.1f MB" % memory[-1])
+
+    return results["select_summaries"][0] < results["select"][0] and \
+        results["select_summaries"][1] < results["select"][1]
+
+
+def benchmark_roles():
+    """
+        Loads a profile with ROLES_COUNT saved roles, then looks roles up by
+        alias, ACCOUNT:NAME and ARN, as 'role assume <ROLE>' does. Once the
+        catalogue is indexed, a lookup must take under ROLES_LOOKUP_BUDGET_MS.
+    """
+    home = create_home(1)
+    script = (
+        "import sys, time\n"
+        "from creds import cred, roles\n"
+        "credential = cred.Credential.from_json('0')\n"
+        "for i in range(int(sys.argv[1])):\n"
+        "    credential.roles.add(roles.Role('arn:aws:iam::%012d:role/Admin' % i, 'account-%d' % i, {'team': str(i % 10)}))\n"
+        "credential.save()\n"
+        "def timed(function):\n"
+        "    start = time.perf_counter()\n"
+        "    function()\n"
+        "    return str((time.perf_counter() - start) * 1000)\n"
+        "print('load', ' '.join(timed(lambda: cred.Credential.from_json('0')) for _ in range(20)))\n"
+        "print('index', ' '.join(timed(lambda: cred.Credential.from_json('0').roles.load()) for _ in range(20)))\n"
+        "references = ['account-%d' % i for i in range(0, int(sys.argv[1]), 7)] + \\\n"
+        "             ['%012d:admin' % i for i in range(3, int(sys.argv[1]), 7)] + \\\n"
+        "             ['arn:aws:iam::%012d:role/Admin' % i for i in range(5, int(sys.argv[1]), 7)]\n"
+        "print('lookup', ' '.join(timed(lambda: credential.roles.find(r)) for r in references))\n"
+    )
+    output = run_python(home, script, str(ROLES_COUNT)).stdout.decode()
+    medians = {}
+
+    for line in output.splitlines()[-3:]:
+        name, *timings = line.split()
+        timings = [float(t) for t in timings]
+        medians[name] = statistics.median(timings)
+
+    report("load a profile with " + str(ROLES_COUNT) + " roles", [medians["load"]])
+    report("load and index its roles", [medians["index"]])
+    report("look up a role", [medians["lookup"]])
+    print("    median: %.1f us" % (medians["lookup"] * 1000))
+    return medians["lookup"] < ROLES_LOOKUP_BUDGET_MS
+
+
+def benchmark_mfa():
+    """
+        Against a stubbed STS (STUB_LATENCY_MS per call), starts an MFA
+        session, then logs in, assumes a role and answers credential_process
+        MFA_LOGINS times each. Only the first command may call
+        GetSessionToken, and every role must be assumed with the session.
+    """
+    script = ("import sys\n"
+              "sys.path.insert(0, " + repr(os.path.dirname(os.path.abspath(__file__))) + ")\n"
+              "import benchmark\n"
+              "benchmark.measure_mfa()\n")
+    home = create_home(1)
+    results = json.loads(run_python(home, script).stdout.decode().splitlines()[-1])
+
+    for name, timings in results["timings"].items():
+        report(name, timings)
+
+    print("    GetSessionToken calls: %d, AssumeRole calls: %d, assumed without the MFA session: %d" % (
+        results["get_session_token"], results["assume_role"], results["without_session"]))
+    return results["get_session_token"] == 1 and results["without_session"] == 0
+
+
+def measure_mfa():
+    """
+        Run in a process of its own whose HOME holds a synthetic profile, see
+        benchmark_mfa(). Prints the timings and STS calls as JSON.
+    """
+    import datetime
+    creds = use_home(os.environ["HOME"])
+    from creds import cli, agent, roles
+    from click.testing import CliRunner
+
+    expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=12)
+    responses = {"sts": {
+        "GetSessionToken": {"Credentials": {"AccessKeyId": "ASIAMFA", "SecretAccessKey": "secret",
+                                            "SessionToken": "mfa", "Expiration": expiration}},
+        "AssumeRole": {"Credentials": {"AccessKeyId": "ASIAROLE", "SecretAccessKey": "secret",
+                                       "SessionToken": "role", "Expiration": expiration},
+                       "AssumedRoleUser": {"AssumedRoleId": "AROA0000000000000000:benchmark",
+                                           "Arn": "arn:aws:sts::123456789012:assumed-role/Admin/benchmark"}}}}
+    calls = {"GetSessionToken": 0, "AssumeRole": 0}
+    without_session = []
+
+    def create_session(my_credential, session=None):
+        stub, _ = create_stubbed_session(responses)
+        stub.events.register("before-call.sts", lambda model, **_: calls.update({model.name: calls[model.name] + 1}))
+        without_session.append(session is None)
+        return stub
+
+    creds.util.create_session = create_session
+    credential = creds.cred.Credential.from_json("0")
+    credential.mfa_serial = "arn:aws:iam::123456789012:mfa/benchmark"
+    credential.roles.add(roles.Role("arn:aws:iam::123456789012:role/Admin", "admin"))
+    credential.save()
+    credential.login()
+    runner = CliRunner()
+    start = time.perf_counter()
+    runner.invoke(cli.mfa, ["123456"])
+    timings = {"mfa <CODE>": [(time.perf_counter() - start) * 1000]}
+    # The first session was created for GetSessionToken itself.
+    without_session.clear()
+
+    def assume():
+        # Dropped, so every run assumes the role rather than reusing its session.
+        creds.cache.RoleSessionCache(credential).clear()
+        runner.invoke(cli.assume_role, ["admin"])
+
+    timings["login <NAME> (cached MFA session)"] = measure(
+        lambda: runner.invoke(cli.login, ["PROFILE-00000", "--no-age-check"]), MFA_LOGINS)
+    timings["role assume <ALIAS> (from the MFA session)"] = measure(assume, MFA_LOGINS)
+    timings["credential-process <NAME>"] = measure(lambda: agent.get_without_agent("PROFILE-00000"), MFA_LOGINS)
+    print(json.dumps({"timings": timings, "get_session_token": calls["GetSessionToken"],
+                      "assume_role": calls["AssumeRole"], "without_session": sum(without_session)}))
+
+
+def benchmark_history():
+    """
+        Fills the login history and every rotated log to their limit (years
+        of logins), then records HISTORY_RECORDS more entries and times
+        reading its tail, the recently used profiles and the previous
+        profile, against reading the whole history. Reading the tail must
+        take under HISTORY_BUDGET_MS, and the logs must stay within their
+        size limit.
+    """
+    home = create_home(1)
+    script = (
+        "import os, sys, json, time\n"
+        "from creds import history, cred\n"
+        "credentials = [cred.Credential('PROFILE-%05d' % i, '', 'AKIA', 's', 'us-east-1', 'json', [], str(i), 'now')\n"
+        "               for i in range(100)]\n"
+        "os.makedirs(os.path.dirname(history.HISTORY_FILE_NAME), exist_ok=True)\n"
+        "for backup in range(history.BACKUP_COUNT, -1, -1):\n"
+        "    with open(history.get_file_name(backup), 'w') as fh:\n"
+        "        size = 0\n"
+        "        while size < history.MAX_SIZE - 200:\n"
+        "            c = credentials[size % 97]\n"
+        "            size += fh.write(json.dumps({'Time': '2020-01-01T00:00:00Z', 'Event': 'login',\n"
+        "                                         'ProfileId': c.id, 'Name': c.name}) + '\\n')\n"
+        "def timed(function):\n"
+        "    start = time.perf_counter()\n"
+        "    function()\n"
+        "    return str((time.perf_counter() - start) * 1000)\n"
+        "print('record', ' '.join(timed(lambda: history.record('login', credentials[i % 100]))\n"
+        "                         for i in range(int(sys.argv[1]))))\n"
+        "print('tail', ' '.join(timed(lambda: history.tail(20)) for _ in range(20)))\n"
+        "print('recent', ' '.join(timed(lambda: history.get_recent_profile_ids(10)) for _ in range(20)))\n"
+        "print('previous', ' '.join(timed(lambda: history.get_previous('99', None)) for _ in range(20)))\n"
+        "print('everything', ' '.join(timed(lambda: list(history.iterate_reversed())) for _ in range(3)))\n"
+        "print('size', sum(os.path.getsize(history.get_file_name(b)) for b in range(history.BACKUP_COUNT + 1)))\n"
+    )
+    output = run_python(home, script, str(HISTORY_RECORDS)).stdout.decode().splitlines()[-6:]
+    timings = {}
+
+    for line in output[:-1]:
+        name, *values = line.split()
+        timings[name] = [float(v) for v in values]
+
+    size = int(output[-1].split()[1])
+    report("record an entry (" + str(HISTORY_RECORDS) + ")", timings["record"])
+    report("history tail of 20", timings["tail"])
+    report("recently used profiles", timings["recent"])
+    report("previous profile (switch -)", timings["previous"])
+    report("read the whole history", timings["everything"])
+    report("cli history", time_command(home, ["history"], 5))
+    print("    history files: %.1f MB" % (size / 1024 / 1024))
+
+    # Imported here so the limits are the ones of the checkout being benchmarked.
+    sys.path.insert(0, REPOSITORY_DIRECTORY)
+    from creds import history
+    return statistics.median(timings["tail"]) < HISTORY_BUDGET_MS and \
+        size <= (history.BACKUP_COUNT + 1) * history.MAX_SIZE
+
+
+def benchmark_prompt():
+    """
+        Logs into a profile, then draws the bash prompt PROMPT_RUNS times
+        with the snippet from 'aws-creds prompt' (with PATH emptied, so any
+        command it ran would fail rather than be forked). Each prompt must
+        take under PROMPT_BUDGET_US, and show the profile.
+    """
+    home = create_home(1)
+    time_command(home, ["login", "PROFILE-00000", "--no-age-check"], 1)
+    snippet = run_python(home, "from creds.entry import main; main()", "prompt", "--shell", "bash").stdout.decode()
+    script = (
+        snippet +
+        "PATH=\n"
+        "start=$EPOCHREALTIME\n"
+        "for ((i = 0; i < " + str(PROMPT_RUNS) + "; i++)); do __aws_creds_prompt; done\n"
+        "end=$EPOCHREALTIME\n"
+        "echo \"$AWS_CREDS_PROMPT\"\n"
+        "echo $(( (${end/./} - ${start/./}) ))\n"
+    )
+    result = subprocess.run(["bash", "--norc", "-c", script], env={"HOME": home}, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, check=True)
+    output = result.stdout.decode().splitlines()
+    per_prompt = int(output[-1]) / PROMPT_RUNS
+    timings = []
+
+    for _ in range(5):
+        start = time.perf_counter()
+        run_python(home, "from creds import cred; print(cred.Credential.get_current().name)")
+        timings.append((time.perf_counter() - start) * 1000)
+
+    report("python Credential.get_current() (for comparison)", timings)
+    print("bash prompt (" + str(PROMPT_RUNS) + " runs)")
+    print("    mean: %.1f us, shows: %s" % (per_prompt, output[-2].strip()))
+    return per_prompt < PROMPT_BUDGET_US and "PROFILE-00000" in output[-2] and len(output) == 2
+
+
+def benchmark_suite(sizes=SUITE_SIZES, save=None, compare=None):
+    """
+        Times the store, CLI and AWS helper paths with each of sizes synthetic
+        profiles (see measure_operations() for what is timed in process), plus
+        cold starts of the CLI. The results are saved as JSON (by default in
+        SUITE_RESULTS_DIRECTORY) so runs can be compared; with compare (an
+        earlier results file), anything more than SUITE_REGRESSION_RATIO
+        times slower than before counts as over budget. The fastest run is
+        compared rather than the median, as it is the least affected by
+        whatever else the machine is doing.
+    """
+    results = {}
+    script = ("import sys\n"
+              "sys.path.insert(0, " + repr(os.path.dirname(os.path.abspath(__file__))) + ")\n"
+              "import benchmark\n"
+              "benchmark.measure_operations()\n")
+
+    for size in sizes:
+        home = create_home(size)
+        output = run_python(home, script).stdout.decode()
+        timings = json.loads(output.splitlines()[-1])
+        timings["cli --help"] = time_command(home, ["--help"], SUITE_COMMAND_RUNS)
+        timings["cli ls"] = time_command(home, ["ls"], SUITE_COMMAND_RUNS)
+        timings["cli login"] = time_command(home, ["login", "PROFILE-%05d" % (size // 2), "--no-age-check"],
+                                            SUITE_COMMAND_RUNS)
+        results[str(size)] = {name: summarise(t) for name, t in timings.items()}
+
+    print_suite(results)
+    file_name = save or os.path.join(SUITE_RESULTS_DIRECTORY, "suite-" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+
+    with open(file_name, "w") as fh:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": get_commit(),
+                   "python": sys.version.split()[0], "platform": sys.platform, "results": results}, fh, indent=4)
+
+    print("Results saved to " + file_name)
+
+    if compare:
+        with open(compare, "r") as fh:
+            return compare_suite(json.load(fh)["results"], results)
+
+    return True
+
+
+def measure_operations():
+    """
+        Run in a process of its own whose HOME holds the synthetic profiles.
+        Times reading every profile, reading one by id and by Access Key,
+        saving and logging into one, loading the defaults, and the STS and
+        IAM lookups behind 'status' against stubbed clients (so only the work
+        aws-creds does itself is timed), then prints the timings as JSON.
+    """
+    creds = use_home(os.environ["HOME"])
+    cred = creds.cred.Credential
+    util = creds.util
+    from creds import defaults
+
+    middle = cred.get_all()[len(cred.get_all()) // 2]
+    responses = get_status_responses()
+
+    def stub_aws():
+        util.reset_session()
+        util._session = create_stubbed_session(responses, 0)[0]
+
+    timings = {
+        "get_all": measure(cred.get_all),
+        "from_json": measure(lambda: cred.from_json(middle.id)),
+        "get_by_access_key": measure(lambda: cred.get_by_access_key(middle.access_key)),
+        "save": measure(middle.save),
+        "login": measure(middle.login),
+        "defaults load": measure(defaults.DefaultConfiguration),
+        "status": measure(lambda: util.get_status_details(refresh=True), setup=stub_aws)
+    }
+
+    print(json.dumps(timings))
+
+
+def measure(function, runs=SUITE_RUNS, setup=None):
+    """Returns the time (in ms) of each of runs calls to function, after one call to warm up."""
+    timings = []
+
+    for run in range(runs + 1):
+        if setup:
+            setup()
+
+        start = time.perf_counter()
+        function()
+
+        if run:
+            timings.append((time.perf_counter() - start) * 1000)
+
+    return timings
+
+
+def summarise(timings):
+    return {"median": statistics.median(timings), "min": min(timings), "max": max(timings), "runs": len(timings)}
+
+
+def print_suite(results):
+    sizes = list(results.keys())
+    print("%-20s" % "median (ms)" + "".join("%16s" % (size + " profiles") for size in sizes))
+
+    for name in results[sizes[0]]:
+        print("%-20s" % name + "".join("%16.2f" % results[size][name]["median"] for size in sizes))
+
+
+def compare_suite(previous, results):
+    regressions = []
+
+    for size, timings in results.items():
+        for name, timing in timings.items():
+            before = previous.get(size, {}).get(name)
+
+            if before and timing["min"] > before["min"] * SUITE_REGRESSION_RATIO and \
+                    timing["min"] - before["min"] > SUITE_NOISE_MS:
+                regressions.append("%s with %s profiles: %.2f ms, was %.2f ms (fastest run)" % (
+                    name, size, timing["min"], before["min"]))
+
+    for regression in regressions:
+        print("    slower: " + regression)
+
+    return not regressions
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPOSITORY_DIRECTORY, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(name, timings):
+    print(name)
+    print("    median: %.1f ms, min: %.1f ms, max: %.1f ms" % (
+        statistics.median(timings), min(timings), max(timings)))
+
+
+BENCHMARKS = {
+    "login": benchmark_login,
+    "startup": benchmark_startup,
+    "status": benchmark_status,
+    "import": benchmark_import,
+    "stress": benchmark_stress,
+    "agent": benchmark_agent,
+    "each": benchmark_each,
+    "rotate": benchmark_rotate,
+    "picker": benchmark_picker,
+    "filter": benchmark_filter,
+    "encrypt": benchmark_encrypt,
+    "cache": benchmark_cache,
+    "listing": benchmark_listing,
+    "roles": benchmark_roles,
+    "mfa": benchmark_mfa,
+    "history": benchmark_history,
+    "prompt": benchmark_prompt,
+    "suite": benchmark_suite
+}
+
+
+def run_separately(name, suite_options):
+    """
+        Runs the benchmark called name in a process of its own, as use_home()
+        only works once per process. Returns whether it was within budget.
+    """
+    command = [sys.executable, os.path.abspath(__file__), name]
+
+    if name == "suite":
+        command += ["--sizes", ",".join(str(size) for size in suite_options["sizes"])]
+        command += [a for option in ["save", "compare"] if suite_options[option]
+                    for a in ["--" + option, suite_options[option]]]
+
+    sys.stdout.flush()
+    return subprocess.run(command).returncode == 0
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmarks for aws-creds.")
+    parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK", help=", ".join(BENCHMARKS.keys()))
+    parser.add_argument("--sizes", default=SUITE_SIZES, type=lambda v: [int(s) for s in v.split(",")],
+                        help="suite: the numbers of profiles to time with (default: %(default)s).")
+    parser.add_argument("--save", help="suite: the file to save the results to (default: .benchmarks/suite-<TIME>.json).")
+    parser.add_argument("--compare", help="suite: an earlier results file, slower results are over budget.")
+    arguments = parser.parse_args()
+
+    for name in arguments.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("there is no benchmark called '" + name + "'")
+
+    selected = arguments.benchmarks or list(BENCHMARKS.keys())
+    suite_options = {"sizes": arguments.sizes, "save": arguments.save, "compare": arguments.compare}
+
+    if len(selected) == 1:
+        failed = [name for name in selected if not BENCHMARKS[name](**(suite_options if name == "suite" else {}))]
+    else:
+        failed = [name for name in selected if not run_separately(name, suite_options)]
+
+    if failed:
+        print("Over budget: " + ", ".join(failed))
+        sys.exit(1)
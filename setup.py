@@ -25,13 +25,17 @@ setuptools.setup(
     ],
     entry_points = {
         'console_scripts': [
-            'aws-creds=creds.main:main'
+            'aws-creds=creds.entry:main'
         ]
     },
     install_requires = [
         "boto3",
-        "click"
+        "click",
+        "cryptography"
     ],
+    extras_require = {
+        "keyring": ["keyring"]
+    },
     py_modules = [
         "creds.cli",
         "creds.cred"
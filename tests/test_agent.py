@@ -0,0 +1,49 @@
+from creds import agent, cred, crypto, roles, vault
+from conftest import get_credentials_response
+
+ROLE_ARN = "arn:aws:iam::123456789012:role/Admin"
+
+
+def test_role_sessions_are_kept_by_the_agent(credential, sts):
+    credential.roles.add(roles.Role(ROLE_ARN, "admin"))
+    credential.save()
+    sts.add_response("assume_role", get_credentials_response("ASIAROLEONE00000"))
+    credential_agent = agent.CredentialAgent()
+
+    first = credential_agent.handle('{"profile": "test-one", "role": "admin"}')
+    # Nothing else is queued on the stub, so calling STS again would fail.
+    second = credential_agent.handle('{"profile": "test-one", "role": "' + ROLE_ARN + '"}')
+
+    assert first["AccessKeyId"] == "ASIAROLEONE00000"
+    assert second == first
+
+
+def test_roles_not_saved_in_the_profile_are_refused(credential, sts):
+    credential_agent = agent.CredentialAgent()
+
+    output = credential_agent.handle('{"profile": "test-one", "role": "arn:aws:iam::999999999999:role/Other"}')
+
+    assert output == {"Error": agent.get_role_not_saved_message("test-one", "arn:aws:iam::999999999999:role/Other")}
+
+
+def test_roles_not_saved_in_the_profile_are_refused_without_the_agent(credential, sts, capsys):
+    exit_code = agent.credential_process("test-one", "arn:aws:iam::999999999999:role/Other")
+
+    assert exit_code == 1
+    assert "There is no role 'arn:aws:iam::999999999999:role/Other' saved in 'test-one'" in capsys.readouterr().err
+
+
+def test_secrets_that_cant_be_decrypted_are_reported_without_the_agent(credential, monkeypatch, capsys):
+    def decrypt(ciphertext, profile_id):
+        raise crypto.DecryptionError()
+
+    # As loaded from an encrypted store, only decrypted once it is used.
+    credential._secret_key = None
+    credential.encrypted_secret_key = "corrupted"
+    monkeypatch.setattr(vault, "decrypt", decrypt)
+    monkeypatch.setattr(cred.Credential, "get_by_name_or_id", staticmethod(lambda profile: credential))
+
+    exit_code = agent.credential_process("test-one")
+
+    assert exit_code == 1
+    assert capsys.readouterr().err.strip() == crypto.DecryptionError().message
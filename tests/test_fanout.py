@@ -0,0 +1,41 @@
+import threading
+from creds import cred, fanout
+
+
+def get_credentials(count):
+    return [cred.Credential("account-%d" % i, "", "AKIAACCOUNT%09d" % i, "secret", "us-east-1", "json")
+            for i in range(count)]
+
+
+def test_clients_are_created_before_fanning_out(monkeypatch):
+    created = []
+
+    def create_client(self, service_name, my_credential, **kwargs):
+        created.append((service_name, my_credential.name, threading.current_thread()))
+        return service_name + " client for " + my_credential.name
+
+    monkeypatch.setattr(fanout.SessionFactory, "create_client", create_client)
+
+    results, failures = fanout.run_callable(get_credentials(20), lambda session, c: session.client("sts"),
+                                            workers=4, services=["sts"])
+
+    assert failures == {}
+    assert results == {"ACCOUNT-%d" % i: "sts client for ACCOUNT-%d" % i for i in range(20)}
+    assert len(created) == 20
+    assert all(thread is threading.current_thread() for _, _, thread in created)
+
+
+def test_accounts_whose_clients_cannot_be_created_fail_alone(monkeypatch):
+    def create_client(self, service_name, my_credential, **kwargs):
+        if my_credential.name == "ACCOUNT-1":
+            raise ValueError("Invalid endpoint")
+
+        return service_name
+
+    monkeypatch.setattr(fanout.SessionFactory, "create_client", create_client)
+
+    results, failures = fanout.run_callable(get_credentials(3), lambda session, c: session.client("sts"),
+                                            workers=2, services=["sts"])
+
+    assert sorted(results) == ["ACCOUNT-0", "ACCOUNT-2"]
+    assert isinstance(failures["ACCOUNT-1"], ValueError)
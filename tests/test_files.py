@@ -0,0 +1,124 @@
+import os
+import sys
+import stat
+import subprocess
+import pytest
+from creds import cred, files, roles
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STRESS_PROCESSES = 4
+STRESS_SWITCHES = 25
+SESSION = {"AccessKeyId": "ASIATESTSESSION", "SecretAccessKey": "secret", "SessionToken": "token"}
+
+SWITCH_SCRIPT = (
+    "import sys, random\n"
+    "from creds import cred\n"
+    "credentials = cred.Credential.get_all()\n"
+    "session = " + repr(SESSION) + "\n"
+    "for i in range(int(sys.argv[1])):\n"
+    "    c = random.choice(credentials)\n"
+    "    c.login() if i % 2 else c.assume_role(next(iter(c.roles)).arn, session)\n"
+)
+
+
+@pytest.fixture
+def file_names(home):
+    directory = os.path.join(home, ".aws", "files")
+    os.makedirs(directory)
+    return [os.path.join(directory, name) for name in ["one", "two", "three"]]
+
+
+def read(file_name):
+    with open(file_name, "r") as fh:
+        return fh.read()
+
+
+def get_left_behind(directory):
+    return [f for f in os.listdir(directory) if f.endswith(".tmp") or f.endswith(".bak")]
+
+
+def test_every_file_is_written(file_names):
+    files.write(file_names[0], "old")
+    os.chmod(file_names[0], 0o640)
+
+    files.write_all({file_names[0]: "one", file_names[1]: "two"})
+
+    assert [read(f) for f in file_names[:2]] == ["one", "two"]
+    # New files are only readable by their owner, replaced ones keep their permissions.
+    assert stat.S_IMODE(os.stat(file_names[0]).st_mode) == 0o640
+    assert stat.S_IMODE(os.stat(file_names[1]).st_mode) == 0o600
+    assert get_left_behind(os.path.dirname(file_names[0])) == []
+
+
+def test_a_failed_rename_puts_back_the_files_already_replaced(file_names, monkeypatch):
+    files.write_all({file_names[0]: "old one", file_names[1]: "old two"})
+    replace = os.replace
+
+    def fail_on_the_last_file(source, destination):
+        if destination == file_names[2]:
+            raise OSError("No space left on device")
+
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", fail_on_the_last_file)
+
+    with pytest.raises(OSError):
+        files.write_all({file_names[0]: "new one", file_names[1]: "new two", file_names[2]: "new three"})
+
+    assert read(file_names[0]) == "old one"
+    assert read(file_names[1]) == "old two"
+    assert not os.path.exists(file_names[2])
+    assert get_left_behind(os.path.dirname(file_names[0])) == []
+
+
+def test_a_failed_write_changes_nothing(file_names):
+    files.write(file_names[0], "old one")
+
+    with pytest.raises(TypeError):
+        files.write_all({file_names[0]: "new one", file_names[1]: None})
+
+    assert read(file_names[0]) == "old one"
+    assert not os.path.exists(file_names[1])
+    assert get_left_behind(os.path.dirname(file_names[0])) == []
+
+
+def test_the_lock_can_be_taken_again(file_names):
+    with files.lock():
+        with files.lock():
+            files.write(file_names[0], "one")
+
+        files.remove(file_names[0])
+
+    assert not os.path.exists(file_names[0])
+    assert files._lock_file is None
+
+
+def test_concurrent_switches_leave_whole_files():
+    expected = {cred.Credential.AWS_CREDENTIAL_FILE_NAME: [], cred.Credential.AWS_CONFIG_FILE_NAME: []}
+
+    for i in range(4):
+        role_arn = "arn:aws:iam::123456789012:role/Role" + str(i)
+        my_credential = cred.Credential("profile-" + str(i), "", "AKIA" + str(i).zfill(16), "secret", "us-east-1", "json")
+        my_credential.roles.add(roles.Role(role_arn))
+        my_credential.save()
+        my_credential.login()
+        expected[cred.Credential.AWS_CREDENTIAL_FILE_NAME] += [read(cred.Credential.AWS_CREDENTIAL_FILE_NAME)]
+        expected[cred.Credential.AWS_CONFIG_FILE_NAME] += [read(cred.Credential.AWS_CONFIG_FILE_NAME)]
+        my_credential.assume_role(role_arn, SESSION)
+        expected[cred.Credential.AWS_CREDENTIAL_FILE_NAME] += [read(cred.Credential.AWS_CREDENTIAL_FILE_NAME)]
+
+    environment = dict(os.environ, PYTHONPATH=REPOSITORY_DIRECTORY)
+    processes = [subprocess.Popen([sys.executable, "-c", SWITCH_SCRIPT, str(STRESS_SWITCHES)], env=environment)
+                 for _ in range(STRESS_PROCESSES)]
+    bad_reads = []
+
+    while any(p.poll() is None for p in processes):
+        for file_name, contents in expected.items():
+            read_contents = read(file_name)
+
+            if read_contents not in contents:
+                bad_reads.append(read_contents)
+
+    assert [p.returncode for p in processes] == [0] * STRESS_PROCESSES
+    assert bad_reads == []
+    assert get_left_behind(os.path.dirname(cred.Credential.AWS_CREDENTIAL_FILE_NAME)) == []
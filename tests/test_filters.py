@@ -0,0 +1,71 @@
+import pytest
+from click.testing import CliRunner
+from creds import cli, cred
+
+PROFILES = [
+    ("prod-payments", {"env": "prod", "team": "payments"}),
+    ("prod-data", {"env": "prod", "team": "data"}),
+    ("dev-payments", {"env": "dev", "team": "payments"}),
+    ("sandbox", {})
+]
+
+
+@pytest.fixture
+def credentials():
+    my_credentials = {}
+
+    for i, (name, tags) in enumerate(PROFILES):
+        my_credentials[name] = cred.Credential(name, "", "AKIA" + str(i).zfill(16), "secret", "us-east-1", "json",
+                                               tags=tags)
+        my_credentials[name].save()
+
+    return my_credentials
+
+
+def select(*expressions):
+    names = [c.name for c in cred.Credential.select(list(expressions))]
+    # Reading only the indexed columns has to find the same profiles.
+    assert [s.name for s in cred.Credential.select_summaries(list(expressions))] == names
+    return names
+
+
+def test_tags_and_patterns_all_have_to_match(credentials):
+    assert select() == ["DEV-PAYMENTS", "PROD-DATA", "PROD-PAYMENTS", "SANDBOX"]
+    assert select("env=prod") == ["PROD-DATA", "PROD-PAYMENTS"]
+    assert select("env=prod", "team=payments") == ["PROD-PAYMENTS"]
+    assert select("team=payments", "dev-*") == ["DEV-PAYMENTS"]
+    assert select("*-data", "sandbox") == ["PROD-DATA", "SANDBOX"]
+    assert select(credentials["sandbox"].id) == ["SANDBOX"]
+    assert select("env=staging") == []
+
+
+def test_changed_tags_are_filtered_on(credentials):
+    credentials["sandbox"].tags = {"env": "prod"}
+    credentials["sandbox"].save()
+    credentials["prod-data"].tags = {"env": "dev", "team": "data"}
+    credentials["prod-data"].save()
+
+    assert select("env=prod") == ["PROD-PAYMENTS", "SANDBOX"]
+    assert select("env=dev") == ["DEV-PAYMENTS", "PROD-DATA"]
+
+
+def test_removed_profiles_are_not_found_by_their_tags(credentials):
+    credentials["prod-payments"].remove()
+
+    assert select("team=payments") == ["DEV-PAYMENTS"]
+    assert cred.Credential.get_tags() == {"env": {"dev": 1, "prod": 1}, "team": {"data": 1, "payments": 1}}
+
+
+def test_ls_filters_profiles(credentials):
+    result = CliRunner().invoke(cli.ls, ["env=prod", "team=data"])
+
+    assert result.exit_code == 0, result.output
+    assert "PROD-DATA" in result.output
+    assert "PROD-PAYMENTS" not in result.output
+
+
+def test_tags_lists_the_tags_in_use(credentials):
+    result = CliRunner().invoke(cli.tags)
+
+    assert result.exit_code == 0, result.output
+    assert result.output.split() == ["env", "dev", "(1)", "prod", "(2)", "team", "data", "(1)", "payments", "(2)"]
@@ -0,0 +1,193 @@
+import re
+import time
+import sqlite3
+import datetime
+import threading
+import pytest
+from urllib.parse import parse_qs
+from creds import cred, fanout, fleet, util
+
+THROTTLED = (b"<ErrorResponse><Error><Type>Sender</Type><Code>Throttling</Code><Message>Rate exceeded</Message>"
+             b"</Error><RequestId>1</RequestId></ErrorResponse>")
+
+
+class RawResponse():
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **_):
+        yield self.body
+
+
+class FakeIam():
+    """
+        Plays IAM (behind botocore, so its retries still happen) for one user
+        per profile, each with a single Access Key created 100 days ago.
+        Requests for the actions in throttle are throttled that many times.
+    """
+    def __init__(self, credentials, throttle=None):
+        self.lock = threading.Lock()
+        self.users = {c.access_key: "user-" + c.name for c in credentials}
+        self.keys = {"user-" + c.name: [c.access_key] for c in credentials}
+        self.created = {c.access_key: datetime.datetime.utcnow() - datetime.timedelta(days=100) for c in credentials}
+        self.throttle = dict(throttle or {})
+        self.actions = []
+
+    def respond(self, request, **_):
+        from botocore.awsrequest import AWSResponse
+
+        access_key = re.search(r"Credential=([^/]+)/", request.headers["Authorization"].decode()).group(1)
+        body = {k: v[0] for k, v in parse_qs(request.body.decode() if isinstance(request.body, bytes) else request.body).items()}
+        action = body["Action"]
+
+        with self.lock:
+            self.actions.append(action)
+
+            if self.throttle.get(action):
+                self.throttle[action] -= 1
+                return AWSResponse(request.url, 400, {}, RawResponse(THROTTLED))
+
+            user = self.users[access_key]
+
+            if action == "ListAccessKeys":
+                result = "<AccessKeyMetadata>%s</AccessKeyMetadata><IsTruncated>false</IsTruncated>" % "".join(
+                    "<member><UserName>%s</UserName><AccessKeyId>%s</AccessKeyId><Status>Active</Status>"
+                    "<CreateDate>%s</CreateDate></member>" % (user, k, self.created[k].isoformat() + "Z")
+                    for k in self.keys[user])
+            elif action == "CreateAccessKey":
+                new_access_key = "AKIANEWKEY%010d" % len(self.created)
+                self.users[new_access_key] = user
+                self.created[new_access_key] = datetime.datetime.utcnow()
+                self.keys[user].append(new_access_key)
+                result = ("<AccessKey><UserName>%s</UserName><AccessKeyId>%s</AccessKeyId><Status>Active</Status>"
+                          "<SecretAccessKey>new-secret</SecretAccessKey><CreateDate>%s</CreateDate></AccessKey>"
+                          % (user, new_access_key, self.created[new_access_key].isoformat() + "Z"))
+            else:
+                self.keys[user].remove(body["AccessKeyId"])
+                result = ""
+
+        return AWSResponse(request.url, 200, {}, RawResponse(
+            ("<%sResponse><%sResult>%s</%sResult><ResponseMetadata><RequestId>1</RequestId></ResponseMetadata>"
+             "</%sResponse>" % (action, action, result, action, action)).encode()))
+
+
+@pytest.fixture
+def credentials():
+    my_credentials = [cred.Credential("fleet-%d" % i, "", "AKIAFLEETACCESSKEY%02d" % i, "secret", "us-east-1", "json")
+                      for i in range(3)]
+
+    for my_credential in my_credentials:
+        my_credential.save()
+
+    return my_credentials
+
+
+@pytest.fixture
+def no_waiting(monkeypatch):
+    """
+        Records the time botocore would back off for between retries rather
+        than waiting, and turns off the client side rate limiting of its
+        adaptive retries, which would wait as well.
+    """
+    from botocore.retries import bucket
+
+    waits = []
+    monkeypatch.setattr(time, "sleep", waits.append)
+    monkeypatch.setattr(bucket.TokenBucket, "acquire", lambda self, amount=1, block=True: True)
+    return waits
+
+
+def create_fleet(iam):
+    factory = fanout.SessionFactory()
+    factory.get_session().events.register("before-send.iam", iam.respond)
+    return fleet.Fleet(workers=2, calls_per_second=1000, factory=factory)
+
+
+def test_rotate_saves_new_keys_before_deleting_the_old_ones(credentials):
+    iam = FakeIam(credentials)
+    credentials[0].login()
+
+    rotated, skipped, failures = create_fleet(iam).rotate(credentials)
+
+    assert failures == {}
+    assert skipped == []
+    assert sorted(rotated) == sorted(c.id for c in credentials)
+
+    for my_credential in credentials:
+        saved = cred.Credential.from_json(my_credential.id)
+        assert saved.access_key == rotated[my_credential.id]
+        assert saved.secret_key == "new-secret"
+        assert iam.keys["user-" + my_credential.name] == [saved.access_key]
+
+    assert cred.Credential.get_current().access_key == rotated[credentials[0].id]
+
+
+def test_rotate_skips_new_keys(credentials):
+    iam = FakeIam(credentials)
+    iam.created[credentials[1].access_key] = datetime.datetime.utcnow()
+
+    rotated, skipped, failures = create_fleet(iam).rotate(credentials, older_than=90)
+
+    assert skipped == [credentials[1].id]
+    assert sorted(rotated) == sorted([credentials[0].id, credentials[2].id])
+
+
+def test_throttled_calls_are_retried(credentials, no_waiting):
+    iam = FakeIam(credentials, {"ListAccessKeys": 2, "CreateAccessKey": 1, "DeleteAccessKey": 1})
+
+    rotated, _, failures = create_fleet(iam).rotate(credentials)
+
+    assert failures == {}
+    assert len(rotated) == 3
+    assert len(no_waiting) == 4
+    assert iam.actions.count("ListAccessKeys") == 5
+    assert iam.actions.count("CreateAccessKey") == 4
+    assert iam.actions.count("DeleteAccessKey") == 4
+    assert all(len(keys) == 1 for keys in iam.keys.values())
+
+
+def test_throttling_that_outlasts_the_retries_fails_the_profile(credentials, no_waiting):
+    # MAX_ATTEMPTS is the number of retries, after the first attempt.
+    iam = FakeIam(credentials[:1], {"ListAccessKeys": fleet.MAX_ATTEMPTS + 1})
+
+    rotated, _, failures = create_fleet(iam).rotate(credentials[:1])
+
+    assert rotated == {}
+    assert "Throttling" in str(failures[credentials[0].id])
+    assert iam.actions.count("ListAccessKeys") == fleet.MAX_ATTEMPTS + 1
+    assert iam.keys["user-FLEET-0"] == [credentials[0].access_key]
+
+
+def test_keys_that_cannot_be_saved_fail_that_profile_alone(credentials, monkeypatch):
+    iam = FakeIam(credentials)
+    save = cred.Credential.save
+
+    def save_unless_locked(self, *args, **kwargs):
+        if self.name == "FLEET-1":
+            raise sqlite3.OperationalError("database is locked")
+
+        return save(self, *args, **kwargs)
+
+    monkeypatch.setattr(cred.Credential, "save", save_unless_locked)
+
+    rotated, _, failures = create_fleet(iam).rotate(credentials)
+
+    assert sorted(rotated) == sorted([credentials[0].id, credentials[2].id])
+    assert isinstance(failures[credentials[1].id], fleet.NewAccessKeyNotSavedError)
+    assert credentials[1].access_key == "AKIAFLEETACCESSKEY01"
+    assert cred.Credential.from_json(credentials[1].id).access_key == "AKIAFLEETACCESSKEY01"
+    # The old key is kept, so the profile still works.
+    assert "AKIAFLEETACCESSKEY01" in iam.keys["user-FLEET-1"]
+
+
+def test_users_without_a_free_key_slot_are_not_rotated(credentials):
+    iam = FakeIam(credentials)
+    iam.keys["user-FLEET-2"].append("AKIASECONDKEY0000000")
+    iam.users["AKIASECONDKEY0000000"] = "user-FLEET-2"
+    iam.created["AKIASECONDKEY0000000"] = datetime.datetime.utcnow()
+
+    rotated, _, failures = create_fleet(iam).rotate(credentials)
+
+    assert list(failures) == [credentials[2].id]
+    assert isinstance(failures[credentials[2].id], util.TooManyAccessKeysError)
+    assert credentials[2].id not in rotated
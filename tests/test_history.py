@@ -0,0 +1,101 @@
+import os
+import pytest
+from click.testing import CliRunner
+from creds import cli, cred, history
+
+
+@pytest.fixture
+def credentials():
+    my_credentials = [cred.Credential(name, "", "AKIA" + str(i).zfill(16), "secret", "us-east-1", "json")
+                      for i, name in enumerate(["one", "two", "three"])]
+
+    for my_credential in my_credentials:
+        my_credential.save()
+
+    return my_credentials
+
+
+def get_current_name():
+    return cred.Credential.get_current().name
+
+
+def test_tail_returns_the_last_entries_oldest_first(credentials):
+    for i in range(5):
+        history.record("login", credentials[i % 2], Number=i)
+
+    assert [e["Number"] for e in history.tail(3)] == [2, 3, 4]
+    assert [e["Number"] for e in history.tail(10, credentials[1].id)] == [1, 3]
+
+
+def test_entries_are_read_backwards_across_blocks(credentials, monkeypatch):
+    monkeypatch.setattr(history, "BLOCK_SIZE", 64)
+
+    for i in range(50):
+        history.record("login", credentials[0], Number=i, Padding="x" * (i % 7) * 20)
+
+    with open(history.HISTORY_FILE_NAME, "a") as fh:
+        fh.write('{"Half": "writt')
+
+    assert [e["Number"] for e in history.iterate_reversed()] == list(range(49, -1, -1))
+
+
+def test_log_is_rotated_once_it_reaches_the_maximum_size(credentials):
+    padding = "x" * 1000
+    count = 0
+
+    while not os.path.exists(history.get_file_name(1)):
+        history.record("login", credentials[0], Number=count, Padding=padding)
+        count += 1
+
+    history.record("login", credentials[0], Number=count, Padding=padding)
+
+    assert os.path.getsize(history.get_file_name(1)) <= history.MAX_SIZE == 1024 * 1024
+    assert os.path.getsize(history.get_file_name(1)) > history.MAX_SIZE - 1100
+    assert [e["Number"] for e in history.iterate_reversed()] == list(range(count, -1, -1))
+
+
+def test_only_so_many_rotated_logs_are_kept(credentials, monkeypatch):
+    monkeypatch.setattr(history, "MAX_SIZE", 1024)
+
+    for i in range(100):
+        history.record("login", credentials[0], Number=i)
+
+    assert os.path.exists(history.get_file_name(history.BACKUP_COUNT))
+    assert not os.path.exists(history.get_file_name(history.BACKUP_COUNT + 1))
+
+    numbers = [e["Number"] for e in history.iterate_reversed()]
+    assert numbers == list(range(99, 99 - len(numbers), -1))
+
+
+def test_recent_profiles_are_the_last_switched_to(credentials):
+    history.record("login", credentials[0])
+    history.record("login", credentials[1])
+    history.record("rotate", credentials[2])
+    history.record("login", credentials[0])
+
+    assert history.get_recent_profile_ids(5) == [credentials[0].id, credentials[1].id]
+
+
+def test_switch_back_to_the_previous_profile(credentials):
+    runner = CliRunner()
+    runner.invoke(cli.switch, ["one"])
+    runner.invoke(cli.switch, ["two"])
+
+    result = runner.invoke(cli.switch, ["-"])
+
+    assert result.exit_code == 0, result.output
+    assert "Switched to 'ONE'." in result.output
+    assert get_current_name() == "ONE"
+
+    runner.invoke(cli.switch, ["-"])
+
+    assert get_current_name() == "TWO"
+
+
+def test_switch_back_without_a_previous_profile(credentials):
+    CliRunner().invoke(cli.switch, ["one"])
+
+    result = CliRunner().invoke(cli.switch, ["-"])
+
+    assert result.exit_code == 1
+    assert "there is no previous profile" in result.output
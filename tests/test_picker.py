@@ -0,0 +1,82 @@
+import random
+import click
+import pytest
+from click.testing import CliRunner
+from creds import cred, picker
+
+
+def create_credentials(*names_and_descriptions):
+    return [cred.Credential(name, description, "AKIA" + str(i).zfill(16), "secret", "us-east-1", "json")
+            for i, (name, description) in enumerate(names_and_descriptions)]
+
+
+def search(index, query, limit=None):
+    matches, total = index.search(query, limit)
+    return [c.name for c in matches], total
+
+
+def test_matches_are_ranked():
+    index = picker.SearchIndex(create_credentials(
+        ("zeta-prod", "Payments"),
+        ("prod-eu", "Europe"),
+        ("staging", "Copy of prod"),
+        ("p-r-o-d", "Spaced out"),
+        ("dorp", "Backwards"),
+        ("dev", "Nothing in common")
+    ))
+
+    assert search(index, "prod") == (["PROD-EU", "ZETA-PROD", "STAGING", "P-R-O-D", "DORP"], 5)
+
+
+def test_limit_keeps_the_best_and_counts_them_all():
+    index = picker.SearchIndex(create_credentials(("prod-a", ""), ("prod-b", ""), ("old-prod", ""), ("dev", "")))
+
+    assert search(index, "prod", 2) == (["PROD-A", "PROD-B"], 3)
+    assert search(index, "", 2) == (["DEV", "OLD-PROD"], 4)
+
+
+def test_recent_profiles_come_first_when_they_match():
+    credentials = create_credentials(("prod-a", ""), ("prod-b", ""), ("dev", ""))
+    index = picker.SearchIndex(credentials, recent_ids=[credentials[2].id, credentials[1].id])
+
+    assert search(index, "prod") == (["PROD-B", "PROD-A"], 2)
+    assert search(index, "") == (["DEV", "PROD-B", "PROD-A"], 3)
+
+
+def test_bitsets_agree_with_checking_every_profile():
+    generator = random.Random(7)
+    words = ["prod", "dev", "payments", "eu", "us", "data", "ml", "web", "ops", "audit"]
+    credentials = create_credentials(*[("-".join(generator.sample(words, 2)) + "-" + str(i), generator.choice(words))
+                                       for i in range(300)])
+    index = picker.SearchIndex(credentials)
+
+    for query in ["prod", "eu-", "zz", "a", "mlw", "audit-d", "7", "payments us"]:
+        expected = {c.name for c in credentials
+                    if set(query) <= set(c.name.lower() + " " + c.description.lower())}
+        matches, total = index.search(query)
+
+        assert {c.name for c in matches} == expected
+        assert total == len(expected)
+
+
+def test_iterate_bits():
+    assert list(picker.iterate_bits(0)) == []
+    assert list(picker.iterate_bits(0b1011)) == [0, 1, 3]
+    assert list(picker.iterate_bits(1 << 200 | 1)) == [0, 200]
+
+
+def pick(credentials, query, input=None):
+    with CliRunner().isolation(input=input):
+        return picker.pick(credentials, "Profile", query)
+
+
+def test_pick_by_query():
+    credentials = create_credentials(("prod", ""), ("prod-eu", ""), ("dev", ""))
+
+    assert pick(credentials, "prod").name == "PROD"
+    assert pick(credentials, credentials[2].id).name == "DEV"
+    assert pick(credentials, "eu").name == "PROD-EU"
+    assert pick(credentials, "pro", input="2\n").name == "PROD-EU"
+
+    with pytest.raises(click.Abort):
+        pick(credentials, "nothing")
@@ -0,0 +1,83 @@
+import os
+import shutil
+import datetime
+import subprocess
+import pytest
+from click.testing import CliRunner
+from creds import cache, cli, cred, prompt, roles
+
+ROLE_ARN = "arn:aws:iam::210987654321:role/Admin"
+
+
+def get_create_date(days_old):
+    return str((datetime.datetime.utcnow() - datetime.timedelta(days=days_old)).replace(microsecond=0))
+
+
+def read_prompt_file():
+    with open(prompt.PROMPT_FILE_NAME, "r") as fh:
+        return fh.read()
+
+
+def test_unknown_fields_are_dashes(credential):
+    assert prompt.get_contents(credential) == "TEST-ONE\t-\t-\t-\n"
+
+
+@pytest.mark.parametrize("days_old, colour", [(10, "green"), (55, "yellow"), (90, "red")])
+def test_cached_details_are_used_even_once_expired(credential, days_old, colour):
+    profile_cache = cache.ProfileCache(credential)
+    profile_cache.set("account_details", {"account": "123456789012"}, -1)
+    profile_cache.set("access_key_create_date", get_create_date(days_old), -1)
+
+    assert prompt.get_contents(credential) == "TEST-ONE\t123456789012\t" + colour + "\t-\n"
+
+
+def test_assumed_roles_show_their_account_and_alias(credential):
+    credential.roles.add(roles.Role(ROLE_ARN, "admin"))
+
+    assert prompt.get_contents(credential, ROLE_ARN) == "TEST-ONE\t210987654321\t-\tadmin\n"
+
+
+def test_fields_stay_on_one_line(credential):
+    credential.name = "TEST\tONE\n"
+
+    assert prompt.get_contents(credential) == "TEST ONE \t-\t-\t-\n"
+
+
+def test_login_writes_and_logout_removes_the_prompt_file(credential):
+    credential.login()
+
+    assert read_prompt_file() == "TEST-ONE\t-\t-\t-\n"
+
+    cache.ProfileCache(credential).set("account_details", {"account": "123456789012"}, 60)
+    credential.update_prompt()
+
+    assert read_prompt_file() == "TEST-ONE\t123456789012\t-\t-\n"
+
+    cred.Credential.logout()
+
+    assert not os.path.exists(prompt.PROMPT_FILE_NAME)
+
+
+@pytest.mark.parametrize("shell", prompt.SHELLS)
+def test_snippets_read_the_prompt_file(shell):
+    result = CliRunner().invoke(cli.prompt_snippet, ["--shell", shell])
+
+    assert result.exit_code == 0, result.output
+    assert prompt.PROMPT_FILE_NAME in result.output
+    assert "{file}" not in result.output
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="bash isn't installed")
+def test_bash_snippet_draws_the_prompt(credential):
+    credential.roles.add(roles.Role(ROLE_ARN, "admin"))
+    cache.ProfileCache(credential).set("access_key_create_date", get_create_date(90), 60)
+    os.makedirs(os.path.dirname(prompt.PROMPT_FILE_NAME), exist_ok=True)
+
+    with open(prompt.PROMPT_FILE_NAME, "w") as fh:
+        fh.write(prompt.get_contents(credential, ROLE_ARN))
+
+    script = prompt.get_snippet("bash") + '\n__aws_creds_prompt\nprintf "%s" "$AWS_CREDS_PROMPT"\n'
+    output = subprocess.run(["bash", "--norc", "--noprofile", "-c", script], stdout=subprocess.PIPE,
+                            check=True).stdout.decode()
+
+    assert output == "[\001\033[31m\002TEST-ONE@210987654321 (admin)\001\033[0m\002] "
@@ -0,0 +1,103 @@
+import io
+import pytest
+from creds import cred, roles
+
+ADMIN_ARN = "arn:aws:iam::123456789012:role/Admin"
+READ_ONLY_ARN = "arn:aws:iam::123456789012:role/path/to/ReadOnly"
+OTHER_ADMIN_ARN = "arn:aws:iam::210987654321:role/Admin"
+
+
+def create_catalogue():
+    return roles.RoleCatalogue([
+        {"Arn": ADMIN_ARN, "Alias": "Admin-Prod", "Tags": {"env": "prod"}},
+        READ_ONLY_ARN,
+        {"Arn": OTHER_ADMIN_ARN}
+    ])
+
+
+def test_roles_are_read_from_their_arn():
+    role = roles.Role(READ_ONLY_ARN)
+
+    assert (role.account_id, role.name) == ("123456789012", "ReadOnly")
+    assert role.get_reference() == "123456789012:ReadOnly"
+    assert roles.Role(ADMIN_ARN, "admin").get_reference() == "admin"
+
+
+@pytest.mark.parametrize("reference, arn", [
+    (ADMIN_ARN, ADMIN_ARN),
+    ("admin-prod", ADMIN_ARN),
+    ("ADMIN-PROD", ADMIN_ARN),
+    ("123456789012:readonly", READ_ONLY_ARN),
+    (" 210987654321 : Admin ", OTHER_ADMIN_ARN),
+    ("123456789012:Missing", None),
+    ("arn:aws:iam::123456789012:role/Missing", None),
+    ("nothing", None)
+])
+def test_roles_are_found_by_arn_alias_or_account_and_name(reference, arn):
+    role = create_catalogue().find(reference)
+
+    assert (role.arn if role else None) == arn
+
+
+def test_adding_a_role_keeps_what_it_does_not_change():
+    catalogue = create_catalogue()
+
+    assert catalogue.add(roles.Role(ADMIN_ARN, tags={"team": "payments"})) is False
+    assert catalogue.get(ADMIN_ARN).to_dictionary() == {"Arn": ADMIN_ARN, "Alias": "Admin-Prod",
+                                                        "Tags": {"env": "prod", "team": "payments"}}
+
+    catalogue.add(roles.Role(ADMIN_ARN, "admin"))
+
+    assert catalogue.find("admin").arn == ADMIN_ARN
+    assert catalogue.find("admin-prod") is None
+
+
+def test_aliases_are_unique():
+    catalogue = create_catalogue()
+
+    with pytest.raises(roles.RoleAliasInUseError):
+        catalogue.add(roles.Role(OTHER_ADMIN_ARN, "admin-prod"))
+
+
+def test_removed_roles_are_not_found():
+    catalogue = create_catalogue()
+    catalogue.remove(ADMIN_ARN)
+
+    assert catalogue.find("admin-prod") is None
+    assert catalogue.find("123456789012:Admin") is None
+    assert len(catalogue) == 2
+
+
+def test_unused_catalogues_keep_the_saved_values():
+    values = [READ_ONLY_ARN, {"Arn": ADMIN_ARN, "Alias": "admin"}]
+    catalogue = roles.RoleCatalogue(values)
+
+    assert len(catalogue) == 2
+    assert catalogue.to_list() == [{"Arn": READ_ONLY_ARN}, {"Arn": ADMIN_ARN, "Alias": "admin"}]
+    assert values == [READ_ONLY_ARN, {"Arn": ADMIN_ARN, "Alias": "admin"}]
+
+
+def test_profiles_only_resolve_their_saved_roles(credential):
+    credential.roles.add(roles.Role(ADMIN_ARN, "admin"))
+    credential.save()
+    saved = cred.Credential.from_json(credential.id)
+
+    assert saved.resolve_role("admin") == ADMIN_ARN
+    assert saved.resolve_role("123456789012:admin") == ADMIN_ARN
+
+    with pytest.raises(cred.RoleNotSavedInCurrentCredentialError):
+        saved.resolve_role(OTHER_ADMIN_ARN)
+
+
+def test_role_files_are_read_in_every_format():
+    text = "# Saved roles\n" + ADMIN_ARN + "\n\n" + READ_ONLY_ARN + "\n"
+    csv = "arn,alias,tags\n" + ADMIN_ARN + ",admin,env=prod\n"
+    ndjson = '{"arn": "' + ADMIN_ARN + '", "alias": "admin"}\n'
+
+    assert [r.arn for r in roles.read(io.StringIO(text), "text")] == [ADMIN_ARN, READ_ONLY_ARN]
+    assert [(r.arn, r.alias, r.tags) for r in roles.read(io.StringIO(csv), "csv")] == [
+        (ADMIN_ARN, "admin", {"env": "prod"})]
+    assert [(r.arn, r.alias) for r in roles.read(io.StringIO(ndjson), "ndjson")] == [(ADMIN_ARN, "admin")]
+
+    with pytest.raises(roles.InvalidRoleArnError):
+        list(roles.read(io.StringIO("arn:aws:iam::123456789012:user/me\n"), "text"))
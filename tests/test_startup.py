@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SLOW_MODULES = ["boto3", "botocore", "click"]
+# scripts/benchmark.py holds the median to 100 ms, this only catches big
+# regressions without failing on a busy machine.
+IMPORT_BUDGET_MS = 250
+IMPORT_RUNS = 3
+
+# Runs aws-creds with the arguments given, then reports which of the slow
+# modules were imported along the way.
+SCRIPT = (
+    "import sys, json\n"
+    "arguments = json.loads(sys.argv[1])\n"
+    "sys.argv = ['aws-creds'] + arguments\n"
+    "from creds import entry\n"
+    "if arguments:\n"
+    "    try:\n"
+    "        entry.main()\n"
+    "    except SystemExit:\n"
+    "        pass\n"
+    "print(json.dumps([m for m in " + repr(SLOW_MODULES) + " if m in sys.modules]))\n"
+)
+
+
+def get_import_time(arguments):
+    """
+        Returns how long (in ms) 'aws-creds <arguments>' spends importing
+        modules (as reported by 'python -X importtime'), and the names of
+        every module it imports.
+    """
+    script = "import sys; sys.argv = ['aws-creds'] + sys.argv[1:]; from creds.entry import main; main()"
+    environment = dict(os.environ, PYTHONPATH=REPOSITORY_DIRECTORY)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script] + arguments, env=environment,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    modules = {}
+
+    for line in result.stderr.decode().splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, module = line.split("|")
+            modules[module.strip()] = int(cumulative) / 1000
+
+    return sum(t for m, t in modules.items() if m in ("creds.entry", "creds.main")), modules.keys()
+
+
+def get_slow_imports(arguments):
+    """Returns the slow modules imported by 'aws-creds <arguments>', run in a process of its own."""
+    environment = dict(os.environ, PYTHONPATH=REPOSITORY_DIRECTORY)
+    result = subprocess.run([sys.executable, "-c", SCRIPT, json.dumps(arguments)], env=environment,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return json.loads(result.stdout.decode().splitlines()[-1])
+
+
+@pytest.mark.parametrize("arguments", [
+    [],
+    ["login", "TEST-ONE", "--no-age-check"],
+    ["credential-process", "TEST-ONE"]
+], ids=["import", "login", "credential-process"])
+def test_fast_path_does_not_import_boto3_or_click(credential, arguments):
+    assert get_slow_imports(arguments) == []
+
+
+def test_fast_login_logs_in(credential):
+    get_slow_imports(["login", "TEST-ONE", "--no-age-check"])
+
+    with open(credential.CURRENT_PROFILE_FILE_NAME, "r") as fh:
+        assert fh.read() == credential.id
+
+
+@pytest.mark.parametrize("arguments", [["--help"], ["ls"], ["default", "get"]], ids=["help", "ls", "default-get"])
+def test_offline_commands_import_quickly(credential, arguments):
+    timings = []
+
+    for _ in range(IMPORT_RUNS):
+        total, modules = get_import_time(arguments)
+        timings.append(total)
+
+    assert not [m for m in modules if m.split(".")[0] in ("boto3", "botocore")]
+    assert min(timings) < IMPORT_BUDGET_MS, timings
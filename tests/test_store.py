@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import types
+import sqlite3
+import subprocess
+import pytest
+from creds import cred, store
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STRESS_WRITES = 200
+
+# Saves the profile sys.argv[1] again and again, numbering its description.
+WRITER_SCRIPT = (
+    "import sys\n"
+    "from creds import store\n"
+    "document = store.get(sys.argv[1])\n"
+    "for i in range(1, int(sys.argv[2]) + 1):\n"
+    "    store.put(dict(document, Description=str(i)))\n"
+)
+
+
+def connect_from_another_process():
+    """Returns a connection of its own to the store, as another aws-creds process would have."""
+    return sqlite3.connect(store.STORE_FILE_NAME)
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """Returns a list of the text of every document the store parses from here on."""
+    texts = []
+
+    def loads(text):
+        texts.append(text)
+        return json.loads(text)
+
+    monkeypatch.setattr(store, "json", types.SimpleNamespace(loads=loads, dumps=json.dumps))
+    return texts
+
+
+def get_document(name, access_key, tags=None):
+    my_credential = cred.Credential(name, "Profile " + name, access_key, "secret", "us-east-1", "json", tags=tags)
+    return my_credential.to_dictionary()
+
+
+def test_put_and_get():
+    document = get_document("one", "AKIAONE")
+
+    store.put(document)
+
+    assert store.get(document["Id"]) == document
+    assert store.get_by_name("one") == document
+    assert store.get_by_access_key("AKIAONE") == document
+    assert store.get("missing") is None
+
+
+def test_documents_are_listed_by_name():
+    for name in ["charlie", "alpha", "bravo"]:
+        store.put(get_document(name, "AKIA" + name.upper()))
+
+    assert [d["Name"] for d in store.get_all()] == ["ALPHA", "BRAVO", "CHARLIE"]
+    assert [s[1] for s in store.get_summaries()] == ["ALPHA", "BRAVO", "CHARLIE"]
+
+
+def test_changes_by_other_processes_are_seen():
+    one = get_document("one", "AKIAONE")
+    two = get_document("two", "AKIATWO")
+    store.put(one)
+    store.put(two)
+    cached_two = store.get_all()[1]
+    one["Description"] = "Changed elsewhere"
+
+    with connect_from_another_process() as connection:
+        connection.execute("UPDATE profiles SET document = ? WHERE id = ?", (json.dumps(one), one["Id"]))
+
+    assert store.get(one["Id"])["Description"] == "Changed elsewhere"
+    # Only the document that changed is parsed again.
+    assert store.get_all()[1] is cached_two
+
+
+def test_a_replaced_store_file_is_reopened():
+    store.put(get_document("one", "AKIAONE"))
+    store.get_all()
+    replacement = store.STORE_FILE_NAME + ".new"
+
+    with sqlite3.connect(replacement) as connection:
+        store.create_schema(connection)
+        store.put(get_document("two", "AKIATWO"), connection)
+
+    os.replace(replacement, store.STORE_FILE_NAME)
+
+    assert [d["Name"] for d in store.get_all()] == ["TWO"]
+
+
+def test_the_index_is_rebuilt_when_it_disagrees_with_the_documents():
+    document = get_document("one", "AKIAONE")
+    store.put(document)
+
+    with connect_from_another_process() as connection:
+        connection.execute("UPDATE profiles SET name = 'OTHER', access_key = 'AKIAOTHER' WHERE id = ?",
+                           (document["Id"],))
+
+    assert store.get_by_name("other") is None
+    assert store.get_by_name("one") == document
+    assert store.get_by_access_key("AKIAONE") == document
+
+
+def test_tags_are_indexed():
+    prod = get_document("one", "AKIAONE", {"env": "prod", "team": "payments"})
+    store.put(prod)
+    store.put(get_document("two", "AKIATWO", {"env": "dev"}))
+
+    assert [d["Name"] for d in store.iterate({"env": "prod"})] == ["ONE"]
+    assert store.get_tags() == {"env": {"dev": 1, "prod": 1}, "team": {"payments": 1}}
+
+    prod["Tags"] = {"env": "dev"}
+    store.put(prod)
+    store.delete(store.get_by_name("two")["Id"])
+
+    assert [d["Name"] for d in store.iterate({"env": "dev"})] == ["ONE"]
+    assert store.get_tags() == {"env": {"dev": 1}}
+
+
+def test_stores_from_older_versions_are_upgraded():
+    document = get_document("one", "AKIAONE", {"env": "prod"})
+    os.makedirs(os.path.dirname(store.STORE_FILE_NAME))
+
+    # The layout of the first version of the store.
+    with sqlite3.connect(store.STORE_FILE_NAME) as connection:
+        connection.execute("CREATE TABLE profiles (id TEXT PRIMARY KEY, name TEXT NOT NULL, document TEXT NOT NULL)")
+        connection.execute("INSERT INTO profiles (id, name, document) VALUES (?, ?, ?)",
+                           (document["Id"], document["Name"], json.dumps(document)))
+        connection.execute("PRAGMA user_version = 1")
+
+    connection = store.get_connection()
+
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == store.SCHEMA_VERSION
+    assert store.get_by_access_key("AKIAONE") == document
+    assert store.get_summaries() == [(document["Id"], "ONE", "Profile one", {"env": "prod"})]
+    assert store.get_setting("missing") is None
+
+
+def test_documents_are_only_parsed_once_per_process(parsed):
+    documents = [get_document(name, "AKIA" + name.upper()) for name in ["one", "two", "three"]]
+
+    for document in documents:
+        store.put(document)
+
+    store.get_all()
+    store.get(documents[0]["Id"])
+    store.get_by_name("two")
+    store.get_by_access_key("AKIATHREE")
+    store.get_all()
+
+    assert len(parsed) == 3
+
+    documents[1]["Description"] = "Changed"
+    store.put(documents[1])
+
+    assert [d["Description"] for d in store.get_all()] == ["Profile one", "Profile three", "Changed"]
+    assert len(parsed) == 4
+
+
+def test_a_long_running_reader_sees_each_write_in_order():
+    one = get_document("one", "AKIAONE")
+    one["Description"] = "0"
+    store.put(one)
+    store.put(get_document("two", "AKIATWO"))
+    cached_two = store.get_all()[1]
+    environment = dict(os.environ, PYTHONPATH=REPOSITORY_DIRECTORY)
+    process = subprocess.Popen([sys.executable, "-c", WRITER_SCRIPT, one["Id"], str(STRESS_WRITES)], env=environment)
+    seen = []
+
+    while process.poll() is None:
+        documents = store.get_all()
+        seen.append(int(documents[0]["Description"]))
+        # The profile the writer doesn't change is never parsed again.
+        assert documents[1] is cached_two
+
+    assert process.returncode == 0
+    assert store.get(one["Id"])["Description"] == str(STRESS_WRITES)
+    assert seen == sorted(seen)
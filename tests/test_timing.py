@@ -0,0 +1,133 @@
+import io
+import os
+import sys
+import json
+import threading
+import subprocess
+import pytest
+from creds import timing
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    """Turns timing on for this test alone (without printing or writing anything when the tests exit)."""
+    monkeypatch.setattr(timing, "enabled", True)
+    monkeypatch.setattr(timing, "_spans", [])
+    monkeypatch.setattr(timing, "_root", None)
+    monkeypatch.setattr(timing, "_trace_id", "0" * 32)
+    monkeypatch.setattr(timing, "_local", threading.local())
+
+
+def run(*arguments, **environment):
+    """Runs 'aws-creds <arguments>' in a process of its own."""
+    script = "import sys; sys.argv = ['aws-creds'] + sys.argv[1:]; from creds.entry import main; main()"
+    environment = dict(os.environ, PYTHONPATH=REPOSITORY_DIRECTORY, **environment)
+    return subprocess.run([sys.executable, "-c", script] + list(arguments), env=environment,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def get_breakdown_names(breakdown):
+    # Each line is "<ms> ms  <indented name>", keep the indented name.
+    return [line.split(" ms  ")[1] for line in breakdown.splitlines() if " ms  " in line]
+
+
+def test_options_after_a_double_dash_are_left_be(monkeypatch):
+    enabled = []
+    monkeypatch.setattr(timing, "enable", lambda print_timings, trace_file_name: enabled.append(print_timings))
+
+    assert timing.enable_from_arguments(["each", "--", "aws", "--timings"]) == ["each", "--", "aws", "--timings"]
+    assert enabled == []
+    assert timing.enable_from_arguments(["--timings", "each", "--", "aws", "--timings"]) == \
+        ["each", "--", "aws", "--timings"]
+    assert enabled == [True]
+
+
+def test_nothing_is_recorded_until_enabled():
+    with timing.span("ignored"):
+        pass
+
+    assert timing.span("ignored") is timing._null_span
+    assert timing.get_spans() == []
+
+
+def test_breakdown_adds_up_repeated_spans(spans):
+    with timing.span("aws-creds ls"):
+        for _ in range(3):
+            with timing.span("store.get_all"):
+                pass
+
+        with pytest.raises(KeyError):
+            with timing.span("fails"):
+                raise KeyError()
+
+    breakdown = io.StringIO()
+    timing.print_breakdown(breakdown)
+
+    assert get_breakdown_names(breakdown.getvalue()) == ["aws-creds ls", "  store.get_all (x3)", "  fails [KeyError]"]
+
+
+def test_trace_is_written_as_otlp_json(spans, tmp_path):
+    file_name = str(tmp_path / "trace.json")
+
+    with timing.span("aws-creds status", profile="TEST-ONE"):
+        with timing.span("aws sts.GetCallerIdentity") as child:
+            child.error = "ClientError"
+
+    timing.write_trace(file_name)
+    timing.write_trace(file_name)
+
+    with open(file_name, "r") as fh:
+        lines = fh.read().splitlines()
+
+    assert len(lines) == 2
+    resource_spans = json.loads(lines[0])["resourceSpans"][0]
+    assert {"key": "service.name", "value": {"stringValue": "aws-creds"}} in resource_spans["resource"]["attributes"]
+    root, child = resource_spans["scopeSpans"][0]["spans"]
+
+    assert (root["name"], child["name"]) == ("aws-creds status", "aws sts.GetCallerIdentity")
+    assert "parentSpanId" not in root
+    assert child["parentSpanId"] == root["spanId"]
+    assert root["traceId"] == child["traceId"] == "0" * 32
+    assert root["attributes"] == [{"key": "profile", "value": {"stringValue": "TEST-ONE"}}]
+    assert (root["status"], child["status"]) == ({"code": 1}, {"code": 2, "message": "ClientError"})
+    assert int(root["startTimeUnixNano"]) <= int(child["startTimeUnixNano"]) <= \
+        int(child["endTimeUnixNano"]) <= int(root["endTimeUnixNano"])
+
+
+def test_timings_are_printed_after_the_command(credential):
+    result = run("ls", "--timings")
+
+    assert result.returncode == 0, result.stderr
+    assert "TEST-ONE" in result.stdout.decode()
+    assert "Timings" not in result.stdout.decode()
+    assert get_breakdown_names(result.stderr.decode())[0] == "aws-creds ls"
+
+
+def test_every_command_appends_its_trace(credential, tmp_path):
+    file_name = str(tmp_path / "trace.json")
+
+    for _ in range(2):
+        result = run("login", "TEST-ONE", "--no-age-check", AWS_CREDS_TRACE_FILE=file_name)
+        assert result.returncode == 0, result.stderr
+
+    assert result.stderr == b""
+
+    with open(file_name, "r") as fh:
+        traces = [json.loads(line) for line in fh]
+
+    assert len(traces) == 2
+
+    for trace in traces:
+        trace_spans = trace["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        span_ids = {s["spanId"] for s in trace_spans}
+        names = [s["name"] for s in trace_spans]
+
+        assert names[0] == "aws-creds login"
+        assert "profile.login" in names
+        assert len({s["traceId"] for s in trace_spans}) == 1
+        assert all(s["parentSpanId"] in span_ids for s in trace_spans[1:])
+
+    assert traces[0]["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["traceId"] != \
+        traces[1]["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["traceId"]
@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import stat
+import pytest
+from creds import cred, crypto, store, vault
+
+
+class FakeKeyring():
+    """Stands in for the keyring package, keeping the passwords in memory."""
+    def __init__(self):
+        self.passwords = {}
+
+    def set_password(self, service, name, password):
+        self.passwords[(service, name)] = password
+
+    def get_password(self, service, name):
+        return self.passwords.get((service, name))
+
+
+@pytest.fixture(autouse=True)
+def cheap_key_derivation(monkeypatch):
+    """Lowers the scrypt cost, deriving a key at the real cost takes most of a second."""
+    monkeypatch.setattr(vault, "SCRYPT_N", 2 ** 10)
+    # Never wait for a passphrase, even when run from a terminal.
+    monkeypatch.setattr(vault, "prompt", False)
+
+
+@pytest.fixture
+def keyring(monkeypatch):
+    fake_keyring = FakeKeyring()
+    monkeypatch.setitem(sys.modules, "keyring", fake_keyring)
+    return fake_keyring
+
+
+def start_new_process():
+    """Forgets the key and settings this process has, as if the next command was run."""
+    store.close()
+    vault.reset()
+
+
+def read_secret_key(my_credential):
+    return cred.Credential.from_json(my_credential.id).secret_key
+
+
+def test_enable_encrypts_every_secret_key(credential):
+    vault.enable("passphrase")
+
+    credentials = store.get(credential.id)["Credentials"]
+    assert "SecretKey" not in credentials
+    assert vault.decrypt(credentials["EncryptedSecretKey"], credential.id) == "secret"
+    assert vault.get_settings()["N"] == 2 ** 10
+    assert read_secret_key(credential) == "secret"
+
+
+def test_secret_keys_are_bound_to_their_profile(credential):
+    vault.enable("passphrase")
+    encrypted_secret_key = store.get(credential.id)["Credentials"]["EncryptedSecretKey"]
+
+    with pytest.raises(crypto.DecryptionError):
+        vault.decrypt(encrypted_secret_key, "another-profile-id")
+
+
+def test_locked_profiles_need_unlocking(credential):
+    vault.enable("passphrase")
+    vault.lock()
+    start_new_process()
+
+    with pytest.raises(vault.VaultLockedError):
+        read_secret_key(credential)
+
+    vault.unlock("passphrase")
+
+    assert read_secret_key(credential) == "secret"
+
+
+def test_wrong_passphrase(credential):
+    vault.enable("passphrase")
+    vault.lock()
+
+    with pytest.raises(vault.IncorrectPassphraseError):
+        vault.unlock("not the passphrase")
+
+    with pytest.raises(vault.VaultLockedError):
+        vault.get_key()
+
+
+def test_unlocked_key_is_kept_in_the_runtime_directory(credential):
+    vault.enable("passphrase")
+    vault.lock()
+    vault.unlock("passphrase", timeout=60)
+    start_new_process()
+
+    assert os.path.dirname(vault.UNLOCK_FILE_NAME) == os.environ["XDG_RUNTIME_DIR"]
+    assert stat.S_IMODE(os.stat(vault.UNLOCK_FILE_NAME).st_mode) == 0o600
+    assert read_secret_key(credential) == "secret"
+
+
+def test_expired_unlock_cache_is_deleted(credential):
+    vault.enable("passphrase")
+
+    with open(vault.UNLOCK_FILE_NAME, "r") as fh:
+        cache = json.loads(fh.read())
+
+    cache["Expires"] = 0
+
+    with open(vault.UNLOCK_FILE_NAME, "w") as fh:
+        fh.write(json.dumps(cache))
+
+    start_new_process()
+
+    with pytest.raises(vault.VaultLockedError):
+        read_secret_key(credential)
+
+    assert not os.path.exists(vault.UNLOCK_FILE_NAME)
+
+
+def test_key_is_not_kept_on_disk_without_a_runtime_directory(credential, monkeypatch):
+    monkeypatch.setattr(vault, "UNLOCK_FILE_NAME", None)
+    # Older versions kept the key in ~/.aws when there was no runtime directory.
+    os.makedirs(os.path.dirname(vault.OLD_UNLOCK_FILE_NAME), exist_ok=True)
+
+    with open(vault.OLD_UNLOCK_FILE_NAME, "w") as fh:
+        fh.write("{}")
+
+    vault.enable("passphrase")
+
+    assert read_secret_key(credential) == "secret"
+
+    start_new_process()
+
+    with pytest.raises(vault.VaultLockedError):
+        read_secret_key(credential)
+
+    assert not os.path.exists(vault.OLD_UNLOCK_FILE_NAME)
+    assert os.listdir(os.environ["XDG_RUNTIME_DIR"]) == []
+
+
+def test_keyring_unlocks_without_a_passphrase(credential, keyring):
+    vault.enable()
+    start_new_process()
+
+    assert vault.get_settings()["Protector"] == "keyring"
+    assert read_secret_key(credential) == "secret"
+    assert not os.path.exists(vault.UNLOCK_FILE_NAME)
+
+    keyring.passwords.clear()
+    start_new_process()
+
+    with pytest.raises(vault.VaultLockedError):
+        read_secret_key(credential)
+
+
+def test_keyring_must_be_installed(credential, monkeypatch):
+    monkeypatch.setitem(sys.modules, "keyring", None)
+
+    with pytest.raises(vault.KeyringNotInstalledError):
+        vault.enable()
+
+    assert not vault.is_enabled()
+
+
+def test_passphrase_can_be_changed(credential):
+    vault.enable("passphrase")
+    vault.enable("new passphrase")
+    vault.lock()
+    start_new_process()
+
+    with pytest.raises(vault.IncorrectPassphraseError):
+        vault.unlock("passphrase")
+
+    vault.unlock("new passphrase")
+
+    assert read_secret_key(credential) == "secret"
+
+
+def test_disable_decrypts_every_secret_key(credential):
+    vault.enable("passphrase")
+
+    vault.disable()
+    start_new_process()
+
+    assert store.get(credential.id)["Credentials"]["SecretKey"] == "secret"
+    assert not vault.is_enabled()
+    assert not os.path.exists(vault.UNLOCK_FILE_NAME)